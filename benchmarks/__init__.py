@@ -0,0 +1,14 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+Benchmarks of the hot paths of rbackupd: parsing and querying cronjobs,
+reading the backups of a destination, finding and removing expired backups and
+running rsync.
+
+The benchmarks are run with the :mod:`benchmarks.runner`, which writes the
+results as JSON, so the results of two releases can be compared::
+
+    python -m benchmarks.runner --output new.json
+    python -m benchmarks.runner --output new.json --compare old.json
+"""
@@ -0,0 +1,171 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides the :class:`Benchmark` class the benchmark modules
+describe their benchmarks with, and helpers to create synthetic data.
+"""
+
+import datetime
+import os
+import statistics
+import time
+
+from rbackupd import backupstorage
+from rbackupd import constants as const
+from rbackupd import task as backuptask
+from rbackupd.schedule import cron
+from rbackupd.schedule import interval
+
+# The intervals of the tasks used by the benchmarks.
+INTERVALS = (("hourly", "0 * * * * *", 24, "1d"),
+             ("daily", "0 0 * * * *", 7, "1w"))
+
+# The date of the latest synthetic backup.
+LATEST_DATE = datetime.datetime(2014, 6, 1)
+
+
+class Benchmark(object):
+    """
+    A single benchmark.
+
+    :param name: The name of the benchmark.
+    :type name: str
+
+    :param func: The function that is measured. It is called with the state
+        returned by setup.
+    :type func: callable
+
+    :param setup: Called before every round, returns the state passed to func
+        and teardown. If omitted, the state is None.
+    :type setup: callable
+
+    :param teardown: Called with the state after every round.
+    :type teardown: callable
+
+    :param number: How often func is called in a single round.
+    :type number: int
+
+    :param params: The parameters that distinguish this benchmark from others
+        with the same name.
+    :type params: dict
+
+    :param skipped: If not None, the reason why the benchmark cannot run.
+    :type skipped: str
+    """
+
+    def __init__(self, name, func, setup=None, teardown=None, number=1,
+                 params=None, skipped=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.teardown = teardown
+        self.number = number
+        self.params = params if params is not None else {}
+        self.skipped = skipped
+
+    def run(self, repeat):
+        """
+        Run the benchmark.
+
+        :param repeat: The number of rounds.
+        :type repeat: int
+
+        :returns: The result of the benchmark.
+        :rtype: dict
+        """
+        result = {"name": self.name, "params": self.params}
+        if self.skipped is not None:
+            result["skipped"] = self.skipped
+            return result
+        times = []
+        for _ in range(repeat):
+            state = self.setup() if self.setup is not None else None
+            try:
+                start = time.perf_counter()
+                for _ in range(self.number):
+                    self.func(state)
+                times.append((time.perf_counter() - start) / self.number)
+            finally:
+                if self.teardown is not None:
+                    self.teardown(state)
+        result.update({"number": self.number,
+                       "times": times,
+                       "min": min(times),
+                       "median": statistics.median(times),
+                       "mean": statistics.mean(times)})
+        return result
+
+
+def get_scheduling_info(intervals=INTERVALS, clock=None):
+    """
+    Return the scheduling info of a task with the given intervals.
+
+    :param intervals: The intervals as tuples of the name, the cron pattern,
+        the number of backups to keep and their maximum age.
+    :type intervals: list of (str, str, int, str) tuples
+
+    :rtype: task.TaskSchedulingInfo instance
+    """
+    scheduling_info = backuptask.TaskSchedulingInfo()
+    for (name, cron_pattern, keep_count, keep_age) in intervals:
+        scheduling_info.append(backuptask.IntervalInfo(
+            name=name,
+            cron_pattern=cron.Cronjob(cron_pattern, clock=clock),
+            keep_count=keep_count,
+            keep_age=interval.Interval(keep_age, clock=clock)))
+    return scheduling_info
+
+
+def get_backup_dates(count):
+    """
+    Return the dates of count hourly backups, the latest one at
+    :data:`LATEST_DATE`.
+
+    :rtype: list of datetime instances
+    """
+    return [LATEST_DATE - datetime.timedelta(hours=hours) for
+            hours in range(count - 1, -1, -1)]
+
+
+def create_destination(path, count):
+    """
+    Create a destination containing count hourly backups of the task "bench"
+    without any files in them.
+
+    :param path: The path of the destination, which must not exist.
+    :type path: str
+
+    :param count: The number of backups.
+    :type count: int
+    """
+    os.mkdir(path)
+    for date in get_backup_dates(count):
+        folder_name = const.PATTERN_BACKUP_FOLDER.format(
+            name="bench",
+            date=date.strftime(const.DATE_FORMAT),
+            interval_name="hourly")
+        backup = backupstorage.BackupFolder(os.path.join(path, folder_name))
+        backup.set_metadata(name=folder_name, date=date,
+                            interval_name="hourly")
+        backup.prepare()
+        os.mkdir(backup.data_path)
+        backup.finish()
+
+
+def create_task(destination):
+    """
+    Return a task for the given destination, which reads the backups of the
+    destination when it is created.
+
+    :rtype: task.Task instance
+    """
+    return backuptask.Task(name="bench",
+                           sources=[],
+                           destination=destination,
+                           scheduling_info=get_scheduling_info(),
+                           one_filesystem=False,
+                           rsync_cmd="rsync",
+                           rsync_args="",
+                           rsync_logfile_options=None,
+                           rsync_filter=None)
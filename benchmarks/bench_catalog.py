@@ -0,0 +1,66 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+Benchmarks of reading the backups of a destination, both by inspecting every
+backup folder and from an up to date catalog.
+
+The synthetic destinations are created the first time a benchmark of their
+size is run and removed when the benchmarks are done.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+from rbackupd import constants as const
+
+from benchmarks import base
+
+_destinations = {}
+
+
+def _get_destination(size):
+    destination = _destinations.get(size)
+    if destination is None:
+        folder = tempfile.mkdtemp(prefix="rbackupd-bench-")
+        atexit.register(shutil.rmtree, folder, ignore_errors=True)
+        destination = os.path.join(folder, "destination")
+        base.create_destination(destination, size)
+        _destinations[size] = destination
+    return destination
+
+
+def _setup_scan(size):
+    task = base.create_task(_get_destination(size))
+    # without a catalog, all backup folders have to be inspected
+    os.remove(os.path.join(task.destination, const.NAME_CATALOG_FOLDER,
+                           const.NAME_CATALOG_FILE))
+    return task
+
+
+def _setup_catalog(size):
+    # creating the task writes an up to date catalog
+    return base.create_task(_get_destination(size))
+
+
+def _read_backups(task):
+    backups = task._read_backups()
+    assert len(backups) == len(task.backups)
+
+
+def get_benchmarks(sizes):
+    benchmarks = []
+    for size in sizes:
+        benchmarks.append(base.Benchmark(
+            name="task.read_backups.scan",
+            func=_read_backups,
+            setup=lambda size=size: _setup_scan(size),
+            params={"backups": size}))
+        benchmarks.append(base.Benchmark(
+            name="task.read_backups.catalog",
+            func=_read_backups,
+            setup=lambda size=size: _setup_catalog(size),
+            params={"backups": size}))
+    return benchmarks
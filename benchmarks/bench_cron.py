@@ -0,0 +1,83 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+Benchmarks of parsing cronjobs and searching their occurrences, for patterns
+that match often and patterns that match rarely, one datetime at a time and
+for many timestamps at once.
+"""
+
+import datetime
+
+from rbackupd.schedule import cron
+
+from benchmarks import base
+
+PATTERNS = (
+    ("dense", "* * * * * *"),
+    ("hourly", "0 * * * * *"),
+    ("mixed", "3-59/5 1,4 * JAN-JUN * *"),
+    ("weekdays", "30 8 * * * MON-FRI"),
+    ("sparse", "0 0 29 2 * *"),
+)
+
+REFERENCE = datetime.datetime(2014, 6, 15, 12, 34)
+
+# The batch benchmarks check this many timestamps, seven minutes apart,
+# against this many cronjobs.
+BATCH_TIMESTAMPS = 500000
+BATCH_CRONJOBS = 300
+
+
+def _get_batch_timestamps():
+    timestamps = [REFERENCE + datetime.timedelta(minutes=7 * i) for
+                  i in range(BATCH_TIMESTAMPS)]
+    if cron.numpy is not None:
+        # converting the datetime instances is not what is measured
+        return cron.numpy.asarray(timestamps, dtype="datetime64[m]")
+    return timestamps
+
+
+def _get_batch_cronjobs():
+    return [cron.Cronjob("%s %s-%s * * * *" % (i % 60, i % 12, i % 12 + 10))
+            for i in range(BATCH_CRONJOBS)]
+
+
+def get_benchmarks(sizes):
+    benchmarks = []
+    for (name, pattern) in PATTERNS:
+        params = {"pattern": name}
+        benchmarks.append(base.Benchmark(
+            name="cron.construct",
+            func=lambda _, pattern=pattern: cron.Cronjob(pattern),
+            number=100,
+            params=params))
+        cronjob = cron.Cronjob(pattern)
+        benchmarks.append(base.Benchmark(
+            name="cron.get_most_recent_occurence",
+            func=lambda _, cronjob=cronjob: cronjob.get_most_recent_occurence(
+                REFERENCE),
+            number=1000,
+            params=params))
+        benchmarks.append(base.Benchmark(
+            name="cron.next_occurrence",
+            func=lambda _, cronjob=cronjob: cronjob.next_occurrence(
+                REFERENCE),
+            number=1000,
+            params=params))
+
+    implementation = "numpy" if cron.numpy is not None else "python"
+    benchmarks.append(base.Benchmark(
+        name="cron.batch_matches",
+        func=lambda state: cron.batch_matches(*state),
+        setup=lambda: (_get_batch_cronjobs(), _get_batch_timestamps()),
+        params={"cronjobs": BATCH_CRONJOBS,
+                "timestamps": BATCH_TIMESTAMPS,
+                "implementation": implementation}))
+    benchmarks.append(base.Benchmark(
+        name="cron.batch_prev_occurrences",
+        func=lambda state: cron.batch_prev_occurrences(*state),
+        setup=lambda: (cron.Cronjob("0 0 * * * *"), _get_batch_timestamps()),
+        params={"timestamps": BATCH_TIMESTAMPS,
+                "implementation": implementation}))
+    return benchmarks
@@ -0,0 +1,65 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+Benchmarks of finding and removing expired backups of a task with many
+backups. The backups are kept in memory by the simulator, so only the logic of
+the task is measured and not the file system.
+
+Every hourly backup has a daily backup linking to it at midnight, and half of
+all backups are expired, so removing them has to move data and fix links.
+"""
+
+from rbackupd import simulator
+
+from benchmarks import base
+
+
+def _setup(size):
+    simulation = simulator.Simulator(
+        intervals=[("hourly", "0 * * * * *", size // 2, "52w"),
+                   ("daily", "0 0 * * * *", size // 48, "52w")],
+        start=base.LATEST_DATE)
+    task = simulation.task
+    for date in base.get_backup_dates(size):
+        hourly = _add_backup(task, date, "hourly")
+        if date.hour == 0:
+            _add_backup(task, date, "daily").link_data_from(hourly)
+    return (task, simulation.clock.now())
+
+
+def _add_backup(task, date, interval_name):
+    folder_name = "bench_%s_%s.snapshot" % (date.isoformat(), interval_name)
+    backup = task._new_backup_storage(folder_name)
+    backup.set_metadata(name=folder_name, date=date,
+                        interval_name=interval_name)
+    backup.fill()
+    backup.finish()
+    task.backups.add(backup)
+    return backup
+
+
+def _get_expired_backups(state):
+    (task, now) = state
+    task.get_expired_backups(now)
+
+
+def _handle_expired_backups(state):
+    (task, now) = state
+    task.handle_expired_backups(now)
+
+
+def get_benchmarks(sizes):
+    benchmarks = []
+    for size in sizes:
+        benchmarks.append(base.Benchmark(
+            name="task.get_expired_backups",
+            func=_get_expired_backups,
+            setup=lambda size=size: _setup(size),
+            params={"backups": size}))
+        benchmarks.append(base.Benchmark(
+            name="task.handle_expired_backups",
+            func=_handle_expired_backups,
+            setup=lambda size=size: _setup(size),
+            params={"backups": size}))
+    return benchmarks
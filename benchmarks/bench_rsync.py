@@ -0,0 +1,91 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+Benchmarks of rsync() copying a generated local tree, both into an empty
+backup and into a backup hardlinking from an identical previous one. These
+measure the overhead of rbackupd around rsync, e.g. reading its output, as
+much as rsync itself.
+"""
+
+import os
+import shutil
+import tempfile
+
+from rbackupd.cmd import rsync
+
+from benchmarks import base
+
+# The shape of the generated tree: directories with files of the given size.
+DIRECTORIES = 50
+FILES_PER_DIRECTORY = 40
+FILE_SIZE = 4096
+
+RSYNC_ARGS = "--archive --relative --itemize-changes"
+
+
+def _create_tree(path):
+    content = b"x" * FILE_SIZE
+    for directory in range(DIRECTORIES):
+        directory_path = os.path.join(path, "dir%s" % directory)
+        os.makedirs(directory_path)
+        for name in range(FILES_PER_DIRECTORY):
+            with open(os.path.join(directory_path, "file%s" % name),
+                      "wb") as new_file:
+                new_file.write(content)
+
+
+def _run_rsync(source, destination, link_refs):
+    (returncode, _, stderr_tail) = rsync.rsync(
+        command="rsync",
+        sources=[source],
+        destination=destination,
+        link_refs=link_refs,
+        arguments=RSYNC_ARGS,
+        rsyncfilter=rsync.Filter([], [], [], [], []),
+        loggingOptions=None,
+        stdout_handlers=[rsync.LineCounter()],
+        stats=True)
+    if returncode != 0:
+        raise RuntimeError("rsync failed: %s" % stderr_tail)
+
+
+def _setup(incremental):
+    folder = tempfile.mkdtemp(prefix="rbackupd-bench-")
+    source = os.path.join(folder, "source")
+    _create_tree(source)
+    link_refs = []
+    if incremental:
+        previous = os.path.join(folder, "previous")
+        _run_rsync(source, previous, [])
+        link_refs = [previous]
+    return (folder, source, os.path.join(folder, "backup"), link_refs)
+
+
+def _copy(state):
+    (_, source, destination, link_refs) = state
+    _run_rsync(source, destination, link_refs)
+
+
+def _teardown(state):
+    shutil.rmtree(state[0])
+
+
+def get_benchmarks(sizes):
+    skipped = None
+    if shutil.which("rsync") is None:
+        skipped = "rsync not found"
+    params = {"files": DIRECTORIES * FILES_PER_DIRECTORY}
+    return [
+        base.Benchmark(name="rsync.full",
+                       func=_copy,
+                       setup=lambda: _setup(incremental=False),
+                       teardown=_teardown,
+                       params=params,
+                       skipped=skipped),
+        base.Benchmark(name="rsync.incremental",
+                       func=_copy,
+                       setup=lambda: _setup(incremental=True),
+                       teardown=_teardown,
+                       params=params,
+                       skipped=skipped)]
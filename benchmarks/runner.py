@@ -0,0 +1,214 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module runs the benchmarks and writes their results as JSON.
+
+Every benchmark module provides a ``get_benchmarks(sizes)`` function that
+returns a list of :class:`base.Benchmark` instances. Every benchmark is run
+``repeat`` times. Before every round, its setup is run, which is not part of
+the measured time. A round calls the benchmark function ``number`` times, the
+result of a round is the average time of a single call.
+
+The results look like this::
+
+    {
+        "version": 1,
+        "rbackupd": "0.6",
+        "python": "3.4.2",
+        "platform": "Linux-3.17.1-x86_64",
+        "date": "2014-11-01T12:00:00",
+        "results": [
+            {
+                "name": "cron.get_most_recent_occurence",
+                "params": {"pattern": "sparse"},
+                "number": 1000,
+                "times": [2.1e-05, 2.0e-05, 2.2e-05],
+                "min": 2.0e-05,
+                "median": 2.1e-05,
+                "mean": 2.1e-05
+            },
+            ...
+        ]
+    }
+
+Benchmarks that cannot run in the current environment, e.g. because rsync is
+not installed, are listed with a "skipped" key containing the reason instead
+of the times.
+
+When given a previous result file with ``--compare``, the runner prints every
+benchmark whose median got slower by more than the threshold and exits with a
+non-zero status if there is any.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import re
+import sys
+
+import rbackupd
+
+from benchmarks import bench_catalog
+from benchmarks import bench_cron
+from benchmarks import bench_retention
+from benchmarks import bench_rsync
+
+RESULT_VERSION = 1
+
+BENCHMARK_MODULES = (bench_cron, bench_catalog, bench_retention, bench_rsync)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+QUICK_SIZES = (1000,)
+
+# The relative slowdown of the median that counts as a regression.
+DEFAULT_THRESHOLD = 0.2
+
+
+def _get_key(result):
+    return (result["name"], tuple(sorted(result["params"].items())))
+
+
+def _format_params(params):
+    return ", ".join("%s=%s" % item for item in sorted(params.items()))
+
+
+def compare(old_results, new_results, threshold):
+    """
+    Find the benchmarks that got slower.
+
+    :param old_results: The results of the baseline.
+    :type old_results: dict
+
+    :param new_results: The results to check.
+    :type new_results: dict
+
+    :param threshold: The relative slowdown of the median that counts as a
+        regression, e.g. 0.2 for 20 percent.
+    :type threshold: float
+
+    :returns: The regressions as tuples of the name, the parameters, the old
+        and the new median.
+    :rtype: list of (str, dict, float, float) tuples
+    """
+    old_medians = dict((_get_key(result), result["median"]) for
+                       result in old_results["results"] if
+                       "median" in result)
+    regressions = []
+    for result in new_results["results"]:
+        old_median = old_medians.get(_get_key(result))
+        if old_median is None or "median" not in result:
+            continue
+        if result["median"] > old_median * (1 + threshold):
+            regressions.append((result["name"], result["params"],
+                                old_median, result["median"]))
+    return regressions
+
+
+def run(sizes, repeat, name_filter=None, out=sys.stdout):
+    """
+    Run all benchmarks.
+
+    :param sizes: The numbers of backups the benchmarks on destinations are
+        run with.
+    :type sizes: list of int
+
+    :param repeat: The number of rounds of every benchmark.
+    :type repeat: int
+
+    :param name_filter: If given, only benchmarks whose name matches this
+        regular expression are run.
+    :type name_filter: str
+
+    :param out: The stream the progress is written to.
+
+    :rtype: dict
+    """
+    results = []
+    for module in BENCHMARK_MODULES:
+        for benchmark in module.get_benchmarks(sizes):
+            if (name_filter is not None and
+                    not re.search(name_filter, benchmark.name)):
+                continue
+            result = benchmark.run(repeat)
+            if "skipped" in result:
+                out.write("%-30s %-30s skipped: %s\n" % (
+                    result["name"], _format_params(result["params"]),
+                    result["skipped"]))
+            else:
+                out.write("%-30s %-30s %12.6fs\n" % (
+                    result["name"], _format_params(result["params"]),
+                    result["median"]))
+            out.flush()
+            results.append(result)
+    return {"version": RESULT_VERSION,
+            "rbackupd": rbackupd.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().replace(
+                microsecond=0).isoformat(),
+            "results": results}
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.runner",
+        description="Run the benchmarks of rbackupd.")
+    parser.add_argument("--output", "-o",
+                        help="the file the results are written to as JSON")
+    parser.add_argument("--compare", "-c",
+                        help="a previous result file to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="the relative slowdown that counts as a "
+                        "regression (default: %(default)s)")
+    parser.add_argument("--repeat", "-r", type=int, default=5,
+                        help="the number of rounds of every benchmark "
+                        "(default: %(default)s)")
+    parser.add_argument("--quick", action="store_true",
+                        help="only use the smallest destinations")
+    parser.add_argument("--filter", "-k", dest="name_filter",
+                        help="only run benchmarks whose name matches this "
+                        "regular expression")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    """
+    Run the benchmarks as specified on the command line.
+
+    :param argv: The command line arguments without the program name.
+    :type argv: list of str
+
+    :returns: The exit status.
+    :rtype: int
+    """
+    args = _parse_args(argv)
+    # logging every single backup would dominate the measurements
+    logging.getLogger("rbackupd").setLevel(logging.WARNING)
+
+    results = run(sizes=QUICK_SIZES if args.quick else DEFAULT_SIZES,
+                  repeat=args.repeat,
+                  name_filter=args.name_filter)
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4, sort_keys=True)
+
+    if args.compare is None:
+        return 0
+    with open(args.compare) as compare_file:
+        old_results = json.load(compare_file)
+    regressions = compare(old_results, results, args.threshold)
+    for (name, params, old_median, new_median) in regressions:
+        print("REGRESSION %s (%s): %.6fs -> %.6fs (+%.0f%%)" % (
+            name, _format_params(params), old_median, new_median,
+            (new_median / old_median - 1) * 100))
+    if regressions:
+        return 1
+    print("No regressions compared to \"%s\"." % args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
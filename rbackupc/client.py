@@ -2,9 +2,17 @@
 # Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
 
 import sys
+import time
 
 import dbus
 
+# the interval in seconds the progress is queried with when watching a task
+WATCH_INTERVAL = 1
+
+# the time in seconds to wait for a task to finish the operation it is
+# running when pausing or stopping it
+CONTROL_TIMEOUT = 24 * 60 * 60
+
 
 def connect():
     systembus = dbus.SystemBus()
@@ -19,6 +27,45 @@ def connect():
     return daemon
 
 
+def format_bytes(count):
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if count < 1024 or unit == "TiB":
+            break
+        count /= 1024.0
+    return "{count:.1f} {unit}".format(count=count, unit=unit)
+
+
+def format_progress(progress):
+    if len(progress) == 0:
+        return "not transferring"
+    line = "{percent:3d}% {done} at {rate}/s, ETA {eta}".format(
+        percent=int(progress["percent"]),
+        done=format_bytes(int(progress["bytes_done"])),
+        rate=format_bytes(float(progress["rate"])),
+        eta="{0}:{1:02d}:{2:02d}".format(int(progress["eta"]) // 3600,
+                                         int(progress["eta"]) // 60 % 60,
+                                         int(progress["eta"]) % 60))
+    if "files_total" in progress:
+        line += ", {done}/{total} files".format(
+            done=int(progress["files_done"]),
+            total=int(progress["files_total"]))
+    return line
+
+
+def watch(daemon, name):
+    try:
+        while True:
+            line = "{status}: {progress}".format(
+                status=daemon.GetTaskStatus(name),
+                progress=format_progress(daemon.GetTaskProgress(name)))
+            # overwrite the previous line
+            sys.stdout.write("\r\033[K" + line)
+            sys.stdout.flush()
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        print()
+
+
 def main(argv):
     daemon = connect()
 
@@ -26,20 +73,28 @@ def main(argv):
         print("Please specify an operation")
         print()
         print("list-tasks\t- list all tasks")
+        print("watch <task>\t- watch the progress of a task")
         sys.exit()
 
     command = argv[0]
 
     if command == "list-tasks":
-        for (i, task) in enumerate(daemon.GetTaskNames()):
-            print("{i} -\t{task} -\t{status}".format(
+        tasks = daemon.GetTasks()
+        for (i, task) in enumerate(sorted(tasks)):
+            print("{i} -\t{task} -\t{status} -\t{destination}".format(
                 i=i + 1,
                 task=task,
-                status=daemon.GetTaskStatus(task)))
+                status=tasks[task]["status"],
+                destination=tasks[task]["destination"]))
+
+    elif command == "watch":
+        name = argv[1]
+        watch(daemon, name)
 
     elif command == "pause":
         name = argv[1]
-        daemon.PauseTask(name)
+        print("Waiting for the task to finish its current operation.")
+        daemon.PauseTask(name, timeout=CONTROL_TIMEOUT)
 
     elif command == "resume":
         name = argv[1]
@@ -47,7 +102,8 @@ def main(argv):
 
     elif command == "stop":
         name = argv[1]
-        daemon.StopTask(name)
+        print("Waiting for the task to finish its current operation.")
+        daemon.StopTask(name, timeout=CONTROL_TIMEOUT)
 
     elif command == "start":
         name = argv[1]
@@ -5,18 +5,29 @@
 The backupmanager module.
 """
 
+import collections
+import concurrent.futures
+import functools
 import logging
 import os
+import signal
 import sys
+import threading
+import time
 import dbus.service
 import dbus.mainloop.glib
+import gi.repository.GLib
 import gi.repository.GObject
-import multiprocessing
 
 from rbackupd import configmapper
 from rbackupd import constants as const
+from rbackupd import limits
+from rbackupd import reclaimer
+from rbackupd import scheduler
+from rbackupd import statusboard
 from rbackupd import task
 from rbackupd.cmd import rsync
+from rbackupd.config import configmanager
 from rbackupd.schedule import cron
 from rbackupd.schedule import interval
 
@@ -24,6 +35,10 @@ logger = logging.getLogger(__name__)
 
 dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
 
+# The names of the arguments methods that reply asynchronously get the
+# callbacks for the reply and for errors as.
+_ASYNC_CALLBACKS = ("reply_handler", "error_handler")
+
 
 def expand_env_vars(path):
     return os.path.expanduser(os.path.expandvars(path))
@@ -60,6 +75,47 @@ class BackupManager(dbus.service.Object):
         self.configmapper = configmapper.ConfigMapper(config_path)
 
         self.tasks = None
+        # the settings of every task in the configuration file as of the last
+        # reload, and the settings every running task was created with, by
+        # task name. a task whose settings could not be applied keeps its old
+        # settings, so the next reload tries again.
+        self._requested_settings = {}
+        self._configured_settings = {}
+        # guards replacing self.tasks, which is only ever replaced by a new
+        # list, so it can be read without the lock, and both settings
+        # dictionaries
+        self._tasks_lock = threading.Lock()
+        # makes sure a task is only replaced by one thread at a time
+        self._replace_locks = collections.defaultdict(threading.Lock)
+
+        self.scheduler = scheduler.Scheduler(
+            max_workers=self.configmapper.workers)
+
+        self.transfer_limiter = limits.TransferLimiter(
+            max_transfers=self.configmapper.max_transfers,
+            max_transfers_per_device=(
+                self.configmapper.max_transfers_per_device))
+
+        self.reclaimer = reclaimer.Reclaimer(
+            files_per_second=self.configmapper.trash_files_per_second)
+
+        # the tasks publish their status here, so it can be read without
+        # waiting for them
+        self.status_board = statusboard.StatusBoard(
+            listener=self._on_task_record)
+
+        # the time the last progress signal was emitted, by task name
+        self._progress_signal_times = {}
+        self._progress_signal_lock = threading.Lock()
+
+        # Methods that might take a while run in these threads, so the main
+        # loop keeps handling other requests in the meantime. Changes of the
+        # configuration are made one after another, in the order they were
+        # requested.
+        self._control_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=const.DBUS_CONTROL_WORKERS)
+        self._config_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='s')
     def GetLogfilePath(self):
@@ -70,15 +126,18 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.logfile_path
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def SetLogfilePath(self, path):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetLogfilePath(self, path, reply_handler, error_handler):
         """
         Set the path to the logfile.
 
         :param path: the new path
         :type path: str
         """
-        self.configmapper.logfile_path = path
+        def change():
+            self.configmapper.logfile_path = path
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='s')
     def GetLoglevel(self):
@@ -89,8 +148,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.loglevel
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def SetLoglevel(self, loglevel):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetLoglevel(self, loglevel, reply_handler, error_handler):
         """
         Set the loglevel in human readable form. Valid values are:
             * debug
@@ -101,7 +161,9 @@ class BackupManager(dbus.service.Object):
         :param loglevel: the new loglevel
         :type loglevel: str
         """
-        self.configmapper.loglevel = loglevel
+        def change():
+            self.configmapper.loglevel = loglevel
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='s')
     def GetRsyncCommand(self):
@@ -112,15 +174,18 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.rsync_command
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def SetRsyncCommand(self, command):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetRsyncCommand(self, command, reply_handler, error_handler):
         """
         Set the rsync command that should be used.
 
         :param command: the new command
         :type command: str
         """
-        self.configmapper.rsync_command = command
+        def change():
+            self.configmapper.rsync_command = command
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='b')
     def GetDefaultRsyncLogfile(self):
@@ -131,15 +196,18 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_rsync_logfile
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='b')
-    def SetDefaultRsyncLogfile(self, value):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='b',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultRsyncLogfile(self, value, reply_handler, error_handler):
         """
         Set the flag specifying whether a rsync logfile shall be used.
 
         :param value: the new value
         :type value: bool
         """
-        self.configmapper.default_rsync_logfile = value
+        def change():
+            self.configmapper.default_rsync_logfile = value
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='s')
     def GetDefaultRsyncLogfileName(self):
@@ -155,8 +223,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_rsync_logfile
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def SetDefaultRsyncLogfileName(self, name):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultRsyncLogfileName(self, name, reply_handler, error_handler):
         """
         Set the name of the rsync logfile.
 
@@ -168,7 +237,9 @@ class BackupManager(dbus.service.Object):
         :param name: the new name
         :type name: str
         """
-        self.configmapper.default_rsync_logfile = name
+        def change():
+            self.configmapper.default_rsync_logfile = name
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='s')
     def GetDefaultRsyncLogfileFormat(self):
@@ -182,8 +253,10 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_rsync_logfile_format
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def SetDefaultRsyncLogfileFormat(self, new_format):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultRsyncLogfileFormat(self, new_format, reply_handler,
+                                     error_handler):
         """
         Set the format used in the rsync logfile.
 
@@ -197,7 +270,9 @@ class BackupManager(dbus.service.Object):
         :param new_format: the new format
         :type new_format: str
         """
-        self.configmapper.default_rsync_logfile_format = new_format
+        def change():
+            self.configmapper.default_rsync_logfile_format = new_format
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='as')
     def GetDefaultFilters(self):
@@ -209,8 +284,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_filters
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as')
-    def SetDefaultFilters(self, filters):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultFilters(self, filters, reply_handler, error_handler):
         """
         Set the default rsync filters.
 
@@ -221,7 +297,9 @@ class BackupManager(dbus.service.Object):
         :param filters: the new filters
         :type filters: list or str
         """
-        self.configmapper.default_filters = filters
+        def change():
+            self.configmapper.default_filters = filters
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='as')
     def GetDefaultIncludes(self):
@@ -233,8 +311,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_includes
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as')
-    def SetDefaultIncludes(self, includes):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultIncludes(self, includes, reply_handler, error_handler):
         """
         Set the default patterns passed to `rsync(1)` via the `--include`
         option.
@@ -242,7 +321,9 @@ class BackupManager(dbus.service.Object):
         :param includes: the new include patterns
         :type includes: list of str
         """
-        self.configmapper.default_includes = includes
+        def change():
+            self.configmapper.default_includes = includes
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='as')
     def GetDefaultIncludeFiles(self):
@@ -254,8 +335,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_include_files
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as')
-    def SetDefaultIncludeFiles(self, files):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultIncludeFiles(self, files, reply_handler, error_handler):
         """
         Set the list of file paths passed to `rsync(1)` via the `--include-file`
         option.
@@ -263,7 +345,9 @@ class BackupManager(dbus.service.Object):
         :param files: the new list of files
         :type files: list of str
         """
-        self.configmapper.default_include_files = files
+        def change():
+            self.configmapper.default_include_files = files
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='as')
     def GetDefaultExcludes(self):
@@ -275,8 +359,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_excludes
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as')
-    def SetDefaultExcludes(self, excludes):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultExcludes(self, excludes, reply_handler, error_handler):
         """
         Set the default patterns passed to `rsync(1)` via the `--exclude`
         option.
@@ -284,7 +369,9 @@ class BackupManager(dbus.service.Object):
         :param excludes: the new exclude patterns
         :type excludes: list of str
         """
-        self.configmapper.default_includes = excludes
+        def change():
+            self.configmapper.default_includes = excludes
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='as')
     def GetDefaultExcludeFiles(self):
@@ -296,8 +383,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_exclude_files
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as')
-    def SetDefaultExcludeFiles(self, files):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='as',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultExcludeFiles(self, files, reply_handler, error_handler):
         """
         Set the list of file paths passed to `rsync(1)` via the `--exclude-file`
         option.
@@ -305,7 +393,9 @@ class BackupManager(dbus.service.Object):
         :param files: the new list of files
         :type files: list of str
         """
-        self.configmapper.default_exclude_files = files
+        def change():
+            self.configmapper.default_exclude_files = files
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='b')
     def GetDefaultCreateDestination(self):
@@ -317,8 +407,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_create_destination
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='b')
-    def SetDefaultCreateDestination(self, value):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='b',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultCreateDestination(self, value, reply_handler, error_handler):
         """
         Set the switch that specifies whether the destination directory shall be
         created if it does not exist.
@@ -326,7 +417,9 @@ class BackupManager(dbus.service.Object):
         :param value: the new value
         :type value: bool
         """
-        self.configmapper.default_create_destination = value
+        def change():
+            self.configmapper.default_create_destination = value
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='b')
     def GetDefaultOneFilesystem(self):
@@ -338,8 +431,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.default_one_filesystem
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='b')
-    def SetDefaultOneFilesystem(self, value):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='b',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetDefaultOneFilesystem(self, value, reply_handler, error_handler):
         """
         Set the switch that specifies whether rsync should cross filesystem
         boundaries.
@@ -347,7 +441,9 @@ class BackupManager(dbus.service.Object):
         :param value: the new value
         :type value: bool
         """
-        self.configmapper.default_one_filesystem = value
+        def change():
+            self.configmapper.default_one_filesystem = value
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='as')
@@ -360,8 +456,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).sources
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas')
-    def SetTaskSources(self, task, sources):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskSources(self, task, sources, reply_handler, error_handler):
         """
         Set the sources of the given task.
 
@@ -371,7 +468,9 @@ class BackupManager(dbus.service.Object):
         :param sources: the new sources
         :type sources: list of str
         """
-        self.configmapper.task(task).sources = sources
+        def change():
+            self.configmapper.task(task).sources = sources
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='s')
@@ -384,8 +483,10 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).destination
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='ss')
-    def SetTaskDestination(self, task, destination):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='ss',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskDestination(self, task, destination, reply_handler,
+                           error_handler):
         """
         Set the desination of the given task.
 
@@ -395,7 +496,9 @@ class BackupManager(dbus.service.Object):
         :param destination: the new destination
         :type destination: str
         """
-        self.configmapper.task(task).destination = destination
+        def change():
+            self.configmapper.task(task).destination = destination
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='b')
@@ -412,8 +515,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).rsync_logfile
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sb')
-    def SetTaskRsyncLogfile(self, task, value):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sb',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskRsyncLogfile(self, task, value, reply_handler, error_handler):
         """
         Set the flag specifying whether a rsync logfile shall be used.
 
@@ -423,7 +527,9 @@ class BackupManager(dbus.service.Object):
         :param value: the new value
         :type value: bool
         """
-        self.configmapper.task(task).rsync_logfile = value
+        def change():
+            self.configmapper.task(task).rsync_logfile = value
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='s')
@@ -444,8 +550,10 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).rsync_logfile
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='ss')
-    def SetTaskRsyncLogfileName(self, task, name):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='ss',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskRsyncLogfileName(self, task, name, reply_handler,
+                                error_handler):
         """
         Set the name of the rsync logfile.
 
@@ -459,7 +567,9 @@ class BackupManager(dbus.service.Object):
         :param name: the new name
         :type name: str
         """
-        self.configmapper.task(task).rsync_logfile = name
+        def change():
+            self.configmapper.task(task).rsync_logfile = name
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='s')
@@ -479,8 +589,10 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).rsync_logfile_format
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='ss')
-    def SetTaskRsyncLogfileFormat(self, task, format):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='ss',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskRsyncLogfileFormat(self, task, format, reply_handler,
+                                  error_handler):
         """
         Set the format used in the rsync logfile.
 
@@ -497,7 +609,9 @@ class BackupManager(dbus.service.Object):
         :param format: the new format
         :type format: str
         """
-        self.configmapper.task(task).rsync_logfile = format
+        def change():
+            self.configmapper.task(task).rsync_logfile = format
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='as')
@@ -515,8 +629,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).filter_patterns
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas')
-    def SetTaskFilters(self, task, filters):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskFilters(self, task, filters, reply_handler, error_handler):
         """
         Set the default rsync filters.
 
@@ -530,7 +645,9 @@ class BackupManager(dbus.service.Object):
         :param filters: the new filters
         :type filters: list or str
         """
-        self.configmapper.task(task).filter_patterns = filters
+        def change():
+            self.configmapper.task(task).filter_patterns = filters
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='as')
@@ -547,8 +664,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).include_patterns
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas')
-    def SetTaskIncludes(self, task, includes):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskIncludes(self, task, includes, reply_handler, error_handler):
         """
         Set the default patterns passed to `rsync(1)` via the `--include`
         option.
@@ -559,7 +677,9 @@ class BackupManager(dbus.service.Object):
         :param includes: the new include patterns
         :type includes: list of str
         """
-        self.configmapper.task(task).include_patterns = includes
+        def change():
+            self.configmapper.task(task).include_patterns = includes
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='as')
@@ -576,8 +696,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).include_files
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas')
-    def SetTaskIncludeFiles(self, task, files):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskIncludeFiles(self, task, files, reply_handler, error_handler):
         """
         Set the list of file paths passed to `rsync(1)` via the `--include-file`
         option.
@@ -588,7 +709,9 @@ class BackupManager(dbus.service.Object):
         :param files: the new list of files
         :type files: list of str
         """
-        self.configmapper.task(task).include_files = files
+        def change():
+            self.configmapper.task(task).include_files = files
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='as')
@@ -605,8 +728,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).exclude_patterns
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas')
-    def SetTaskExcludes(self, task, excludes):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskExcludes(self, task, excludes, reply_handler, error_handler):
         """
         Set the default patterns passed to `rsync(1)` via the `--exclude`
         option.
@@ -617,7 +741,9 @@ class BackupManager(dbus.service.Object):
         :param excludes: the new exclude patterns
         :type excludes: list of str
         """
-        self.configmapper.task(task).exclude_patterns = excludes
+        def change():
+            self.configmapper.task(task).exclude_patterns = excludes
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='as')
@@ -634,8 +760,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).exclude_files
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas')
-    def SetTaskExcludeFiles(self, task, files):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sas',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskExcludeFiles(self, task, files, reply_handler, error_handler):
         """
         Set the list of file paths passed to `rsync(1)` via the `--exclude-file`
         option.
@@ -646,7 +773,9 @@ class BackupManager(dbus.service.Object):
         :param files: the new list of files
         :type files: list of str
         """
-        self.configmapper.task(task).exclude_files = files
+        def change():
+            self.configmapper.task(task).exclude_files = files
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='b')
@@ -663,8 +792,10 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).create_destination
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sb')
-    def SetTaskCreateDestination(self, task, value):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sb',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskCreateDestination(self, task, value, reply_handler,
+                                 error_handler):
         """
         Set the switch that specifies whether the destination directory shall be
         created if it does not exist.
@@ -675,7 +806,9 @@ class BackupManager(dbus.service.Object):
         :param value: the new value
         :type value: bool
         """
-        self.configmapper.task(task).create_destination = value
+        def change():
+            self.configmapper.task(task).create_destination = value
+        self._change_config(change, reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='b')
@@ -692,8 +825,9 @@ class BackupManager(dbus.service.Object):
         """
         return self.configmapper.task(task).one_filesystem
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sb')
-    def SetTaskOneFilesystem(self, task, value):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='sb',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def SetTaskOneFilesystem(self, task, value, reply_handler, error_handler):
         """
         Set the switch that specifies whether rsync should cross filesystem
         boundaries.
@@ -704,7 +838,54 @@ class BackupManager(dbus.service.Object):
         :param value: the new value
         :type value: bool
         """
-        self.configmapper.task(task).one_filesystem = value
+        def change():
+            self.configmapper.task(task).one_filesystem = value
+        self._change_config(change, reply_handler, error_handler)
+
+    @dbus.service.method(const.DBUS_BUS_NAME,
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def BeginConfigTransaction(self, reply_handler, error_handler):
+        """
+        Begin a transaction. All changes made by the Set* methods are only kept
+        in memory until the transaction is committed, and are then validated
+        and written to the configuration file at once.
+
+        There is only one transaction at a time, changes made by other clients
+        in the meantime are part of it.
+        """
+        self._change_config(self.configmapper.begin, reply_handler,
+                            error_handler)
+
+    @dbus.service.method(const.DBUS_BUS_NAME,
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def CommitConfigTransaction(self, reply_handler, error_handler):
+        """
+        Validate all changes made since the transaction was begun and write
+        them to the configuration file. If the validation fails, an error is
+        returned and all changes are dropped.
+        """
+        self._change_config(self.configmapper.commit, reply_handler,
+                            error_handler)
+
+    @dbus.service.method(const.DBUS_BUS_NAME,
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def AbortConfigTransaction(self, reply_handler, error_handler):
+        """
+        Drop all changes made since the transaction was begun.
+        """
+        self._change_config(self.configmapper.abort, reply_handler,
+                            error_handler)
+
+    @dbus.service.method(const.DBUS_BUS_NAME,
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def ReloadConfig(self, reply_handler, error_handler):
+        """
+        Read the configuration file again and restart all tasks that changed,
+        like sending SIGHUP to the daemon does. Changes of a running
+        transaction are dropped.
+        """
+        self._change_config(self.reload_config, reply_handler,
+                            error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, out_signature='as')
     def GetTaskNames(self):
@@ -715,23 +896,336 @@ class BackupManager(dbus.service.Object):
         """
         return [task.name for task in self.tasks]
 
+    @dbus.service.method(const.DBUS_BUS_NAME, out_signature='a{sa{sv}}')
+    def GetTasks(self):
+        """
+        Return all tasks with their settings and their state at once, so a
+        client does not have to ask for every value of every task separately.
+        The dictionary maps the name of every task to the dictionary returned
+        by :func:`GetTask()`.
+
+        :rtype: dict
+        """
+        tasks = self.tasks
+        records = self.status_board.snapshot()
+        # a task that is being replaced right now might not have a record
+        return dbus.Dictionary(
+            ((task.name, self._task_to_dbus(task, records[task.name])) for
+             task in tasks if task.name in records),
+            signature='sa{sv}')
+
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         out_signature='a{sv}')
+    def GetTask(self, task):
+        """
+        Return the settings and the state of the specified task. These are the
+        values the task actually uses, with the default values filled in. The
+        dictionary contains everything returned by :func:`GetTaskState()` and:
+
+        - sources: the paths of the sources
+        - destination: the path of the destination
+        - one_filesystem: whether rsync does not cross filesystem boundaries
+        - rsync_args: the additional arguments for rsync
+        - rsync_workers: the number of sources copied at the same time
+        - shards: the number of rsync processes every source is split into
+        - intervals: the cron pattern of every interval, by name
+        - keep: the number of backups kept of every interval, by name
+
+        and, if the task is scheduled:
+
+        - next_run: the time the task will be run next
+
+        :param task: the name of the task
+        :type task: str
+
+        :rtype: dict
+        """
+        return self._task_to_dbus(self._get_task_by_name(task),
+                                  self._get_task_record(task))
+
+    def _task_to_dbus(self, task, record):
+        result = self._record_to_dbus(record)
+        result["sources"] = dbus.Array(task.sources, signature='s')
+        result["destination"] = dbus.String(task.destination)
+        result["one_filesystem"] = dbus.Boolean(task.one_filesystem)
+        result["rsync_args"] = dbus.String(task.rsync_args)
+        result["rsync_workers"] = dbus.UInt32(task.rsync_workers)
+        result["shards"] = dbus.UInt32(task.shards)
+        interval_infos = task.scheduling_info.interval_infos
+        result["intervals"] = dbus.Dictionary(
+            ((info.name, info.cronjob.cronstring) for
+             info in interval_infos),
+            signature='ss')
+        result["keep"] = dbus.Dictionary(
+            ((info.name, dbus.UInt32(info.keep_count)) for
+             info in interval_infos),
+            signature='su')
+        next_run = self.scheduler.get_due_time(task)
+        if next_run is not None:
+            result["next_run"] = dbus.String(
+                next_run.strftime(const.DATE_FORMAT))
+        return result
+
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
                          out_signature='s')
     def GetTaskStatus(self, task):
         """
         Return the status of the specified task
         """
-        return self._get_task_by_name(task).status.name
+        return self._get_task_record(task).state
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def PauseTask(self, task):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         out_signature='a{sv}')
+    def GetTaskState(self, task):
+        """
+        Return what the specified task is doing and how its last run went.
+        The dictionary contains:
+
+        - status: the status of the task, as returned by
+          :func:`GetTaskStatus()`
+        - phase: what the current run is doing, "idle", "check", "transfer"
+          or "expire"
+        - bytes_transferred: the number of bytes the current or last run
+          has transferred
+
+        and, as soon as the task has been run:
+
+        - started: the start of the current or last run
+        - last_result: "success" or "failure"
+        - last_duration: the duration of the last run in seconds
+        - last_error: the error the last run failed with
+
+        :param task: the name of the task
+        :type task: str
+
+        :rtype: dict
+        """
+        return self._record_to_dbus(self._get_task_record(task))
+
+    def _get_task_record(self, name):
+        try:
+            return self.status_board.get(name)
+        except KeyError:
+            raise ValueError("task not found")
+
+    def _record_to_dbus(self, record):
+        result = dbus.Dictionary({}, signature='sv')
+        result["status"] = dbus.String(record.state)
+        result["phase"] = dbus.String(record.phase)
+        result["bytes_transferred"] = dbus.UInt64(record.bytes_transferred)
+        if record.started is not None:
+            result["started"] = dbus.String(
+                record.started.strftime(const.DATE_FORMAT))
+        if record.last_result is not None:
+            result["last_result"] = dbus.String(record.last_result)
+        if record.last_duration is not None:
+            result["last_duration"] = dbus.Double(record.last_duration)
+        if record.last_error is not None:
+            result["last_error"] = dbus.String(record.last_error)
+        return result
+
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         out_signature='a{sv}')
+    def GetTaskProgress(self, task):
+        """
+        Return the progress of the transfer the specified task is running. The
+        dictionary is empty if the task is not transferring at the moment or
+        its progress is not known yet. Otherwise, it contains:
+
+        - bytes_done: the number of bytes transferred so far
+        - percent: the completion of the transfer in percent
+        - rate: the transfer rate in bytes per second
+        - eta: the estimated remaining time in seconds
+
+        and, as soon as rsync knows about them:
+
+        - files_transferred: the number of files transferred so far
+        - files_done: the number of files checked so far
+        - files_total: the number of files found so far
+
+        :param task: the name of the task
+        :type task: str
+
+        :rtype: dict
         """
-        Pause the spcified task.
+        return self._progress_to_dbus(self._get_task_by_name(task).progress)
+
+    @dbus.service.signal(const.DBUS_BUS_NAME, signature='sa{sv}')
+    def TaskStatusChanged(self, task, state):
+        """
+        Emitted whenever the status of a task changes, e.g. when it starts or
+        finishes a run or is paused, with the same dictionary as returned by
+        :func:`GetTaskState()`.
+
+        :param task: the name of the task
+        :type task: str
+
+        :param state: the new state of the task
+        :type state: dict
+        """
+        pass
+
+    @dbus.service.signal(const.DBUS_BUS_NAME, signature='sa{sv}')
+    def BackupFinished(self, task, backup):
+        """
+        Emitted whenever a task has created a new backup. The dictionary
+        contains:
+
+        - name: the name of the backup
+        - interval: the interval the backup was created for
+        - date: the date of the backup
+        - path: the path of the backup
+
+        and, if known:
+
+        - duration: the time the creation took in seconds
+        - bytes_transferred: the size of the files rsync transferred
+
+        :param task: the name of the task
+        :type task: str
+
+        :param backup: the new backup
+        :type backup: dict
+        """
+        pass
+
+    def _backup_to_dbus(self, backup):
+        result = dbus.Dictionary({}, signature='sv')
+        result["name"] = dbus.String(backup.name)
+        result["interval"] = dbus.String(backup.interval_name)
+        result["date"] = dbus.String(backup.date.strftime(const.DATE_FORMAT))
+        result["path"] = dbus.String(backup.path)
+        statistics = backup.statistics
+        if "time.total" in statistics:
+            result["duration"] = dbus.Double(statistics["time.total"])
+        if "rsync.total_transferred_file_size" in statistics:
+            result["bytes_transferred"] = dbus.UInt64(
+                statistics["rsync.total_transferred_file_size"])
+        return result
+
+    def _on_task_record(self, name, old_record, record):
+        """
+        Called by the status board whenever a task updated its record.
+        """
+        if record.state == old_record.state:
+            return
+        gi.repository.GObject.idle_add(self._call_in_main_loop,
+                                       self.TaskStatusChanged,
+                                       name,
+                                       self._record_to_dbus(record))
+
+    def _on_backup_finished(self, task, backup):
+        """
+        Called by the tasks from their worker threads whenever they created a
+        backup.
+        """
+        gi.repository.GObject.idle_add(self._call_in_main_loop,
+                                       self.BackupFinished,
+                                       task.name,
+                                       self._backup_to_dbus(backup))
+
+    @dbus.service.signal(const.DBUS_BUS_NAME, signature='sa{sv}')
+    def TaskProgress(self, task, progress):
+        """
+        Emitted while a task is transferring, at most once per second and task,
+        with the same dictionary as returned by :func:`GetTaskProgress()`. An
+        empty dictionary is emitted when the transfer has finished.
+
+        :param task: the name of the task
+        :type task: str
+
+        :param progress: the progress of the transfer
+        :type progress: dict
+        """
+        pass
+
+    def _progress_to_dbus(self, progress):
+        result = dbus.Dictionary({}, signature='sv')
+        if progress is None:
+            return result
+        result["bytes_done"] = dbus.UInt64(progress.bytes_done)
+        result["percent"] = dbus.UInt32(progress.percent)
+        result["rate"] = dbus.Double(progress.rate)
+        result["eta"] = dbus.UInt64(progress.eta)
+        for key in ("files_transferred", "files_done", "files_total"):
+            value = getattr(progress, key)
+            if value is not None:
+                result[key] = dbus.UInt64(value)
+        return result
+
+    def _on_task_progress(self, task, progress):
+        """
+        Called by the tasks from their worker threads whenever their progress
+        changes. Signals have to be emitted from the main loop, so this only
+        schedules the emission there.
+        """
+        now = time.monotonic()
+        with self._progress_signal_lock:
+            if progress is None:
+                self._progress_signal_times.pop(task.name, None)
+            else:
+                last = self._progress_signal_times.get(task.name)
+                if (last is not None and
+                        now - last < const.PROGRESS_SIGNAL_INTERVAL_SECONDS):
+                    return
+                self._progress_signal_times[task.name] = now
+        gi.repository.GObject.idle_add(self._call_in_main_loop,
+                                       self.TaskProgress,
+                                       task.name,
+                                       self._progress_to_dbus(progress))
+
+    def _call_in_main_loop(self, func, *args):
+        """
+        Helper for calls that have to be made from the main loop, like
+        emitting signals or replying to D-Bus methods. Schedule it with
+        GObject.idle_add().
+        """
+        func(*args)
+        # returning False removes the idle callback
+        return False
+
+    def _run_async(self, executor, func, reply_handler, error_handler):
+        """
+        Run func in a thread of the executor and reply to the D-Bus method
+        call from the main loop as soon as it has finished, with the result
+        of func or the exception it raised.
+        """
+        def reply(future):
+            error = future.exception()
+            if error is not None:
+                gi.repository.GObject.idle_add(self._call_in_main_loop,
+                                               error_handler, error)
+                return
+            result = future.result()
+            args = () if result is None else (result,)
+            gi.repository.GObject.idle_add(self._call_in_main_loop,
+                                           reply_handler, *args)
+        executor.submit(func).add_done_callback(reply)
+
+    def _change_config(self, change, reply_handler, error_handler):
+        """
+        Apply a change to the configuration, which writes the configuration
+        file, without blocking the main loop.
+        """
+        self._run_async(self._config_executor, change, reply_handler,
+                        error_handler)
+
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def PauseTask(self, task, reply_handler, error_handler):
+        """
+        Pause the spcified task. The call returns as soon as the task has
+        finished the operation it is running, which might take a long time,
+        but the daemon handles other requests in the meantime.
 
         :param task: the name of the task to pause
         :type task: str
         """
-        self._get_task_by_name(task).pause(block=True)
+        task = self._get_task_by_name(task)
+        self.scheduler.remove(task)
+        self._run_async(self._control_executor,
+                        functools.partial(task.pause, block=True),
+                        reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
     def ResumeTask(self, task):
@@ -741,17 +1235,27 @@ class BackupManager(dbus.service.Object):
         :param task: the name of the task to resume
         :type task: str
         """
-        self._get_task_by_name(task).resume()
+        task = self._get_task_by_name(task)
+        task.resume()
+        # dispatching the task immediately catches up on all occurrences that
+        # were missed while it was paused
+        self.scheduler.add(task)
 
-    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
-    def StopTask(self, task):
+    @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s',
+                         async_callbacks=_ASYNC_CALLBACKS)
+    def StopTask(self, task, reply_handler, error_handler):
         """
-        Stop the spcified task.
+        Stop the spcified task. Like :func:`PauseTask()`, the call returns as
+        soon as the task has finished the operation it is running.
 
         :param task: the name of the task to stop
         :type task: str
         """
-        self._get_task_by_name(task).stop()
+        task = self._get_task_by_name(task)
+        self.scheduler.remove(task)
+        self._run_async(self._control_executor,
+                        functools.partial(task.stop, block=True),
+                        reply_handler, error_handler)
 
     @dbus.service.method(const.DBUS_BUS_NAME, in_signature='s')
     def StartTask(self, task):
@@ -761,7 +1265,9 @@ class BackupManager(dbus.service.Object):
         :param task: the name of the task to start
         :type task: str
         """
-        self._get_task_by_name(task).start()
+        task = self._get_task_by_name(task)
+        task.start()
+        self.scheduler.add(task)
 
     def _load_tasks(self, reload=False):
         """
@@ -778,9 +1284,148 @@ class BackupManager(dbus.service.Object):
         """
         if not reload and self.tasks is not None:
             return
-        self.tasks = []
+        tasks = []
         for task_name in self.configmapper.task_names:
-            self.tasks.append(self._get_task(task_name))
+            settings = self._get_task_settings(task_name)
+            tasks.append(self._get_task(task_name, settings))
+            self._requested_settings[task_name] = settings
+            self._configured_settings[task_name] = settings
+        self.tasks = tasks
+
+    def reload_config(self):
+        """
+        Read the configuration file again and apply the changes of the tasks.
+        Only tasks that were added, removed or whose settings changed are
+        started, stopped or restarted. All other tasks keep running
+        undisturbed, including backups they are creating right now.
+
+        Changes of global settings other than the ones every task uses, like
+        the number of workers, only take effect after a restart. If a changed
+        task cannot be created, the task with the old settings keeps running
+        and the next reload tries again.
+        """
+        logger.info("Reloading configuration file \"%s\".",
+                    self.configmapper.config_path)
+        try:
+            self.configmapper.reload_config()
+        except (IOError,
+                configmanager.ValidationError,
+                configmanager.ConfigError) as error:
+            logger.error("Reloading the configuration file failed, keeping "
+                         "the current configuration: %s", str(error))
+            return
+
+        requested_settings = dict(
+            (task_name, self._get_task_settings(task_name)) for
+            task_name in self.configmapper.task_names)
+        with self._tasks_lock:
+            self._requested_settings = requested_settings
+            configured_settings = dict(self._configured_settings)
+        for task_name in sorted(set(requested_settings) |
+                                set(configured_settings)):
+            settings = requested_settings.get(task_name)
+            if task_name not in configured_settings:
+                logger.info("Task \"%s\" was added.", task_name)
+            elif settings is None:
+                logger.info("Task \"%s\" was removed.", task_name)
+            elif settings != configured_settings[task_name]:
+                logger.info("Task \"%s\" was changed and will be restarted.",
+                            task_name)
+            else:
+                continue
+            future = self._control_executor.submit(self._apply_task_settings,
+                                                   task_name)
+            future.add_done_callback(functools.partial(
+                self._log_failure,
+                "Applying the settings of task \"%s\"" % task_name))
+
+    def _apply_task_settings(self, name):
+        """
+        Make the running task with the given name match the settings the
+        configuration file had at the last reload: stop it if it was removed,
+        start it if it was added, or start a new task in its place if its
+        settings changed. The new task is created before the old one is
+        stopped, so if it cannot be created, the old task keeps running.
+        Stopping waits for the operation the task is running.
+        """
+        with self._tasks_lock:
+            replace_lock = self._replace_locks[name]
+        with replace_lock:
+            with self._tasks_lock:
+                # the settings are read only now, so if the configuration
+                # file was reloaded again in the meantime, the latest
+                # settings are applied
+                settings = self._requested_settings.get(name)
+                if settings == self._configured_settings.get(name):
+                    return
+                old_task = None
+                for running_task in self.tasks:
+                    if running_task.name == name:
+                        old_task = running_task
+
+            new_task = None
+            if settings is not None:
+                try:
+                    new_task = self._get_task(name, settings)
+                except SystemExit:
+                    # _get_task() logs invalid values and exits, which must
+                    # not end the daemon when reloading
+                    self._log_invalid_task(name, old_task)
+                    return
+                except Exception:
+                    logger.exception("Creating task \"%s\" failed.", name)
+                    self._log_invalid_task(name, old_task)
+                    return
+
+            if old_task is not None:
+                self.scheduler.remove(old_task)
+                old_task.stop(block=True)
+            with self._tasks_lock:
+                tasks = [running_task for running_task in self.tasks if
+                         running_task is not old_task]
+                if new_task is None:
+                    self._configured_settings.pop(name, None)
+                else:
+                    tasks.append(new_task)
+                    self._configured_settings[name] = settings
+                self.tasks = tasks
+            if new_task is None:
+                self.status_board.remove(name)
+                return
+            self.reclaimer.recover(new_task.trash_folder)
+            new_task.start()
+            self.scheduler.add(new_task)
+
+    def _log_invalid_task(self, name, old_task):
+        if old_task is None:
+            logger.error("Task \"%s\" is invalid and will not be started.",
+                         name)
+        else:
+            logger.error("Task \"%s\" is invalid, the task with the old "
+                         "settings keeps running.", name)
+
+    def _log_failure(self, action, future):
+        """
+        Log the exception a job run by one of the executors raised, which
+        would be lost otherwise. Add it to the future of the job with
+        add_done_callback().
+
+        :param action: What the job did, for the log message.
+        :type action: str
+        """
+        error = future.exception()
+        if error is not None:
+            logger.error("%s failed: %s", action, str(error))
+
+    def _on_sighup(self):
+        """
+        Called from the main loop when the daemon receives SIGHUP.
+        """
+        future = self._config_executor.submit(self.reload_config)
+        future.add_done_callback(functools.partial(
+            self._log_failure, "Reloading the configuration file"))
+        # returning True keeps the signal handler installed
+        return True
 
     def _get_task_by_name(self, name):
         for task in self.tasks:
@@ -788,7 +1433,57 @@ class BackupManager(dbus.service.Object):
                 return task
         raise ValueError("task not found")
 
-    def _get_task(self, name):
+    def _get_task_settings(self, name):
+        """
+        Reads all values of the task with the specified name from the
+        configuration file, with the default values filled in. Two tasks with
+        equal settings behave the same.
+
+        :param name: The name of the task to read.
+        :type name: string
+
+        :rtype: dict
+        """
+        task_section = self.configmapper.task(name, fallback_on_default=True)
+
+        intervals = []
+        # the order of the intervals matters
+        for interval_name in task_section.interval_names:
+            intervals.append((
+                interval_name,
+                task_section.get_subsection(
+                    const.CONF_SECTION_INTERVALS)[interval_name],
+                task_section.get_subsection(
+                    const.CONF_SECTION_KEEP)[interval_name],
+                task_section.get_subsection(
+                    const.CONF_SECTION_AGE)[interval_name]))
+
+        return {
+            # these are overrideable values
+            "rsync_logfile": task_section.rsync_logfile,
+            "rsync_logfile_name": task_section.rsync_logfile_name,
+            "rsync_logfile_format": task_section.rsync_logfile_format,
+            "filter_patterns": task_section.filter_patterns,
+            "include_patterns": task_section.include_patterns,
+            "exclude_patterns": task_section.exclude_patterns,
+            "include_files": expand_env_vars_in_list(
+                task_section.include_files),
+            "exclude_files": expand_env_vars_in_list(
+                task_section.exclude_files),
+            "create_destination": task_section.create_destination,
+            "one_filesystem": task_section.one_filesystem,
+            "rsync_args": task_section.rsync_args,
+            "rsync_workers": task_section.rsync_workers,
+            "shards": task_section.shards,
+            # these values are unique for every task_section
+            "destination": expand_env_vars(task_section.destination),
+            "sources": expand_env_vars_in_list(task_section.sources),
+            "intervals": intervals,
+            # these values are the same for all tasks
+            "rsync_command": self.configmapper.rsync_command,
+            "rsync_progress": self.configmapper.rsync_progress}
+
+    def _get_task(self, name, settings=None):
         """
         Reads the task with the specified name from the configuration file and
         returns a Task object as a representation.
@@ -796,29 +1491,34 @@ class BackupManager(dbus.service.Object):
         :param name: The name of the task to load.
         :type name: string
 
+        :param settings: The settings of the task as returned by
+            :func:`_get_task_settings()`. If omitted, they are read from the
+            configuration file.
+        :type settings: dict
+
         :rtype: Task object.
         """
+        if settings is None:
+            settings = self._get_task_settings(name)
 
-        task_section = self.configmapper.task(name, fallback_on_default=True)
-
-        # these are overrideable values
-        rsync_logfile = task_section.rsync_logfile
-        rsync_logfile_name = task_section.rsync_logfile_name
-        rsync_logfile_format = task_section.rsync_logfile_format
+        rsync_logfile = settings["rsync_logfile"]
+        rsync_logfile_name = settings["rsync_logfile_name"]
+        rsync_logfile_format = settings["rsync_logfile_format"]
 
-        filter_patterns = task_section.filter_patterns
-        include_patterns = task_section.include_patterns
-        exclude_patterns = task_section.exclude_patterns
-        include_files = expand_env_vars_in_list(task_section.include_files)
-        exclude_files = expand_env_vars_in_list(task_section.exclude_files)
+        filter_patterns = settings["filter_patterns"]
+        include_patterns = settings["include_patterns"]
+        exclude_patterns = settings["exclude_patterns"]
+        include_files = settings["include_files"]
+        exclude_files = settings["exclude_files"]
 
-        create_destination = task_section.create_destination
-        one_filesystem = task_section.one_filesystem
-        rsync_args = task_section.rsync_args
+        create_destination = settings["create_destination"]
+        one_filesystem = settings["one_filesystem"]
+        rsync_args = settings["rsync_args"]
+        rsync_workers = settings["rsync_workers"]
+        shards = settings["shards"]
 
-        # these values are unique for every task_section
-        destination = expand_env_vars(task_section.destination)
-        sources = expand_env_vars_in_list(task_section.sources)
+        destination = settings["destination"]
+        sources = settings["sources"]
 
         for pattern in filter_patterns + include_patterns + exclude_patterns:
             if len(pattern) == 0:
@@ -849,19 +1549,13 @@ class BackupManager(dbus.service.Object):
                 sys.exit(const.EXIT_FILE_INVALID)
 
         task_scheduling_info = task.TaskSchedulingInfo()
-        # these are the subsection of the task that contain scheduling
-        # information we need to preserve order of the entries of the
-        # interval subsection
-        interval_names = task_section.interval_names
-        for interval_name in interval_names:
-            cron_pattern = task_section.get_subsection(
-                const.CONF_SECTION_INTERVALS)[interval_name]
+        for (interval_name, cron_pattern, keep_count, keep_age) in \
+                settings["intervals"]:
             cron_pattern = cron.Cronjob(cron_pattern)
 
             # converting is necessary as this key cannot be specified as int
             # in the configspec
-            keep_count = int(task_section.get_subsection(
-                const.CONF_SECTION_KEEP)[interval_name])
+            keep_count = int(keep_count)
 
             if keep_count <= 0:
                 logger.critical("Maximum value of key \"%s\" in section \"%s\" "
@@ -870,8 +1564,6 @@ class BackupManager(dbus.service.Object):
                                 const.CONF_SECTION_KEEP,
                                 name)
 
-            keep_age = task_section.get_subsection(const.CONF_SECTION_AGE)[
-                interval_name]
             keep_age = interval.Interval(keep_age)
 
             interval_info = task.IntervalInfo(name=interval_name,
@@ -900,10 +1592,18 @@ class BackupManager(dbus.service.Object):
             destination=destination,
             scheduling_info=task_scheduling_info,
             one_filesystem=one_filesystem,
-            rsync_cmd=self.configmapper.rsync_command,
+            rsync_cmd=settings["rsync_command"],
             rsync_args=rsync_args,
             rsync_logfile_options=rsync_logfile_options,
-            rsync_filter=rsync_filter)
+            rsync_filter=rsync_filter,
+            transfer_limiter=self.transfer_limiter,
+            reclaimer=self.reclaimer,
+            report_progress=settings["rsync_progress"],
+            progress_listener=self._on_task_progress,
+            rsync_workers=rsync_workers,
+            shards=shards,
+            status_board=self.status_board,
+            backup_listener=self._on_backup_finished)
 
     def _validate_values(self):
         rsync_cmd = self.configmapper.rsync_command
@@ -934,8 +1634,17 @@ class BackupManager(dbus.service.Object):
             logfile_path=self.configmapper.logfile_path,
             loglevel=self.configmapper.loglevel_as_int)
 
+        self.reclaimer.start()
         for task in self.tasks:
+            # backups that were not deleted completely before the last
+            # shutdown are still in the trash
+            self.reclaimer.recover(task.trash_folder)
             task.start()
+            self.scheduler.add(task)
+        self.scheduler.start()
+
+        gi.repository.GLib.unix_signal_add(gi.repository.GLib.PRIORITY_DEFAULT,
+                                           signal.SIGHUP, self._on_sighup)
 
         self._run_mainloop()
 
@@ -0,0 +1,283 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides a container for the backups of a task that is indexed by
+interval and date.
+
+A task needs to answer questions like "what is the latest backup of this
+interval" or "which backups of this interval are older than that date" all the
+time. Scanning all backups for each of these questions gets slow when a task
+keeps thousands of backups, so the :class:`BackupSet` keeps the backups of
+every interval in a list sorted by date. All of these questions can then be
+answered by bisecting and slicing.
+
+Additionally, the set keeps a reverse index from every backup to the backups
+whose data is only a link to it, so the links to a backup that is about to be
+removed can be found without inspecting every backup on disk.
+
+The backup set could be used like this::
+
+    import backupset
+
+    backups = backupset.BackupSet(list_of_backups)
+
+    backups.add(new_backup)
+
+    latest_hourly = backups.latest("hourly")
+
+    # the ten latest backups of all intervals
+    recent = backups.get_recent(10)
+
+    # all hourly backups apart from the 24 latest ones
+    superfluous = backups.get_oldest("hourly", keep_count=24)
+
+    # all hourly backups that are older than a day
+    too_old = backups.get_older_than("hourly", one_day_ago)
+
+    # all backups that link to the data of the given one
+    links = backups.get_links_to(backup)
+"""
+
+import bisect
+import heapq
+
+
+class BackupSet(object):
+    """
+    A set of backups, indexed by interval and date. Backups are identified by
+    their path.
+
+    :param backups: The backups the set initially contains.
+    :type backups: iterable of BackupStorage instances
+    """
+
+    def __init__(self, backups=None):
+        self._by_path = {}
+        self._intervals = {}
+        # maps the path of a link target to {path: backup} of all backups
+        # linking to it, and the path of every link to the target it is
+        # indexed under
+        self._links = {}
+        self._link_targets = {}
+        if backups is not None:
+            for backup in backups:
+                self.add(backup)
+
+    def __len__(self):
+        return len(self._by_path)
+
+    def __iter__(self):
+        return iter(list(self._by_path.values()))
+
+    def __contains__(self, backup):
+        return self._by_path.get(backup.path) is backup
+
+    def add(self, backup):
+        """
+        Add a backup to the set.
+
+        :param backup: The backup to add.
+        :type backup: BackupStorage instance
+
+        :raise ValueError: if a backup with the same path is already in the set
+        """
+        if backup.path in self._by_path:
+            raise ValueError("backup already in set")
+        self._by_path[backup.path] = backup
+        interval = self._intervals.get(backup.interval_name)
+        if interval is None:
+            interval = _IntervalBackups()
+            self._intervals[backup.interval_name] = interval
+        interval.add(backup)
+        self._index_link(backup)
+
+    def remove(self, backup):
+        """
+        Remove a backup from the set.
+
+        :param backup: The backup to remove.
+        :type backup: BackupStorage instance
+
+        :raise ValueError: if the backup is not in the set
+        """
+        if backup not in self:
+            raise ValueError("backup not found")
+        del self._by_path[backup.path]
+        interval = self._intervals[backup.interval_name]
+        interval.remove(backup)
+        if len(interval) == 0:
+            del self._intervals[backup.interval_name]
+        self._unindex_link(backup)
+
+    def get_by_path(self, path):
+        """
+        Return the backup with the given path, or None if there is none.
+
+        :type path: str
+
+        :rtype: BackupStorage instance or None
+        """
+        return self._by_path.get(path)
+
+    def get_links_to(self, backup):
+        """
+        Return all backups in the set whose data is a link to the data of the
+        given backup, sorted from oldest to latest.
+
+        :param backup: The backup that is linked to.
+        :type backup: BackupStorage instance
+
+        :rtype: list of BackupStorage instances
+        """
+        links = self._links.get(backup.path)
+        if links is None:
+            return []
+        return sorted(links.values(), key=lambda link: (link.date, link.path))
+
+    def update_link(self, backup):
+        """
+        Update the link index after the link target of a backup in the set has
+        changed.
+
+        :param backup: The backup whose link target has changed.
+        :type backup: BackupStorage instance
+
+        :raise ValueError: if the backup is not in the set
+        """
+        if backup not in self:
+            raise ValueError("backup not found")
+        self._unindex_link(backup)
+        self._index_link(backup)
+
+    def get_interval(self, interval_name):
+        """
+        Return all backups of the given interval, sorted from oldest to latest.
+
+        :type interval_name: str
+
+        :rtype: list of BackupStorage instances
+        """
+        interval = self._intervals.get(interval_name)
+        if interval is None:
+            return []
+        return list(interval.backups)
+
+    def latest(self, interval_name=None):
+        """
+        Return the latest backup of the given interval, or the latest backup
+        overall if no interval is given. Returns None if there is no such
+        backup.
+
+        :type interval_name: str
+
+        :rtype: BackupStorage instance or None
+        """
+        if interval_name is not None:
+            interval = self._intervals.get(interval_name)
+            if interval is None:
+                return None
+            return interval.backups[-1]
+        latest = None
+        for interval in self._intervals.values():
+            candidate = interval.backups[-1]
+            if latest is None or candidate.date > latest.date:
+                latest = candidate
+        return latest
+
+    def get_recent(self, count):
+        """
+        Return the `count` latest backups of all intervals, sorted from latest
+        to oldest.
+
+        :type count: int
+
+        :rtype: list of BackupStorage instances
+        """
+        if count <= 0:
+            return []
+        # only the latest backups of every interval can be among the result
+        candidates = [backup for interval in self._intervals.values() for
+                      backup in interval.backups[-count:]]
+        return heapq.nlargest(count, candidates,
+                              key=lambda backup: (backup.date, backup.path))
+
+    def get_oldest(self, interval_name, keep_count):
+        """
+        Return all backups of the interval apart from the `keep_count` latest
+        ones, sorted from oldest to latest.
+
+        :type interval_name: str
+
+        :type keep_count: int
+
+        :rtype: list of BackupStorage instances
+        """
+        interval = self._intervals.get(interval_name)
+        if interval is None:
+            return []
+        count = len(interval) - keep_count
+        if count <= 0:
+            return []
+        return interval.backups[:count]
+
+    def get_older_than(self, interval_name, date):
+        """
+        Return all backups of the interval that are older than the given date,
+        sorted from oldest to latest.
+
+        :type interval_name: str
+
+        :type date: datetime instance
+
+        :rtype: list of BackupStorage instances
+        """
+        interval = self._intervals.get(interval_name)
+        if interval is None:
+            return []
+        return interval.backups[:bisect.bisect_left(interval.keys, (date,))]
+
+    def _index_link(self, backup):
+        target = backup.link_target
+        if target is None:
+            return
+        self._links.setdefault(target, {})[backup.path] = backup
+        self._link_targets[backup.path] = target
+
+    def _unindex_link(self, backup):
+        target = self._link_targets.pop(backup.path, None)
+        if target is None:
+            return
+        links = self._links[target]
+        del links[backup.path]
+        if not links:
+            del self._links[target]
+
+
+class _IntervalBackups(object):
+    """
+    The backups of a single interval, sorted by date. Backups with the same date
+    are sorted by path. The sort keys are kept in a separate list, so the
+    position of a backup can be found by bisecting.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.backups = []
+
+    def __len__(self):
+        return len(self.backups)
+
+    def add(self, backup):
+        key = (backup.date, backup.path)
+        index = bisect.bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.backups.insert(index, backup)
+
+    def remove(self, backup):
+        key = (backup.date, backup.path)
+        index = bisect.bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            raise ValueError("backup not found")
+        del self.keys[index]
+        del self.backups[index]
@@ -23,6 +23,8 @@ The metadata file contains the following information about the project:
     - the name of the backup
     - the date of the backup
     - the interval the backup belongs to
+    - statistics about the creation of the backup, like the number of files
+      transferred and the time it took
 
 The access the metadata file, a separate class :class:`BackupMetadataFile` is
 used. It is responsible for actually reading, writing and parsing the metadata
@@ -70,6 +72,8 @@ For creating a new backup the class could be used like this::
     newfolder.set_metadata(name=my_backup_name,
                            date=backup_creation_time,
                            interval_name=my_backup_interval)
+    newfolder.set_statistics({"rsync.number_of_files": 1234,
+                              "time.transfer": 12.5})
 
     # save the metadata and mark the backup as finished
     newfolder.finish()
@@ -118,6 +122,9 @@ class BackupStorage(object):
     def set_metadata(self, name, date, interval_name):
         raise NotImplementedError()
 
+    def set_statistics(self, statistics):
+        raise NotImplementedError()
+
     def prepare(self):
         raise NotImplementedError()
 
@@ -148,6 +155,10 @@ class BackupStorage(object):
     def interval_name(self):
         raise NotImplementedError()
 
+    @property
+    def statistics(self):
+        raise NotImplementedError()
+
     @property
     def folder(self):
         raise NotImplementedError()
@@ -184,6 +195,7 @@ class BackupFolder(BackupStorage):
     def __init__(self, path):
         BackupStorage.__init__(self)
         self._path = path
+        self._link_target = None
         self.meta_file = BackupMetadataFile(
             os.path.join(self.path, const.NAME_META_FILE))
 
@@ -204,10 +216,29 @@ class BackupFolder(BackupStorage):
             raise InvalidBackupError(
                 self.path,
                 "metadata file could not be read: %s" % str(error))
+        except InvalidMetaFileError as error:
+            raise InvalidBackupError(
+                self.path,
+                "metadata file is invalid: %s" % error.message)
         self.date = self.meta_file.date
         self.name = self.meta_file.name
         self.interval_name = self.meta_file.interval
 
+    def _read_link_target(self):
+        """
+        Determine the path of the backup folder the data is linked to, or None
+        if the data is not a link.
+        """
+        if not os.path.islink(self.data_path):
+            self._link_target = None
+            return
+        # the link is relative, so it has to be resolved relative to the
+        # folder containing it. os.path.realpath() is not used, as it would
+        # resolve symlinks in the path of the destination, too.
+        target = os.path.normpath(os.path.join(
+            os.path.dirname(self.data_path), os.readlink(self.data_path)))
+        self._link_target = os.path.dirname(target)
+
     def load_metadata(self):
         """
         Loads the metadata of the folder.
@@ -216,6 +247,31 @@ class BackupFolder(BackupStorage):
             does not contain a metadata file or the metadata file is invalid.
         """
         self._read_meta_file()
+        self._read_link_target()
+
+    def restore_metadata(self, name, date, interval_name, link_target=None):
+        """
+        Set the metadata of a finished backup that is already known from
+        somewhere else, e.g. a catalog, without reading the metadata file.
+
+        :param name: The name of the backup.
+        :type name: str
+
+        :param date: The date the backup was created.
+        :type date: datetime instance
+
+        :param interval_name: The interval this backup belongs to
+        :type interval_name: str
+
+        :param link_target: The path of the backup folder the data is linked
+            to, or None if the data is not a link.
+        :type link_target: str
+        """
+        self.name = name
+        self.date = date
+        self.interval_name = interval_name
+        self.meta_file.set_info(name, date, interval_name)
+        self._link_target = link_target
 
     @_only_unfinished
     def _write_meta_file(self):
@@ -255,6 +311,43 @@ class BackupFolder(BackupStorage):
         self.interval_name = interval_name
         self.meta_file.set_info(name, date, interval_name)
 
+    @_only_unfinished
+    def set_statistics(self, statistics):
+        """
+        Set statistics about the creation of the backup, which are saved in the
+        metadata file together with the other metadata.
+
+        .. note:: You cannot perform this operation on a finished backup.
+
+        :param statistics: The statistics. The keys must not contain "=" or
+            line breaks, the values have to be numbers or strings without line
+            breaks.
+        :type statistics: dict
+
+        :raise BackupStorageIllegalOperationError:
+            if you try this operation on a finished backup
+        """
+        self.meta_file.statistics = dict(statistics)
+
+    @property
+    def statistics(self):
+        """
+        The statistics about the creation of the backup. Backups created by
+        older versions do not have any. If the metadata was not read from the
+        metadata file, e.g. because it was restored from a catalog, the file is
+        read now.
+
+        :rtype: dict
+        """
+        if self.meta_file.statistics is None:
+            try:
+                self.meta_file.read()
+            except (IOError, InvalidMetaFileError) as error:
+                logger.warning("Could not read statistics of backup \"%s\": "
+                               "%s", self.path, str(error))
+                return {}
+        return self.meta_file.statistics
+
     @_only_unfinished
     def prepare(self):
         """
@@ -320,6 +413,7 @@ class BackupFolder(BackupStorage):
                     link_name,
                     link_target)
         files.create_symlink(link_target, link_name)
+        self._link_target = storage.path
 
     def data_is_link(self):
         """
@@ -373,6 +467,7 @@ class BackupFolder(BackupStorage):
         if not self.data_is_link():
             raise ValueError("the data is not a link")
         files.remove_symlink(self.data_path)
+        self._link_target = None
 
     def move_data_to(self, storage):
         """
@@ -431,6 +526,15 @@ class BackupFolder(BackupStorage):
     def interval_name(self, value):
         self._interval_name = value
 
+    @property
+    def link_target(self):
+        """
+        The path of the backup folder the data is linked to, or None if the
+        data is not a link. This is only known after the metadata has been
+        loaded or the data has been linked.
+        """
+        return self._link_target
+
     @property
     def folder(self):
         """
@@ -458,6 +562,21 @@ class BackupMetadataFile(object):
     Represents the metadata file containing information about a specific backup
     contained in the backup folder.
 
+    The file starts with a header line containing the version of the format,
+    followed by one "key=value" line for every piece of information::
+
+        rbackupd-metadata 2
+        name=main_2014-01-01T00:00:00_daily.snapshot
+        date=2014-01-01T00:00:00
+        interval=daily
+        rsync.number_of_files=1234
+        time.transfer=12.5
+
+    Apart from the name, date and interval, all keys are statistics. Unknown
+    keys are preserved, so new statistics can be added without changing the
+    version. Files of the legacy format, which consists of exactly three lines
+    containing the name, date and interval, can still be read.
+
     :param path: The path to the metadata file.
     :type path: str
     """
@@ -467,6 +586,8 @@ class BackupMetadataFile(object):
         self.name = None
         self.date = None
         self.interval = None
+        # None until the file was read or the statistics were set
+        self.statistics = None
 
     def read(self):
         """
@@ -478,25 +599,62 @@ class BackupMetadataFile(object):
 
         """
         logger.debug("Reading metadata file \"%s\".", self.path)
-        try:
-            lines = open(self.path).readlines()
-        except IOError:
-            raise
+        with open(self.path) as meta_file:
+            lines = [line.rstrip("\n") for line in meta_file.readlines()]
         logger.debug("Content: %s.", lines)
 
-        if len(lines) != const.META_FILE_LINES:
-            raise InvalidMetaFileError(self.path, "invalid number of lines")
-        self.name = lines[const.META_FILE_INDEX_NAME].strip()
+        if lines and lines[0].startswith(const.META_FILE_HEADER + " "):
+            values = self._parse_versioned(lines)
+        else:
+            values = self._parse_legacy(lines)
+
+        self.name = values.pop(const.META_FILE_KEY_NAME)
         logger.debug("Name set to \"%s\".", self.name)
         try:
-            self.date = self._unpack_date(
-                lines[const.META_FILE_INDEX_DATE].strip())
+            self.date = self._unpack_date(values.pop(const.META_FILE_KEY_DATE))
         except ValueError as error:
             message = str(error)
             raise InvalidMetaFileError(self.path, message)
         logger.debug("Date set to \"%s\".", self.date.isoformat())
-        self.interval = lines[const.META_FILE_INDEX_INTERVAL].strip()
+        self.interval = values.pop(const.META_FILE_KEY_INTERVAL)
         logger.debug("Interval set to \"%s\".", self.interval)
+        self.statistics = dict((key, self._unpack_value(value)) for
+                               (key, value) in values.items())
+
+    def _parse_legacy(self, lines):
+        if len(lines) != const.META_FILE_LINES:
+            raise InvalidMetaFileError(self.path, "invalid number of lines")
+        return {
+            const.META_FILE_KEY_NAME:
+                lines[const.META_FILE_INDEX_NAME].strip(),
+            const.META_FILE_KEY_DATE:
+                lines[const.META_FILE_INDEX_DATE].strip(),
+            const.META_FILE_KEY_INTERVAL:
+                lines[const.META_FILE_INDEX_INTERVAL].strip()}
+
+    def _parse_versioned(self, lines):
+        try:
+            version = int(lines[0][len(const.META_FILE_HEADER):])
+        except ValueError:
+            raise InvalidMetaFileError(self.path, "invalid version")
+        if version > const.META_FILE_VERSION:
+            raise InvalidMetaFileError(
+                self.path, "unsupported version %s" % version)
+        values = {}
+        for line in lines[1:]:
+            if not line.strip():
+                continue
+            (key, separator, value) = line.partition("=")
+            if not separator:
+                raise InvalidMetaFileError(
+                    self.path, "invalid line \"%s\"" % line)
+            values[key.strip()] = value.strip()
+        for key in (const.META_FILE_KEY_NAME,
+                    const.META_FILE_KEY_DATE,
+                    const.META_FILE_KEY_INTERVAL):
+            if key not in values:
+                raise InvalidMetaFileError(self.path, "%s missing" % key)
+        return values
 
     def set_info(self, name, date, interval):
         """
@@ -532,12 +690,25 @@ class BackupMetadataFile(object):
 
         :rtype: str
         """
-        content = [None] * const.META_FILE_LINES
-        content[const.META_FILE_INDEX_NAME] = self.name
-        content[const.META_FILE_INDEX_DATE] = self._pack_date(self.date)
-        content[const.META_FILE_INDEX_INTERVAL] = self.interval
-        ret = "\n".join([str(f) for f in content]) + "\n"
-        return ret
+        lines = ["%s %s" % (const.META_FILE_HEADER, const.META_FILE_VERSION)]
+        lines.append("%s=%s" % (const.META_FILE_KEY_NAME, self.name))
+        lines.append("%s=%s" % (const.META_FILE_KEY_DATE,
+                                self._pack_date(self.date)))
+        lines.append("%s=%s" % (const.META_FILE_KEY_INTERVAL, self.interval))
+        for (key, value) in sorted((self.statistics or {}).items()):
+            lines.append("%s=%s" % (key, value))
+        return "\n".join(lines) + "\n"
+
+    def _unpack_value(self, content):
+        """
+        Convert the value of a statistic into a number if possible.
+        """
+        for convert in (int, float):
+            try:
+                return convert(content)
+            except ValueError:
+                pass
+        return content
 
     def _unpack_date(self, content):
         """
@@ -590,7 +761,7 @@ class InvalidBackupError(Exception):
     """
 
     def __init__(self, path, message):
-        Exception.__init__()
+        Exception.__init__(self, message)
         self.path = path
         self.message = message
 
@@ -608,7 +779,7 @@ class InvalidMetaFileError(Exception):
     :type message: str
     """
     def __init__(self, path, message):
-        Exception.__init__()
+        Exception.__init__(self, message)
         self.path = path
         self.message = message
 
@@ -625,6 +796,6 @@ class BackupStorageIllegalOperationError(Exception):
     :type message: str
     """
     def __init__(self, backup_storage, message):
-        Exception.__init__()
+        Exception.__init__(self, message)
         self.backup_storage = backup_storage
         self.message = message
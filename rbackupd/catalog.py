@@ -0,0 +1,175 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides a catalog of all backups stored in a destination.
+
+Reading the backups of a destination by inspecting every backup folder and
+parsing its metadata file takes a lot of time when there are thousands of
+backups, especially on slow disks. The :class:`Catalog` stores the metadata of
+all backups of a destination in a single file, so it can be read in one go.
+For every backup that is only a link to the data of another backup, the
+catalog also stores the link target, so the links between backups are known
+without inspecting the folders. The catalog file is located in a hidden
+subfolder of the destination::
+
+    destination ---+--- .rbackupd ---+--- catalog
+                   |
+                   +--- <backup folder 1>
+                   |
+                   +--- <backup folder 2>
+                   |
+                   ...
+
+Together with the backups, the catalog stores the modification time and the
+number of entries of the destination folder at the time it was written. When
+the catalog is loaded, these are compared to the current values, which is
+cheap. If they differ, the destination was changed behind the back of the
+catalog and it is considered stale. As the catalog file itself lives in a
+subfolder, writing it does not change the destination folder.
+
+The catalog could be used like this::
+
+    import catalog
+
+    destination_catalog = catalog.Catalog("/path/to/destination")
+
+    backups = destination_catalog.load()
+    if backups is None:
+        # the catalog is missing or stale, read the backups from disk
+        backups = read_backups()
+        destination_catalog.save(backups)
+"""
+
+import datetime
+import json
+import logging
+import os
+
+from rbackupd import backupstorage
+from rbackupd import constants as const
+
+logger = logging.getLogger(__name__)
+
+# Increase this whenever the structure of the catalog file changes, so old
+# catalogs are discarded instead of being misinterpreted.
+CATALOG_VERSION = 2
+
+
+class Catalog(object):
+    """
+    Represents the catalog of all backups stored in a destination.
+
+    :param destination: The path to the destination.
+    :type destination: str
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.folder = os.path.join(destination, const.NAME_CATALOG_FOLDER)
+        self.path = os.path.join(self.folder, const.NAME_CATALOG_FILE)
+
+    def load(self):
+        """
+        Read the backups from the catalog file.
+
+        :returns: All backups listed in the catalog, or None if the catalog
+            does not exist, is invalid or stale.
+        :rtype: list of BackupFolder instances or None
+        """
+        try:
+            with open(self.path) as catalog_file:
+                content = json.load(catalog_file)
+        except (IOError, OSError):
+            logger.debug("No catalog found at \"%s\".", self.path)
+            return None
+        except ValueError as error:
+            logger.warning("Catalog at \"%s\" is invalid and will be "
+                           "ignored: %s", self.path, str(error))
+            return None
+
+        if content.get("version") != CATALOG_VERSION:
+            logger.debug("Catalog at \"%s\" has an unknown version.",
+                         self.path)
+            return None
+        (mtime, count) = self._get_destination_state()
+        if content.get("mtime") != mtime or content.get("count") != count:
+            logger.verbose("Catalog at \"%s\" is stale.", self.path)
+            return None
+
+        try:
+            backups = [self._unpack_entry(entry) for
+                       entry in content["backups"]]
+        except (KeyError, TypeError, ValueError) as error:
+            logger.warning("Catalog at \"%s\" is invalid and will be "
+                           "ignored: %s", self.path, str(error))
+            return None
+        logger.debug("Read %s backups from catalog \"%s\".",
+                     len(backups), self.path)
+        return backups
+
+    def save(self, backups):
+        """
+        Write the catalog file atomically, so a crash leaves either the old or
+        the new catalog behind, but never a partially written one.
+
+        :param backups: All backups stored in the destination.
+        :type backups: iterable of BackupFolder instances
+
+        :raise OSError: if the catalog could not be written
+        """
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+        # this has to happen after creating the catalog folder, as that
+        # changes the destination folder
+        (mtime, count) = self._get_destination_state()
+        content = {
+            "version": CATALOG_VERSION,
+            "mtime": mtime,
+            "count": count,
+            "backups": [self._pack_entry(backup) for backup in backups]}
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as catalog_file:
+            json.dump(content, catalog_file, separators=(",", ":"))
+            catalog_file.flush()
+            os.fsync(catalog_file.fileno())
+        os.rename(temp_path, self.path)
+        logger.debug("Wrote %s backups to catalog \"%s\".",
+                     len(content["backups"]), self.path)
+
+    def _get_destination_state(self):
+        """
+        Return the modification time in nanoseconds and the number of entries
+        of the destination folder.
+
+        :rtype: tuple
+        """
+        mtime = os.stat(self.destination).st_mtime_ns
+        count = len(os.listdir(self.destination))
+        return (mtime, count)
+
+    def _pack_entry(self, backup):
+        link = None
+        if backup.link_target is not None:
+            link = os.path.basename(backup.link_target)
+        return {
+            "folder": backup.folder,
+            "name": backup.name,
+            "date": backup.date.strftime(const.META_FILE_DATE_FORMAT),
+            "interval": backup.interval_name,
+            "link": link}
+
+    def _unpack_entry(self, entry):
+        backup = backupstorage.BackupFolder(
+            os.path.join(self.destination, entry["folder"]))
+        link_target = None
+        if entry["link"] is not None:
+            link_target = os.path.join(self.destination, entry["link"])
+        backup.restore_metadata(
+            name=entry["name"],
+            date=datetime.datetime.strptime(entry["date"],
+                                            const.META_FILE_DATE_FORMAT),
+            interval_name=entry["interval"],
+            link_target=link_target)
+        return backup
@@ -0,0 +1,114 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides the clocks the scheduling and retention logic reads the
+time from.
+
+Cronjobs, intervals, tasks and the scheduler never ask the system for the
+current time directly, but ask the clock they were given. By default, this is
+the :data:`SYSTEM_CLOCK`. A :class:`ManualClock` only moves when it is told
+to, which makes it possible to run months of schedules in a few seconds, e.g.
+in the retention simulator or in tests::
+
+    import datetime
+
+    import clocks
+
+    clock = clocks.ManualClock(datetime.datetime(2014, 1, 1))
+    cronjob = cron.Cronjob("0 * * * * *", clock=clock)
+
+    clock.advance(datetime.timedelta(hours=1))
+    cronjob.has_occured_since(datetime.datetime(2014, 1, 1),
+                              include_start=False)  # True
+"""
+
+import datetime
+import threading
+import time
+
+
+class SystemClock(object):
+    """
+    A clock that returns the time of the system.
+    """
+
+    def now(self):
+        """
+        Return the current local date and time.
+
+        :rtype: datetime instance
+        """
+        return datetime.datetime.now()
+
+    def monotonic(self):
+        """
+        Return the value of a monotonic clock in seconds, which is only
+        meaningful compared to other values of the same clock.
+
+        :rtype: float
+        """
+        return time.monotonic()
+
+
+class ManualClock(object):
+    """
+    A clock that stands still until it is advanced explicitly.
+
+    :param start: The time the clock starts at.
+    :type start: datetime instance
+    """
+
+    def __init__(self, start):
+        self._now = start
+        self._monotonic = 0.0
+        self._lock = threading.Lock()
+
+    def now(self):
+        """
+        Return the current time of the clock.
+
+        :rtype: datetime instance
+        """
+        with self._lock:
+            return self._now
+
+    def monotonic(self):
+        """
+        Return the number of seconds the clock has been advanced since it was
+        created.
+
+        :rtype: float
+        """
+        with self._lock:
+            return self._monotonic
+
+    def advance(self, delta):
+        """
+        Move the clock forward.
+
+        :param delta: The time to move the clock forward by.
+        :type delta: timedelta instance
+
+        :raise ValueError: if delta is negative
+        """
+        if delta < datetime.timedelta(0):
+            raise ValueError("a clock cannot go backwards")
+        with self._lock:
+            self._now += delta
+            self._monotonic += delta.total_seconds()
+
+    def set(self, date_time):
+        """
+        Move the clock forward to the given time.
+
+        :param date_time: The new time of the clock.
+        :type date_time: datetime instance
+
+        :raise ValueError: if date_time lies before the current time
+        """
+        self.advance(date_time - self.now())
+
+
+# The clock that is used if no other clock is given.
+SYSTEM_CLOCK = SystemClock()
@@ -3,82 +3,330 @@
 
 """
 This module wraps frequently needed operations on files and directories.
+
+All operations are done in-process instead of calling external tools like
+``rm``, ``ln``, ``mv`` and ``cp``, as forking a process for every symlink that
+is created or removed costs more than the operation itself. Operations on whole
+directory trees walk the tree level by level and process all directories of a
+level concurrently in a pool of threads, which keeps the disk busy when it
+could serve several requests at once.
+
+If an operation fails, :class:`FileOperationError` is raised, which contains
+all errors that occured::
+
+    from rbackupd.cmd import files
+
+    try:
+        files.remove_recursive("/path/to/directory")
+    except files.FileOperationError as error:
+        for (path, os_error) in error.errors:
+            print(path, os_error)
 """
 
+import concurrent.futures
+import functools
 import logging
 import os
+import shutil
+import uuid
 
-from rbackupd.cmd import process
+from rbackupd import constants as const
 
 logger = logging.getLogger(__name__)
 
 
+class FileOperationError(Exception):
+    """
+    Raised when an operation on files or directories failed.
+
+    :param operation: The name of the operation that failed.
+    :type operation: str
+
+    :param path: The path the operation was called on.
+    :type path: str
+
+    :param errors: All errors that occured, as tuples of the path that caused
+        the error and the error itself.
+    :type errors: list of (str, OSError) tuples
+    """
+
+    def __init__(self, operation, path, errors):
+        self.operation = operation
+        self.path = path
+        self.errors = errors
+        message = "%s of \"%s\" failed: %s" % (operation, path, errors[0][1])
+        if len(errors) > 1:
+            message += " (and %s more errors)" % (len(errors) - 1)
+        Exception.__init__(self, message)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
 def remove_symlink(path):
     """
     Removes a symlink.
 
     :param path: The path of the symlink.
     :type path: str
+
+    :raise FileOperationError: if the symlink could not be removed
     """
     # to remove a symlink, we have to strip the trailing
     # slash from the path
+    path = path.rstrip("/")
     if not os.path.islink(path):
         raise ValueError("%s not a symlink" % path)
-    args = ["rm", path.rstrip("/")]
-    process.check_call(args)
+    logger.debug("Removing symlink \"%s\".", path)
+    try:
+        os.unlink(path)
+    except OSError as error:
+        raise FileOperationError("removal", path, [(path, error)])
+
+
+def _get_relative_target(target, linkname):
+    """
+    Return the path of target relative to the folder containing linkname.
+    Symlinks in both paths are resolved first, so the result is the same as
+    with ``ln --relative``.
+    """
+    return os.path.relpath(
+        os.path.realpath(target),
+        os.path.realpath(os.path.dirname(os.path.abspath(linkname))))
 
 
 def create_symlink(target, linkname):
     """
-    Creates a symlink at <linkname> that points to <target>.
+    Creates a symlink at <linkname> that points to <target>. The symlink is
+    relative, so it remains valid when the folder containing both is moved.
 
     :param target: The target the symlink points to.
     :type target: str
 
     :param linkname: The path of the symlink.
     :type linkname: str
+
+    :raise FileOperationError: if the symlink could not be created
     """
     if not os.path.exists(target):
         raise ValueError("%s does not exist" % target)
     if os.path.exists(linkname):
         raise ValueError("%s already exists" % linkname)
-    args = ["ln", "-s", "-r", target, linkname]
-    process.check_call(args)
+    relative_target = _get_relative_target(target, linkname)
+    logger.debug("Creating symlink \"%s\" pointing to \"%s\".",
+                 linkname, relative_target)
+    try:
+        os.symlink(relative_target, linkname)
+    except OSError as error:
+        raise FileOperationError("symlink creation", linkname,
+                                 [(linkname, error)])
+
+
+def replace_symlink(target, linkname):
+    """
+    Makes the symlink at <linkname> point to <target>, creating it if it does
+    not exist yet. The symlink is replaced atomically, so it always exists and
+    points either to the old or to the new target.
+
+    :param target: The target the symlink points to.
+    :type target: str
+
+    :param linkname: The path of the symlink.
+    :type linkname: str
+
+    :raise FileOperationError: if the symlink could not be replaced
+    """
+    if not os.path.exists(target):
+        raise ValueError("%s does not exist" % target)
+    if os.path.exists(linkname) and not os.path.islink(linkname):
+        raise ValueError("%s exists and is not a symlink" % linkname)
+    relative_target = _get_relative_target(target, linkname)
+    # the temporary symlink has to be created in the same folder, as the
+    # rename is only atomic on the same filesystem
+    temp_linkname = "%s.%s.tmp" % (linkname, uuid.uuid4().hex)
+    logger.debug("Replacing symlink \"%s\", new target is \"%s\".",
+                 linkname, relative_target)
+    try:
+        os.symlink(relative_target, temp_linkname)
+        try:
+            os.replace(temp_linkname, linkname)
+        except OSError:
+            os.unlink(temp_linkname)
+            raise
+    except OSError as error:
+        raise FileOperationError("symlink replacement", linkname,
+                                 [(linkname, error)])
 
 
 def move(path, target):
     """
-    Moves a file or directory.
+    Moves a file or directory. Both paths have to be on the same filesystem.
 
     :param path: The path to the file/directory to move.
     :type path: str
 
     :param target: The path to move to.
     :type target: str
+
+    :raise FileOperationError: if the file or directory could not be moved
     """
     if not os.path.exists(path):
         raise ValueError("%s does not exist" % path)
     if os.path.exists(target):
         raise ValueError("%s does already exist" % target)
-    args = ["mv", path, target]
-    process.check_call(args)
+    logger.debug("Moving \"%s\" to \"%s\".", path, target)
+    try:
+        os.rename(path, target)
+    except OSError as error:
+        raise FileOperationError("move", path, [(path, error)])
 
 
-def remove_recursive(path):
+def _walk_levels(root, process_directory, errors, workers):
+    """
+    Call process_directory for root and all directories below it, one level of
+    the tree after another. All directories of a level are processed
+    concurrently. process_directory is called with the directory and errors
+    and has to return the subdirectories that should be processed on the next
+    level.
+
+    Errors are appended to errors, processing continues with the remaining
+    directories. process_directory appends the errors of single entries
+    itself and only raises OSError if the directory cannot be read at all.
+
+    :returns: All directories that were processed successfully, parents before
+        their children.
+    :rtype: list
+    """
+    processed = []
+    level = [root]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            futures = [(directory,
+                        pool.submit(process_directory, directory, errors))
+                       for directory in level]
+            level = []
+            for (directory, future) in futures:
+                try:
+                    level.extend(future.result())
+                except OSError as error:
+                    errors.append((error.filename, error))
+                else:
+                    processed.append(directory)
+    return processed
+
+
+def _clear_directory(path, errors, throttle):
+    """
+    Remove everything but the subdirectories from a directory and return the
+    subdirectories. Symlinks to directories are removed, not followed.
+    Entries that cannot be removed are appended to errors.
+    """
+    subdirectories = []
+    for entry in os.scandir(path):
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append(entry.path)
+                continue
+        except OSError as error:
+            errors.append((entry.path, error))
+            continue
+        throttle()
+        try:
+            os.unlink(entry.path)
+        except OSError as error:
+            errors.append((entry.path, error))
+    return subdirectories
+
+
+def _no_throttle():
+    pass
+
+
+def remove_recursive(path, workers=const.FILE_OPERATION_WORKERS,
+                     throttle=None):
     """
     Removes a file or directory. If the target is a directory, it will be
-    deleted recursively.
+    deleted recursively. Symlinks are never followed.
 
     :param path: The path to delete.
     :type path: str
+
+    :param workers: The number of threads used to remove a directory tree.
+    :type workers: int
+
+    :param throttle: If given, this is called before every single file or
+        directory is removed. It may block to limit the rate of removals, or
+        raise an exception to abort the removal, which is then propagated.
+    :type throttle: callable
+
+    :raise FileOperationError: if anything could not be removed. Everything
+        else is removed nevertheless.
     """
-    if not os.path.exists(path):
+    if not os.path.lexists(path):
         raise ValueError("%s does not exist" % path)
-    args = ["rm", "-r", "-f", path]
-    process.check_call(args)
+    if throttle is None:
+        throttle = _no_throttle
+    logger.debug("Removing \"%s\" recursively.", path)
+    errors = []
+    if os.path.isdir(path) and not os.path.islink(path):
+        directories = _walk_levels(
+            path, functools.partial(_clear_directory, throttle=throttle),
+            errors, workers)
+        # children come after their parents, so removing in reverse order
+        # only removes directories that are already empty
+        for directory in reversed(directories):
+            throttle()
+            try:
+                os.rmdir(directory)
+            except OSError as error:
+                errors.append((directory, error))
+    else:
+        throttle()
+        try:
+            os.unlink(path)
+        except OSError as error:
+            errors.append((path, error))
+    if errors:
+        raise FileOperationError("removal", path, errors)
+
+
+def _copy_directory_metadata(path, target):
+    """
+    Copy permissions, timestamps and, if possible, ownership of a directory.
+    """
+    shutil.copystat(path, target, follow_symlinks=False)
+    stat = os.lstat(path)
+    try:
+        os.chown(target, stat.st_uid, stat.st_gid, follow_symlinks=False)
+    except PermissionError:
+        # only root may give files away, the same as with "cp -a"
+        pass
 
 
-def copy_hardlinks(path, target):
+def _link_directory(paths, errors):
+    """
+    Hardlink everything but the subdirectories of a directory into the target
+    directory, create the subdirectories in the target and return them.
+    Entries that cannot be linked or created are appended to errors.
+    """
+    (path, target) = paths
+    subdirectories = []
+    for entry in os.scandir(path):
+        entry_target = os.path.join(target, entry.name)
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                os.mkdir(entry_target)
+                subdirectories.append((entry.path, entry_target))
+            else:
+                # symlinks and special files are linked themselves, too
+                os.link(entry.path, entry_target, follow_symlinks=False)
+        except OSError as error:
+            errors.append((entry.path, error))
+    return subdirectories
+
+
+def copy_hardlinks(path, target, workers=const.FILE_OPERATION_WORKERS):
     """
     Makes a copy of a file or directory, the files or all files in the
     directory will be hardlinked together.
@@ -88,12 +336,78 @@ def copy_hardlinks(path, target):
 
     :param taget: The path to copy to.
     :type target: str
+
+    :param workers: The number of threads used to copy a directory tree.
+    :type workers: int
+
+    :raise FileOperationError: if anything could not be copied. Everything
+        else is copied nevertheless.
     """
     if not os.path.exists(path):
         raise ValueError("%s does not exist" % path)
     if os.path.exists(target):
         raise ValueError("%s does already exist" % target)
-    # we could alternatively use rsync with destination being the same as
-    # link-dest, this would create only hardlinks, too
-    args = ["cp", "-a", "-l", path, target]
-    process.check_call(args)
+    logger.debug("Copying \"%s\" to \"%s\" using hardlinks.", path, target)
+    errors = []
+    if os.path.isdir(path) and not os.path.islink(path):
+        try:
+            os.mkdir(target)
+        except OSError as error:
+            raise FileOperationError("copy", path, [(target, error)])
+        directories = _walk_levels((path, target), _link_directory, errors,
+                                   workers)
+        # the modification times have to be set after the content of the
+        # directories was created, so do it from the bottom up
+        for (directory, directory_target) in reversed(directories):
+            try:
+                _copy_directory_metadata(directory, directory_target)
+            except OSError as error:
+                errors.append((directory, error))
+    else:
+        try:
+            os.link(path, target, follow_symlinks=False)
+        except OSError as error:
+            errors.append((path, error))
+    if errors:
+        raise FileOperationError("copy", path, errors)
+
+
+def sample_files(path, count, max_entries):
+    """
+    Return the paths of up to `count` regular files below a directory,
+    relative to it. The directory is walked breadth-first and the walk stops
+    after `max_entries` directory entries, so this stays cheap for huge trees.
+    Directories that cannot be read are skipped.
+
+    :param path: The path of the directory.
+    :type path: str
+
+    :param count: The maximum number of files to return.
+    :type count: int
+
+    :param max_entries: The maximum number of entries to look at.
+    :type max_entries: int
+
+    :rtype: list of str
+    """
+    samples = []
+    seen = 0
+    level = [""]
+    while level and len(samples) < count and seen < max_entries:
+        next_level = []
+        for relative_path in level:
+            try:
+                entries = list(os.scandir(os.path.join(path, relative_path)))
+            except OSError:
+                continue
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                seen += 1
+                entry_path = os.path.join(relative_path, entry.name)
+                if entry.is_file(follow_symlinks=False):
+                    samples.append(entry_path)
+                elif entry.is_dir(follow_symlinks=False):
+                    next_level.append(entry_path)
+                if len(samples) == count or seen == max_entries:
+                    return samples
+        level = next_level
+    return samples
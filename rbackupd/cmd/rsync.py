@@ -4,19 +4,48 @@
 """
 This module wraps the rsync(1) command. It provides classes for special
 arguments of rsync for ease of use.
+
+The output of rsync is not collected as a whole, as it contains a line for
+every transferred file with the usual arguments, which would have to be kept in
+memory until rsync exits. Instead, it is read line by line while rsync is
+running and every line is passed to handlers, which are callables taking the
+line as their only argument. Handlers could count lines, log them or keep the
+last few of them in a :class:`TailBuffer` for error reports::
+
+    from rbackupd.cmd import rsync
+
+    counter = rsync.LineCounter()
+    (returncode, stdout_tail, stderr_tail) = rsync.rsync(
+        ...,
+        stdout_handlers=[counter, rsync.LineLogger(logging.DEBUG)])
+
+With ``progress=True``, rsync reports the progress of the whole transfer
+(``--info=progress2``, rsync 3.1.0 or later), which can be parsed by a
+:class:`ProgressParser`::
+
+    def report(progress):
+        print(progress.percent, progress.rate, progress.eta)
+
+    rsync.rsync(..., progress=True,
+                stdout_handlers=[rsync.ProgressParser(report)])
 """
 
+import collections
 import logging
 import os
+import re
 import shlex
+import threading
 
+from rbackupd import constants as const
 from rbackupd.cmd import process
 
 logger = logging.getLogger(__name__)
 
 
-def rsync(command, sources, destination, link_ref, arguments, rsyncfilter,
-          loggingOptions):
+def rsync(command, sources, destination, link_refs, arguments, rsyncfilter,
+          loggingOptions, stdout_handlers=None, stderr_handlers=None,
+          progress=False, stats=False):
     """
     Runs the rsync command with specific parameters.
 
@@ -30,10 +59,12 @@ def rsync(command, sources, destination, link_ref, arguments, rsyncfilter,
     :param destination: The path to the destination of the transfer.
     :type destination: str
 
-    :param link_ref: The path used for the --link-dest parameter of rsync. All
-                     files found there will not be copied from source, but
-                     hardlinked into destination.
-    :type link_ref: str
+    :param link_refs: The paths used for the --link-dest parameters of rsync.
+                      All files found in one of them will not be copied from
+                      source, but hardlinked into destination. rsync checks
+                      them in the given order and uses at most
+                      :data:`const.RSYNC_MAX_LINK_DEST` of them.
+    :type link_refs: list of str
 
     :param arguments: A tuple containing additional arguments that will be
                       passed to rsync.
@@ -45,6 +76,26 @@ def rsync(command, sources, destination, link_ref, arguments, rsyncfilter,
 
     :param loggingOptions: Information about the logging rsync will do.
     :type loggingOptions: LogfileOptions instance
+
+    :param stdout_handlers: Callables every line rsync writes to stdout is
+                            passed to.
+    :type stdout_handlers: list
+
+    :param stderr_handlers: Callables every line rsync writes to stderr is
+                            passed to.
+    :type stderr_handlers: list
+
+    :param progress: Whether rsync should report the progress of the whole
+                     transfer on stdout.
+    :type progress: bool
+
+    :param stats: Whether rsync should print statistics about the transfer on
+                  stdout when it has finished, see :class:`StatsParser`.
+    :type stats: bool
+
+    :returns: The returncode of rsync and the last lines it wrote to stdout
+              and stderr.
+    :rtype: tuple (int, str, str)
     """
     args = [command]
 
@@ -52,8 +103,20 @@ def rsync(command, sources, destination, link_ref, arguments, rsyncfilter,
 
     args.extend(shlex.split(arguments))
 
-    if link_ref is not None:
-        args.append("--link-dest=%s" % link_ref)
+    if link_refs:
+        if len(link_refs) > const.RSYNC_MAX_LINK_DEST:
+            logger.warning("rsync supports only %s --link-dest directories, "
+                           "ignoring the remaining %s.",
+                           const.RSYNC_MAX_LINK_DEST,
+                           len(link_refs) - const.RSYNC_MAX_LINK_DEST)
+        for link_ref in link_refs[:const.RSYNC_MAX_LINK_DEST]:
+            args.append("--link-dest=%s" % link_ref)
+
+    if progress:
+        args.append("--info=progress2")
+
+    if stats:
+        args.append("--stats")
 
     if loggingOptions is not None:
         log_path = os.path.normpath(
@@ -67,11 +130,325 @@ def rsync(command, sources, destination, link_ref, arguments, rsyncfilter,
 
     logger.verbose("Executing \"%s\".", " ".join(args))
 
+    stdout_tail = TailBuffer()
+    stderr_tail = TailBuffer()
+    stdout_handlers = [stdout_tail] + list(stdout_handlers or [])
+    stderr_handlers = [stderr_tail] + list(stderr_handlers or [])
+
     proc = process.Popen(args,
                          stdout=process.PIPE,
                          stderr=process.PIPE)
-    (stdoutdata, stderrdata) = proc.communicate()
-    return (proc.returncode, stdoutdata, stderrdata)
+    # both pipes have to be read at the same time, otherwise rsync might block
+    # writing to one of them while we wait for the other one
+    stderr_thread = threading.Thread(
+        target=_dispatch_lines,
+        args=(proc.stderr, stderr_handlers),
+        name="rsync-stderr")
+    stderr_thread.daemon = True
+    stderr_thread.start()
+    try:
+        _dispatch_lines(proc.stdout, stdout_handlers)
+    except BaseException:
+        # nobody reads stdout anymore, so rsync would block on the full pipe
+        # and never exit
+        proc.kill()
+        raise
+    finally:
+        stderr_thread.join()
+        proc.stdout.close()
+        proc.stderr.close()
+        proc.wait()
+    return (proc.returncode, stdout_tail.get_text(), stderr_tail.get_text())
+
+
+def _iter_lines(stream, chunk_size=const.RSYNC_READ_CHUNK_SIZE):
+    """
+    Read lines from a binary stream as they arrive and yield them decoded and
+    without line endings. Carriage returns end a line, too, as rsync uses them
+    to overwrite progress information. Empty lines are skipped.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read1(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).replace(b"\r", b"\n").split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line:
+                yield line.decode(errors="replace")
+    if pending:
+        yield pending.decode(errors="replace")
+
+
+def _dispatch_lines(stream, handlers):
+    for line in _iter_lines(stream):
+        for handler in handlers:
+            handler(line)
+
+
+class TailBuffer(object):
+    """
+    A line handler that keeps only the last lines it was passed.
+
+    :param maxlen: The maximum number of lines to keep.
+    :type maxlen: int
+    """
+
+    def __init__(self, maxlen=const.RSYNC_TAIL_LINES):
+        self.lines = collections.deque(maxlen=maxlen)
+
+    def __call__(self, line):
+        self.lines.append(line)
+
+    def get_text(self):
+        """
+        Return the lines kept as a single string.
+
+        :rtype: str
+        """
+        return "\n".join(self.lines)
+
+
+class LineCounter(object):
+    """
+    A line handler that counts the lines it was passed.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, line):
+        self.count += 1
+
+
+class LineLogger(object):
+    """
+    A line handler that logs every line it was passed.
+
+    :param level: The level to log the lines with.
+    :type level: int
+
+    :param prefix: A string prepended to every line.
+    :type prefix: str
+    """
+
+    def __init__(self, level, prefix="rsync: "):
+        self.level = level
+        self.prefix = prefix
+
+    def __call__(self, line):
+        logger.log(self.level, "%s%s", self.prefix, line)
+
+
+# Matches lines like these written by rsync with --info=progress2:
+#     1,234,567  45%   12.34MB/s    0:01:23 (xfr#12, to-chk=345/1000)
+#         2.45G  10%    1.04MB/s    0:00:12
+_PROGRESS_PATTERN = re.compile(
+    r"^\s*(?P<bytes>[\d,.]+)(?P<bytes_unit>[KMGTP]?)\s+"
+    r"(?P<percent>\d+)%\s+"
+    r"(?P<rate>[\d.,]+)(?P<rate_unit>[kKMGTP]?)B/s\s+"
+    r"(?P<eta>\d+:\d{2}:\d{2})"
+    r"(?:\s+\(xfr#(?P<files_transferred>\d+),\s+[a-z]{2}-chk="
+    r"(?P<files_to_check>\d+)/(?P<files_total>\d+)\))?")
+
+_UNIT_FACTORS = {
+    "": 1,
+    "k": 1024,
+    "K": 1024,
+    "M": 1024 ** 2,
+    "G": 1024 ** 3,
+    "T": 1024 ** 4,
+    "P": 1024 ** 5}
+
+
+def _parse_number(string, unit):
+    """
+    Parse a number printed by rsync. Without a unit, rsync separates
+    thousands, with a unit, the number has a fractional part. Depending on the
+    locale, both could be "," or ".".
+    """
+    if unit:
+        return _parse_rate(string, unit)
+    return int(string.replace(",", "").replace(".", ""))
+
+
+def _parse_rate(string, unit):
+    """
+    Parse a number with a fractional part and an optional unit.
+    """
+    return float(string.replace(",", ".")) * _UNIT_FACTORS[unit]
+
+
+class TransferProgress(object):
+    """
+    The progress of a running rsync transfer.
+
+    :param bytes_done: The number of bytes transferred so far.
+    :type bytes_done: int
+
+    :param percent: The completion of the whole transfer in percent.
+    :type percent: int
+
+    :param rate: The current transfer rate in bytes per second.
+    :type rate: float
+
+    :param eta: The estimated remaining time in seconds.
+    :type eta: int
+
+    :param files_transferred: The number of files transferred so far, or None
+                              if not known yet. Files that did not change are
+                              not transferred.
+    :type files_transferred: int
+
+    :param files_done: The number of files checked so far, or None if not
+                       known yet.
+    :type files_done: int
+
+    :param files_total: The number of files rsync knows about so far, or None if
+                        not known yet. This grows while rsync is still scanning
+                        the source.
+    :type files_total: int
+    """
+
+    def __init__(self, bytes_done, percent, rate, eta, files_transferred=None,
+                 files_done=None, files_total=None):
+        self.bytes_done = bytes_done
+        self.percent = percent
+        self.rate = rate
+        self.eta = eta
+        self.files_transferred = files_transferred
+        self.files_done = files_done
+        self.files_total = files_total
+
+    @classmethod
+    def combine(cls, progresses):
+        """
+        Combine the progress of several transfers running at the same time.
+        The completion is estimated from the bytes done and the completion of
+        every single transfer.
+
+        :param progresses: The progress of every transfer.
+        :type progresses: list of TransferProgress instances
+
+        :rtype: TransferProgress instance
+        """
+        if len(progresses) == 1:
+            return progresses[0]
+        bytes_done = sum(progress.bytes_done for progress in progresses)
+        bytes_expected = sum(progress.bytes_done * 100.0 / progress.percent if
+                             progress.percent else progress.bytes_done for
+                             progress in progresses)
+        combined = cls(
+            bytes_done=bytes_done,
+            percent=int(bytes_done * 100 / bytes_expected) if
+            bytes_expected else 0,
+            rate=sum(progress.rate for progress in progresses),
+            eta=max(progress.eta for progress in progresses))
+        if all(progress.files_total is not None for progress in progresses):
+            for key in ("files_transferred", "files_done", "files_total"):
+                setattr(combined, key, sum(getattr(progress, key) for
+                                           progress in progresses))
+        return combined
+
+
+class ProgressParser(object):
+    """
+    A line handler that parses the progress lines rsync writes with
+    --info=progress2 and passes a :class:`TransferProgress` to a callback for
+    each of them. All other lines are ignored.
+
+    :param callback: The callable the progress is passed to.
+    :type callback: callable
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, line):
+        progress = self.parse(line)
+        if progress is not None:
+            self.callback(progress)
+
+    @staticmethod
+    def parse(line):
+        """
+        Parse a single line.
+
+        :returns: The progress, or None if the line is no progress line.
+        :rtype: TransferProgress instance or None
+        """
+        match = _PROGRESS_PATTERN.match(line)
+        if match is None:
+            return None
+        (hours, minutes, seconds) = match.group("eta").split(":")
+        progress = TransferProgress(
+            bytes_done=int(_parse_number(match.group("bytes"),
+                                         match.group("bytes_unit"))),
+            percent=int(match.group("percent")),
+            rate=_parse_rate(match.group("rate"), match.group("rate_unit")),
+            eta=int(hours) * 3600 + int(minutes) * 60 + int(seconds))
+        if match.group("files_transferred") is not None:
+            progress.files_transferred = int(match.group("files_transferred"))
+            progress.files_total = int(match.group("files_total"))
+            progress.files_done = (progress.files_total -
+                                   int(match.group("files_to_check")))
+        return progress
+
+
+# Matches the lines written by rsync with --stats, like these:
+#     Number of files: 1,234 (reg: 1,000, dir: 234)
+#     Total bytes sent: 12.35M
+#     File list generation time: 0.001 seconds
+_STATS_PATTERN = re.compile(
+    r"^(?P<key>[A-Z][A-Za-z ]+): (?P<value>[\d,.]+)(?P<unit>[KMGTP]?)\b")
+
+# The first line of the statistics rsync prints with --stats.
+_STATS_START = "Number of files: "
+
+
+class StatsParser(object):
+    """
+    A line handler that collects the statistics rsync prints with --stats.
+    The keys are the descriptions rsync uses, in lower case with underscores
+    instead of spaces, e.g. "number_of_files", "literal_data" or
+    "file_list_generation_time". Sizes are in bytes, times in seconds.
+
+    Only the block of statistics is parsed, which starts with the number of
+    files and ends with the first line that is not a statistic. Lines before
+    it, e.g. the names of the transferred files rsync prints with -v, are
+    ignored even if they look like a statistic.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self._in_block = False
+        self._done = False
+
+    def __call__(self, line):
+        if self._done:
+            return
+        if not self._in_block:
+            if not line.startswith(_STATS_START):
+                return
+            self._in_block = True
+        match = _STATS_PATTERN.match(line)
+        if match is None:
+            self._in_block = False
+            self._done = True
+            return
+        key = match.group("key").strip().lower().replace(" ", "_")
+        value = match.group("value")
+        unit = match.group("unit")
+        if unit:
+            # --human-readable prints sizes in units of 1000
+            number = float(value.replace(",", "")) * 1000 ** (
+                "KMGTP".index(unit) + 1)
+            self.stats[key] = int(number)
+        elif "." in value:
+            self.stats[key] = float(value.replace(",", ""))
+        else:
+            self.stats[key] = int(value.replace(",", ""))
 
 
 class LogfileOptions(object):
@@ -123,6 +500,24 @@ class Filter(object):
         self.exclude_files = exclude_files
         self.filters = filters
 
+    def with_excludes(self, patterns):
+        """
+        Return a copy of this filter that additionally excludes the given
+        patterns. These excludes take precedence over all other filters.
+
+        :param patterns: The patterns to exclude.
+        :type patterns: list of str
+
+        :rtype: Filter instance
+        """
+        return Filter(
+            include_patterns=self.include_patterns,
+            exclude_patterns=self.exclude_patterns,
+            include_files=self.include_files,
+            exclude_files=self.exclude_files,
+            filters=["- %s" % pattern for pattern in patterns] +
+            list(self.filters))
+
     def get_args(self):
         """
         Constructs a list of arguments containing all desired filters ready
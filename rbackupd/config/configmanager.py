@@ -2,6 +2,8 @@
 # Copyright (c) 2013 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
 
 import logging
+import os
+import shutil
 import configobj
 import validate
 
@@ -36,7 +38,15 @@ class ConfigManager(configobj.ConfigObj):
             raise_errors=True,
             configspec=configspec,
             write_empty_values=True)
+        self.check()
 
+    def check(self):
+        """
+        Validate the configuration against the configspec. Values are
+        converted to the types given in the configspec.
+
+        :raise ValidationError: if the validation fails
+        """
         logger.debug("Validating configuration file.")
         validator = validate.Validator()
         try:
@@ -58,6 +68,34 @@ class ConfigManager(configobj.ConfigObj):
             message = message.rstrip("\n")
             raise ValidationError(message)
 
+    def reload(self):
+        """
+        Read the configuration file again, dropping all changes that were not
+        written, and validate it.
+
+        :raise ValidationError: if the validation fails
+        """
+        configobj.ConfigObj.reload(self)
+        self.check()
+
+    def write(self, outfile=None, section=None):
+        """
+        Write the configuration file atomically, so a crash leaves either the
+        old or the new file behind, but never a partially written one. If
+        outfile or section is given, this behaves like ConfigObj.write().
+        """
+        if outfile is not None or section is not None:
+            return configobj.ConfigObj.write(self, outfile=outfile,
+                                             section=section)
+        temp_path = self.filename + ".tmp"
+        with open(temp_path, "wb") as config_file:
+            configobj.ConfigObj.write(self, outfile=config_file)
+            config_file.flush()
+            os.fsync(config_file.fileno())
+        if os.path.exists(self.filename):
+            shutil.copymode(self.filename, temp_path)
+        os.rename(temp_path, self.filename)
+
 
 class ValidationError(Exception):
     """
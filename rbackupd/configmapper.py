@@ -1,6 +1,7 @@
 # -*- encoding: utf-8 -*-
 # Copyright (c) 2013 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
 
+import contextlib
 import functools
 import logging
 import sys
@@ -27,7 +28,9 @@ def _write_config_after(func):
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
         retval = func(self, *args, **kwargs)
-        self.write_config()
+        # inside a transaction, the file is written once on commit
+        if not self.in_transaction:
+            self.write_config()
         return retval
     return wrapper
 
@@ -37,6 +40,7 @@ class ConfigMapper(object):
     def __init__(self, config_path):
         self.config_path = config_path
         self.configmanager = None
+        self._in_transaction = False
 
         self.tasks = []
 
@@ -87,21 +91,105 @@ class ConfigMapper(object):
 
     def write_config(self):
         """
-        Write the configuration file to disk.
+        Validate the configuration and write it to disk. If the validation
+        fails, the configuration file is read again, so all changes since it
+        was written last are lost.
+
+        :raise configmanager.ValidationError: if the validation fails
         """
         if self.configmanager is None:
             raise ValueError("configuration file has to be read before it can "
                              "be written back")
+        try:
+            self.configmanager.check()
+        except configmanager.ValidationError:
+            self.configmanager.reload()
+            raise
         self.configmanager.write()
 
+    @property
+    def in_transaction(self):
+        """
+        Whether a transaction was begun and is neither committed nor aborted
+        yet.
+        """
+        return self._in_transaction
+
+    def begin(self):
+        """
+        Begin a transaction. Until the transaction is committed, changes are
+        only kept in memory, so many changes only cost a single validation
+        and a single write of the configuration file.
+
+        :raise ValueError: if a transaction was already begun
+        """
+        if self._in_transaction:
+            raise ValueError("a transaction was already begun")
+        logger.debug("Beginning configuration transaction.")
+        self._in_transaction = True
+
+    def commit(self):
+        """
+        Validate all changes made since the transaction was begun and write
+        them to the configuration file. If the validation fails, all changes
+        are dropped like with :func:`abort()`.
+
+        :raise ValueError: if no transaction was begun
+        :raise configmanager.ValidationError: if the validation fails
+        """
+        if not self._in_transaction:
+            raise ValueError("no transaction was begun")
+        logger.debug("Committing configuration transaction.")
+        self._in_transaction = False
+        self.write_config()
+
+    def abort(self):
+        """
+        Drop all changes made since the transaction was begun.
+
+        :raise ValueError: if no transaction was begun
+        """
+        if not self._in_transaction:
+            raise ValueError("no transaction was begun")
+        logger.debug("Aborting configuration transaction.")
+        self._in_transaction = False
+        self.configmanager.reload()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run the body of a with statement in a transaction, which is committed
+        if the body succeeds and aborted if it raises an exception::
+
+            with mapper.transaction():
+                mapper.default_one_filesystem = True
+                mapper.task("home").sources = ["/home"]
+        """
+        self.begin()
+        try:
+            yield
+        except BaseException:
+            # a KeyboardInterrupt must not leave the transaction open either
+            self.abort()
+            raise
+        self.commit()
+
     def reload_config(self):
         """
-        Reload the configuration file from the path given at startup.
+        Reload the configuration file from the path given at startup. The
+        current configuration is only replaced if the file is valid. Changes
+        of a running transaction are dropped and the transaction ends.
+
+        :raise IOError: if the configuration file cannot be read
+        :raise configmanager.ValidationError: if the validation fails
+        :raise configmanager.ConfigError: if the file cannot be parsed
         """
         if self.configmanager is None:
             raise ValueError("configuration file has to be read before it can "
                              "be reloaded")
-        self.configmanager.reload()
+        self.configmanager = configmanager.ConfigManager(
+            path=self.config_path, configspec=const.DEFAULT_SCHEME_PATH)
+        self._in_transaction = False
 
     @property
     def logfile_path(self):
@@ -140,6 +228,61 @@ class ConfigMapper(object):
         self.configmanager[const.CONF_SECTION_RSYNC][
             const.CONF_KEY_RSYNC_CMD] = value
 
+    @property
+    def rsync_progress(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_RSYNC][const.CONF_KEY_RSYNC_PROGRESS])
+
+    @rsync_progress.setter
+    @_write_config_after
+    def rsync_progress(self, value):
+        self.configmanager[const.CONF_SECTION_RSYNC][
+            const.CONF_KEY_RSYNC_PROGRESS] = value
+
+    @property
+    def max_transfers(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_RSYNC][const.CONF_KEY_MAX_TRANSFERS])
+
+    @max_transfers.setter
+    @_write_config_after
+    def max_transfers(self, value):
+        self.configmanager[const.CONF_SECTION_RSYNC][
+            const.CONF_KEY_MAX_TRANSFERS] = value
+
+    @property
+    def max_transfers_per_device(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_RSYNC][const.CONF_KEY_MAX_TRANSFERS_PER_DEVICE])
+
+    @max_transfers_per_device.setter
+    @_write_config_after
+    def max_transfers_per_device(self, value):
+        self.configmanager[const.CONF_SECTION_RSYNC][
+            const.CONF_KEY_MAX_TRANSFERS_PER_DEVICE] = value
+
+    @property
+    def workers(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_SCHEDULER][const.CONF_KEY_WORKERS])
+
+    @workers.setter
+    @_write_config_after
+    def workers(self, value):
+        self.configmanager[const.CONF_SECTION_SCHEDULER][
+            const.CONF_KEY_WORKERS] = value
+
+    @property
+    def trash_files_per_second(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_TRASH][const.CONF_KEY_FILES_PER_SECOND])
+
+    @trash_files_per_second.setter
+    @_write_config_after
+    def trash_files_per_second(self, value):
+        self.configmanager[const.CONF_SECTION_TRASH][
+            const.CONF_KEY_FILES_PER_SECOND] = value
+
     @property
     def default_rsync_logfile(self):
         return self._sanitize(self.configmanager[
@@ -261,6 +404,28 @@ class ConfigMapper(object):
         self.configmanager[const.CONF_SECTION_TASKS][
             const.CONF_KEY_RSYNC_ARGS] = value
 
+    @property
+    def default_rsync_workers(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_TASKS][const.CONF_KEY_RSYNC_WORKERS])
+
+    @default_rsync_workers.setter
+    @_write_config_after
+    def default_rsync_workers(self, value):
+        self.configmanager[const.CONF_SECTION_TASKS][
+            const.CONF_KEY_RSYNC_WORKERS] = value
+
+    @property
+    def default_shards(self):
+        return self._sanitize(self.configmanager[
+            const.CONF_SECTION_TASKS][const.CONF_KEY_SHARDS])
+
+    @default_shards.setter
+    @_write_config_after
+    def default_shards(self, value):
+        self.configmanager[const.CONF_SECTION_TASKS][
+            const.CONF_KEY_SHARDS] = value
+
     class TaskSubsection(object):
         def __init__(self, outer, name, fallback_on_default):
             self.outer = outer
@@ -273,6 +438,10 @@ class ConfigMapper(object):
             self.write_config = outer.write_config
             self.configmanager = outer.configmanager
 
+        @property
+        def in_transaction(self):
+            return self.outer.in_transaction
+
         @property
         def rsync_logfile(self):
             value = self.section_dict[
@@ -427,6 +596,34 @@ class ConfigMapper(object):
             self.section_dict[
                 const.CONF_KEY_RSYNC_ARGS] = value
 
+        @property
+        def rsync_workers(self):
+            value = self.outer._sanitize(self.section_dict[
+                const.CONF_KEY_RSYNC_WORKERS])
+            if value is None and self.fallback_on_default is True:
+                return self.outer.default_rsync_workers
+            return value
+
+        @rsync_workers.setter
+        @_write_config_after
+        def rsync_workers(self, value):
+            self.section_dict[
+                const.CONF_KEY_RSYNC_WORKERS] = value
+
+        @property
+        def shards(self):
+            value = self.outer._sanitize(self.section_dict[
+                const.CONF_KEY_SHARDS])
+            if value is None and self.fallback_on_default is True:
+                return self.outer.default_shards
+            return value
+
+        @shards.setter
+        @_write_config_after
+        def shards(self, value):
+            self.section_dict[
+                const.CONF_KEY_SHARDS] = value
+
         @property
         def sources(self):
             return self.outer._sanitize(self.section_dict[
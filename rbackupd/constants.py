@@ -7,6 +7,13 @@ CONF_KEY_LOGFILE_PATH = "logfile"
 CONF_KEY_LOGLEVEL = "loglevel"
 CONF_SECTION_RSYNC = "rsync"
 CONF_KEY_RSYNC_CMD = "cmd"
+CONF_KEY_MAX_TRANSFERS = "max_transfers"
+CONF_KEY_MAX_TRANSFERS_PER_DEVICE = "max_transfers_per_device"
+CONF_KEY_RSYNC_PROGRESS = "progress"
+CONF_SECTION_SCHEDULER = "scheduler"
+CONF_KEY_WORKERS = "workers"
+CONF_SECTION_TRASH = "trash"
+CONF_KEY_FILES_PER_SECOND = "files_per_second"
 
 CONF_KEY_RSYNC_LOGFILE = "rsync_logfile"
 CONF_KEY_RSYNC_LOGFILE_NAME = "rsync_logfile_name"
@@ -19,6 +26,8 @@ CONF_KEY_EXCLUDE_FILE = "excludefiles"
 CONF_KEY_CREATE_DESTINATION = "create_destination"
 CONF_KEY_ONE_FILESYSTEM = "one_fs"
 CONF_KEY_RSYNC_ARGS = "rsync_args"
+CONF_KEY_RSYNC_WORKERS = "rsync_workers"
+CONF_KEY_SHARDS = "shards"
 
 CONF_SECTION_TASKS = "tasks"
 CONF_KEY_DESTINATION = "destination"
@@ -49,16 +58,29 @@ EXIT_KEYBOARD_INTERRUPT = 130
 SYMLINK_LATEST_NAME = "latest"
 
 
+NAME_CATALOG_FOLDER = ".rbackupd"
+NAME_CATALOG_FILE = "catalog"
+NAME_SHARD_HISTORY_FILE = "shards"
+NAME_TRASH_FOLDER = ".trash"
 NAME_META_FILE = "rbackupd.info"
 NAME_BACKUP_SUBFOLDER = "backup"
 PATTERN_BACKUP_FOLDER = "{name}_{date}_{interval_name}.snapshot"
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
+# the layout of the legacy metadata files without a header
 META_FILE_LINES = 3
 META_FILE_INDEX_NAME = 0
 META_FILE_INDEX_DATE = 1
 META_FILE_INDEX_INTERVAL = 2
 
+# the current metadata files start with a header containing the version,
+# followed by key=value lines
+META_FILE_HEADER = "rbackupd-metadata"
+META_FILE_VERSION = 2
+META_FILE_KEY_NAME = "name"
+META_FILE_KEY_DATE = "date"
+META_FILE_KEY_INTERVAL = "interval"
+
 META_FILE_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
 
 
@@ -71,6 +93,41 @@ DEFAULT_PATH_CONFIG = "/etc/rbackupd/rbackupd.conf"
 DEFAULT_SCHEME_PATH = "/usr/share/rbackupd/scheme.ini"
 
 
+# The maximum time the scheduler sleeps without looking at the clock again.
+SCHEDULER_MAX_SLEEP_SECONDS = 300
+
+# The number of threads used to remove or copy directory trees.
+FILE_OPERATION_WORKERS = 4
+
+# The number of lines of the output of rsync kept for error reports, and the
+# maximum number of bytes read from rsync at once.
+RSYNC_TAIL_LINES = 50
+RSYNC_READ_CHUNK_SIZE = 65536
+
+# The maximum number of --link-dest directories rsync accepts, and the number
+# of the latest backups that are used as --link-dest candidates in addition to
+# the latest backup of every interval.
+RSYNC_MAX_LINK_DEST = 20
+LINK_REF_RECENT_COUNT = 5
+
+# After a backup, up to this many files of the backup are checked for being
+# hardlinked to a link ref, looking at no more than the given number of
+# directory entries.
+HARDLINK_SAMPLE_FILES = 20
+HARDLINK_SAMPLE_MAX_ENTRIES = 2000
+
+# The minimum time between two progress signals of the same task on D-Bus.
+PROGRESS_SIGNAL_INTERVAL_SECONDS = 1
+
+# The minimum time between two updates of the transferred bytes of a task on
+# the status board, unless the percentage of the transfer changes.
+PROGRESS_PUBLISH_INTERVAL_SECONDS = 1
+
+# The number of threads D-Bus methods that wait for tasks, like pausing a
+# task, run in.
+DBUS_CONTROL_WORKERS = 4
+
+
 DBUS_BUS_NAME = "org.rbackupd.daemon"
 DBUS_OBJECT_PATH_BACKUP_MANAGER = "/org/rbackupd/daemon"
 
@@ -0,0 +1,144 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides means to limit how many transfers run at the same time.
+
+Running many rsync processes that write to the same disk at once makes the disk
+seek between all of them, which is a lot slower than running them one after
+another. The :class:`TransferLimiter` limits the number of concurrent
+transfers globally and per device the transfers write to. Transfers that have
+to wait are queued and started in the order they arrived, apart from that a
+transfer to an idle device may overtake transfers waiting for a busy one.
+
+A transfer is a whole backup: the rsync processes one backup runs in parallel
+for its workers or shards share a single slot.
+
+The limiter could be used like this::
+
+    import limits
+
+    limiter = limits.TransferLimiter(max_transfers=2,
+                                     max_transfers_per_device=1)
+
+    with limiter.slot(limits.get_device(destination)):
+        # copy the data
+        pass
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def get_device(path):
+    """
+    Return the device the given path resides on.
+
+    :param path: The path to look up.
+    :type path: str
+
+    :rtype: int
+    """
+    return os.stat(path).st_dev
+
+
+class TransferLimiter(object):
+    """
+    Limits the number of transfers that are running at the same time.
+
+    :param max_transfers: The maximum number of transfers overall.
+    :type max_transfers: int
+
+    :param max_transfers_per_device: The maximum number of transfers writing
+        to the same device.
+    :type max_transfers_per_device: int
+    """
+
+    def __init__(self, max_transfers, max_transfers_per_device):
+        if max_transfers < 1 or max_transfers_per_device < 1:
+            raise ValueError("the limits have to be greater than zero")
+        self.max_transfers = max_transfers
+        self.max_transfers_per_device = max_transfers_per_device
+
+        self._condition = threading.Condition()
+        self._waiting = collections.deque()
+        self._active = 0
+        self._active_per_device = collections.Counter()
+
+    def acquire(self, device):
+        """
+        Wait until a transfer to the given device may start and register it.
+        Every call has to be followed by a call to :func:`release()` with the
+        same device.
+
+        :param device: The device the transfer writes to.
+        :type device: int
+        """
+        ticket = _Ticket(device)
+        with self._condition:
+            self._waiting.append(ticket)
+            if not self._may_start(ticket):
+                logger.verbose("Transfer to device %s has to wait, %s "
+                               "transfers are running.",
+                               device, self._active)
+            while not self._may_start(ticket):
+                self._condition.wait()
+            self._waiting.remove(ticket)
+            self._active += 1
+            self._active_per_device[device] += 1
+
+    def release(self, device):
+        """
+        Unregister a transfer started with :func:`acquire()`, so waiting
+        transfers may start.
+
+        :param device: The device the transfer wrote to.
+        :type device: int
+        """
+        with self._condition:
+            self._active -= 1
+            self._active_per_device[device] -= 1
+            if self._active_per_device[device] == 0:
+                del self._active_per_device[device]
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, device):
+        """
+        A context manager that wraps :func:`acquire()` and :func:`release()`.
+
+        :param device: The device the transfer writes to.
+        :type device: int
+        """
+        self.acquire(device)
+        try:
+            yield
+        finally:
+            self.release(device)
+
+    def _may_start(self, ticket):
+        """
+        Determine whether the ticket is the first waiting one that could be
+        started right now.
+        """
+        if self._active >= self.max_transfers:
+            return False
+        for waiting in self._waiting:
+            if (self._active_per_device[waiting.device] <
+                    self.max_transfers_per_device):
+                return waiting is ticket
+        return False
+
+
+class _Ticket(object):
+    """
+    Represents a transfer waiting in the queue.
+    """
+
+    def __init__(self, device):
+        self.device = device
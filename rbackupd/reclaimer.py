@@ -0,0 +1,193 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides the reclaimer that deletes expired backups in the
+background.
+
+Deleting a backup means unlinking every single file of a hardlink farm, which
+can take a very long time for big backups. Instead of blocking the task until
+this is done, expired backups are renamed into the trash folder of their
+destination, which is atomic and cheap, and handed to the :class:`Reclaimer`.
+It deletes them one after another in a separate thread, limited to a maximum
+number of files per second, so it does not starve the backups that are running
+at the same time.
+
+If rbackupd is stopped before the trash is empty, the remaining backups are
+still in the trash folder and are handed to the reclaimer again by
+:func:`Reclaimer.recover()` the next time rbackupd starts.
+
+The reclaimer could be used like this::
+
+    import reclaimer
+
+    backup_reclaimer = reclaimer.Reclaimer(files_per_second=500)
+    backup_reclaimer.start()
+
+    # pick up what was left over the last time
+    backup_reclaimer.recover("/path/to/destination/.trash")
+
+    backup_reclaimer.add("/path/to/destination/.trash/expired_backup")
+
+    backup_reclaimer.stop()
+"""
+
+import collections
+import logging
+import os
+import threading
+import time
+
+from rbackupd.cmd import files
+
+logger = logging.getLogger(__name__)
+
+
+class _Stopped(Exception):
+    """
+    Raised in the reclaimer thread to abort a removal when the reclaimer is
+    stopped.
+    """
+    pass
+
+
+class Reclaimer(object):
+    """
+    Deletes files and directories in a separate thread.
+
+    :param files_per_second: The maximum number of files and directories that
+        are deleted per second. If None or 0, there is no limit.
+    :type files_per_second: int
+    """
+
+    def __init__(self, files_per_second=None):
+        if files_per_second:
+            self._interval = 1.0 / files_per_second
+        else:
+            self._interval = None
+        self._next_slot = 0.0
+
+        self._queue = collections.deque()
+        self._queued = set()
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._active = False
+
+    @property
+    def pending(self):
+        """
+        The number of paths that are queued or currently being deleted.
+        """
+        with self._condition:
+            return len(self._queued)
+
+    def add(self, path):
+        """
+        Queue a path for deletion. Queueing a path that is already queued is a
+        no-op.
+
+        :param path: The path to delete.
+        :type path: str
+        """
+        with self._condition:
+            if path in self._queued:
+                return
+            logger.debug("Queueing \"%s\" for deletion.", path)
+            self._queued.add(path)
+            self._queue.append(path)
+            self._condition.notify_all()
+
+    def recover(self, trash_folder):
+        """
+        Queue everything in the given trash folder for deletion. Does nothing if
+        the trash folder does not exist.
+
+        :param trash_folder: The path of the trash folder.
+        :type trash_folder: str
+        """
+        if not os.path.isdir(trash_folder):
+            return
+        leftovers = sorted(os.listdir(trash_folder))
+        if leftovers:
+            logger.info("Found %s leftover backups in \"%s\", they will be "
+                        "deleted.", len(leftovers), trash_folder)
+        for name in leftovers:
+            self.add(os.path.join(trash_folder, name))
+
+    def start(self):
+        """
+        Start deleting in a separate thread.
+        """
+        logger.debug("Starting reclaimer.")
+        with self._condition:
+            self._active = True
+        self._thread = threading.Thread(target=self._run, name="reclaimer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop deleting and wait for the reclaimer thread to finish. A deletion
+        in progress is aborted, the rest is deleted after the next call to
+        :func:`recover()`.
+        """
+        logger.debug("Stopping reclaimer.")
+        with self._condition:
+            self._active = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._active and not self._queue:
+                    self._condition.wait()
+                if not self._active:
+                    return
+                path = self._queue.popleft()
+            try:
+                self._remove(path)
+            except _Stopped:
+                logger.debug("Deletion of \"%s\" aborted.", path)
+                return
+            finally:
+                with self._condition:
+                    self._queued.discard(path)
+
+    def _remove(self, path):
+        if not os.path.lexists(path):
+            return
+        logger.verbose("Deleting \"%s\".", path)
+        try:
+            files.remove_recursive(path, workers=1, throttle=self._throttle)
+        except files.FileOperationError as error:
+            logger.error("Could not delete \"%s\" completely: %s", path,
+                         str(error))
+        else:
+            logger.verbose("Deleted \"%s\".", path)
+
+    def _throttle(self):
+        """
+        Block until the next file may be deleted.
+
+        :raise _Stopped: if the reclaimer was stopped in the meantime
+        """
+        with self._condition:
+            if not self._active:
+                raise _Stopped()
+            if self._interval is None:
+                return
+            # the budget does not accumulate while the reclaimer is idle, so
+            # it cannot burst afterwards
+            slot = max(self._next_slot, time.monotonic())
+            self._next_slot = slot + self._interval
+            while True:
+                delay = slot - time.monotonic()
+                if delay <= 0:
+                    return
+                self._condition.wait(delay)
+                if not self._active:
+                    raise _Stopped()
@@ -3,21 +3,63 @@
 
 """
 This module implements a cron scheduling flavor.
+
+Apart from the :class:`Cronjob` methods that look at a single datetime, the
+module provides functions that evaluate cronjobs for many timestamps at once,
+e.g. for capacity planning or simulations::
+
+    import cron
+
+    cronjobs = [cron.Cronjob("0 * * * * *"), cron.Cronjob("*/5 1 * * * *")]
+
+    # whether each timestamp matches any of the cronjobs
+    matched = cron.batch_matches(cronjobs, timestamps)
+
+    # the latest occurrence at or before each timestamp
+    occurrences = cron.batch_prev_occurrences(cronjobs[0], timestamps)
+
+If NumPy is installed, these functions split every timestamp into its day and
+its minute of the day and look both up in per-cronjob membership tables for
+the whole array at once. They then return NumPy arrays. Passing the
+timestamps as a NumPy datetime64 array saves converting datetime instances,
+which can take longer than the evaluation itself. Without NumPy, they fall
+back to calling the methods of the cronjobs for every timestamp and return
+lists.
 """
 
+import bisect
+import calendar
 import datetime
 
+from rbackupd import clocks
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 _ranges = (range(60), range(24), range(1, 32), range(1, 13),
            range(1900, 3000), range(1, 8))  # Creating year 3000 problem
 
 
-# This list contains the indices of the fields that should be considered for
-# all operations of that module. The value range(0,6) means that all fields
-# should be considered, which is the desired behaviour. For now, the last
-# field (week) is ignored. When changing this value, look at the methods
-# _datetime_to_tuple() and _tuple_to_datetime() too to read and write datetime
-# objects correctly.
-_check_range = range(0, 5)
+# The indices of the fields in a cronjob string.
+(_MINUTE, _HOUR, _DAY, _MONTH, _YEAR, _WEEKDAY) = range(6)
+
+_ONE_MINUTE = datetime.timedelta(minutes=1)
+
+
+# The indices of the fields that have to match on their own. Day of month and
+# weekday are combined, see Cronjob._matches_day().
+_check_range = (_MINUTE, _HOUR, _MONTH, _YEAR)
+
+# The weekday a cronjob string may use for sunday apart from 7.
+_SUNDAY_ALIAS = 0
+
+# The ranges the expressions of a cronjob string are parsed over. Like in
+# cron, ranges and steps in the weekday field cover 0 to 7, sunday is only
+# folded to 7 afterwards, so e.g. "*/2" means sunday, tuesday, thursday and
+# saturday.
+_parse_ranges = _ranges[:_WEEKDAY] + (range(_SUNDAY_ALIAS, 8),)
 
 
 # mapping strings to integer for every field, so you can for example use
@@ -86,18 +128,64 @@ class Cronjob(object):
     ``3-59/5 2,4 * * * *``  does the same as above, apart from matching the
                             third and every fifth minute starting at the second
                             one instead of starting at 0.
+    ``0 2 * * * MON-FRI``   matches 2 am on every day from monday to friday.
+    ``0 0 1,15 * * SUN``    matches midnight on the first and fifteenth of
+                            every month and on every sunday.
     ======================  ====================================================
 
-
-    IMPORTANT: `<weekday>` is not yet supported and can be omitted. For all
-    comparisons in this class, the weekday information is ignored.
+    The weekday can be omitted, which is the same as `*`. Day of month and
+    weekday are combined like cron does: if both fields are restricted, i.e.
+    neither starts with `*`, a day matches if either field matches. Otherwise
+    a day has to match both fields.
 
     :param schedule_string: The string to represent.
     :type schedule_string: str
+
+    :param clock: The clock used whenever the current time is needed. If
+                  omitted, the time of the system is used.
+    :type clock: clocks.SystemClock or clocks.ManualClock instance
     """
-    def __init__(self, schedule_string):
+    def __init__(self, schedule_string, clock=None):
         self.cronstring = schedule_string
+        self.clock = clock if clock is not None else clocks.SYSTEM_CLOCK
         self.schedule = _parse_cronjob_string(schedule_string)
+        fields = _parse_string_to_fields(schedule_string)
+
+        # The schedule is compiled once so that all queries only have to do
+        # cheap lookups: a bitmask per field for membership tests and a sorted
+        # tuple per field for bisecting to the next lower or higher value.
+        self._masks = [_to_bitmask(values) for values in self.schedule]
+        self._values = [tuple(sorted(values)) for values in self.schedule]
+
+        # like cron, a field starting with "*" does not restrict the days,
+        # even if it has a step value
+        self._days_or_weekdays = not (fields[_DAY].startswith("*") or
+                                      fields[_WEEKDAY].startswith("*"))
+        self._all_weekdays = (not self._days_or_weekdays and
+                              len(self._values[_WEEKDAY]) == 7)
+        # the days of month matching the day fields for every weekday the
+        # first day of a month can have
+        self._days_of_month = [self._get_days_of_month(first_weekday) for
+                               first_weekday in _ranges[_WEEKDAY]]
+
+        # sorted minutes since midnight of all times of day the cronjob
+        # occurs at
+        self._times_of_day = tuple(hour * 60 + minute for
+                                   hour in self._values[_HOUR] for
+                                   minute in self._values[_MINUTE])
+        # the membership tables of the fields as NumPy arrays, built on first
+        # use by the batch functions
+        self._tables = None
+
+        first_year = self._values[_YEAR][0]
+        last_year = self._values[_YEAR][-1]
+        self._min_time = self._search(
+            datetime.datetime(first_year, 1, 1, 0, 0), reverse=False)
+        self._max_time = self._search(
+            datetime.datetime(last_year, 12, 31, 23, 59), reverse=True)
+        if self._min_time is None:
+            raise ParseError(schedule_string,
+                             "The schedule never matches any date.")
 
     def matches(self, date_time):
         """
@@ -115,9 +203,45 @@ class Cronjob(object):
         """
         d_schedule = _datetime_to_tuple(date_time)
         for i in _check_range:
-            if not d_schedule[i] in self.schedule[i]:
+            if not (self._masks[i] >> d_schedule[i]) & 1:
                 return False
-        return True
+        return self._matches_day(d_schedule[_DAY], d_schedule[_WEEKDAY])
+
+    def _matches_day(self, day, weekday):
+        """
+        Determines whether a day matches the day of month and the weekday
+        fields of the cronjob.
+
+        :param day: The day of the month.
+        :type day: int
+
+        :param weekday: The ISO weekday, from 1 for monday to 7 for sunday.
+        :type weekday: int
+
+        :rtype: bool
+        """
+        day_matches = (self._masks[_DAY] >> day) & 1
+        weekday_matches = (self._masks[_WEEKDAY] >> weekday) & 1
+        if self._days_or_weekdays:
+            return bool(day_matches or weekday_matches)
+        return bool(day_matches and weekday_matches)
+
+    def _get_days_of_month(self, first_weekday):
+        """
+        Returns the sorted days of a month matching the cronjob, for a month
+        whose first day is the given weekday. Days after the end of a shorter
+        month are included and have to be skipped by the caller.
+
+        :param first_weekday: The ISO weekday of the first day of the month.
+        :type first_weekday: int
+
+        :rtype: tuple of int
+        """
+        if self._all_weekdays:
+            return self._values[_DAY]
+        return tuple(
+            day for day in _ranges[_DAY] if
+            self._matches_day(day, (first_weekday + day - 2) % 7 + 1))
 
     def has_occured_between(self, date_time_1, date_time_2,
                             include_start=True):
@@ -146,20 +270,11 @@ class Cronjob(object):
         if date_time_2 < date_time_1:
             raise ValueError(
                 "date_time_1 has to be older than or equal to date_time_2.")
-        min_val = self.get_min_time()
-        max_val = self.get_max_time()
-        if date_time_1 < min_val:
-            date_time_1 = min_val
-        if date_time_2 > max_val:
-            date_time_2 = max_val
-        if date_time_2 < min_val:
+        if date_time_2 < self._min_time or date_time_1 > self._max_time:
             return False
-        if date_time_1 > max_val:
+        most_recent_occurence = self.prev_occurrence(date_time_2)
+        if most_recent_occurence is None:
             return False
-        if ((date_time_1 < min_val and date_time_2 < min_val) or
-                (date_time_1 > max_val and date_time_2 > max_val)):
-            return False
-        most_recent_occurence = self.get_most_recent_occurence(date_time_2)
         if include_start:
             return most_recent_occurence >= date_time_1
         else:
@@ -185,7 +300,7 @@ class Cronjob(object):
         :raise ValueError: if date_time is in the future
         """
         return self.has_occured_between(date_time,
-                                        datetime.datetime.now(),
+                                        self.clock.now(),
                                         include_start)
 
     def get_max_time(self):
@@ -195,7 +310,7 @@ class Cronjob(object):
         :returns: The last possible datetime at which the cronjob occurs.
         :rtype: datetime instance
         """
-        return _tuple_to_datetime([max(val) for val in self.schedule])
+        return self._max_time
 
     def get_min_time(self):
         """
@@ -204,7 +319,7 @@ class Cronjob(object):
         :returns: The first possible datetime at which the cronjob occurs.
         :rtype: datetime instance
         """
-        return _tuple_to_datetime([min(val) for val in self.schedule])
+        return self._min_time
 
     def get_most_recent_occurence(self, date_time=None):
         """
@@ -212,8 +327,8 @@ class Cronjob(object):
         specific datetime.
 
         :param d: The datetime relative to which to determine the most
-                  recent occurrence. If None is given, datetime.datetime.now()
-                  is used instead.
+                  recent occurrence. If None is given, the current time of the
+                  clock is used instead.
         :type d: datetime instance
 
         :returns: The most recent occurrence of the cronjob relative to d.
@@ -223,79 +338,333 @@ class Cronjob(object):
                            of the cronjob
         """
         if not date_time:
-            date_time = datetime.datetime.now()
-        d_schedule = _datetime_to_tuple(date_time)
-        latest_schedule = [0, 0, 0, 0, 0, None]
-
-        # we go from the most significant to the least significant position,
-        # from year to minute
-        # for each position we compare the d_schedule value with all possible
-        # values in self.schedule:
-        #
-        # we choose the hightest value in self.schedule that is lower or equal
-        # than the value of d_schedule
-        #
-        # if we choose a lower value than d_schedule, we have change the
-        # procedure: in all following lower significant positions, instead of
-        # comparing, we always choose the hightest value from self.schedule[i]
-        #
-        # if we choose the equal value, we just continue with our procedure
-        #
-        # if we cannot choose a lower or equal value that means that there is
-        # no matching for the current i+1 position. so we have to choose the
-        # next lower possible value for the i+1 position. if this is not
-        # possible,  either because i+1 does not exist (we are currently at the
-        # year position) or there already is the lowest possible value at
-        # position i+1, that means that d_schedule is older than every possible
-        # value in self.schedule, so we raise an error
-        #
-        # this is shittier than everything, but it somehow passes the tests
-        max_only_now = False
-        i = 5
-        while i > 0:
-            i -= 1
-            if not max_only_now:
-                lower_equal_range = [val for val in self.schedule[i]
-                                     if val <= d_schedule[i]]
-
-                if len(lower_equal_range) == 0:
-                    _set_lower_value(self.schedule, latest_schedule, i)
-                    latest_schedule[i] = max(self.schedule[i])
-                    max_only_now = True
-                    continue
-
-                lower_equal_value = max(lower_equal_range)
-                is_equal_value = (lower_equal_value == d_schedule[i])
-
-                latest_schedule[i] += lower_equal_value
-            else:
-                latest_schedule[i] += max(self.schedule[i])
-
-            if not is_equal_value:
-                max_only_now = True
-
-        return _tuple_to_datetime(latest_schedule)
-
-
-def _set_lower_value(schedule, latest_schedule, i):
+            date_time = self.clock.now()
+        occurrence = self.prev_occurrence(date_time)
+        if occurrence is None:
+            raise ValueError("d is older than every possible value in "
+                             "this crontab")
+        return occurrence
+
+    def prev_occurrence(self, date_time):
+        """
+        Determines the latest occurrence of the cronjob at or before a specific
+        datetime. Seconds and microseconds of the datetime are ignored.
+
+        :param date_time: The datetime to search backwards from.
+        :type date_time: datetime instance
+
+        :returns: The latest occurrence at or before date_time, or None if the
+                  cronjob never occurred before date_time.
+        :rtype: datetime instance or None
+        """
+        start = _truncate_to_minute(date_time)
+        if start < self._min_time:
+            return None
+        if start >= self._max_time:
+            return self._max_time
+        return self._search(start, reverse=True)
+
+    def next_occurrence(self, date_time):
+        """
+        Determines the earliest occurrence of the cronjob strictly after a
+        specific datetime.
+
+        :param date_time: The datetime to search forwards from.
+        :type date_time: datetime instance
+
+        :returns: The earliest occurrence after date_time, or None if the
+                  cronjob never occurs after date_time.
+        :rtype: datetime instance or None
+        """
+        start = _truncate_to_minute(date_time) + _ONE_MINUTE
+        return self._next_occurrence_from(start)
+
+    def iter_occurrences(self, start, end):
+        """
+        Iterates over all occurrences of the cronjob between two datetimes in
+        chronological order, both ends included.
+
+        :param start: The datetime determining the start of the period.
+        :type start: datetime instance
+
+        :param end: The datetime determining the end of the period.
+        :type end: datetime instance
+
+        :returns: An iterator yielding all occurrences in the period.
+        :rtype: iterator of datetime instances
+        """
+        first = _truncate_to_minute(start)
+        if first < start:
+            first += _ONE_MINUTE
+        occurrence = self._next_occurrence_from(first)
+        while occurrence is not None and occurrence <= end:
+            yield occurrence
+            occurrence = self._next_occurrence_from(occurrence + _ONE_MINUTE)
+
+    def _next_occurrence_from(self, start):
+        """
+        Helper for next_occurrence() and iter_occurrences(), returns the
+        earliest occurrence at or after start, which must not have seconds.
+        """
+        if start > self._max_time:
+            return None
+        if start <= self._min_time:
+            return self._min_time
+        return self._search(start, reverse=False)
+
+    def _search(self, start, reverse):
+        """
+        Finds the earliest occurrence at or after start, or the latest
+        occurrence at or before start if reverse is True. Returns None if there
+        is no such occurrence.
+
+        We go from the most significant to the least significant field. As
+        long as all more significant fields equal the ones of start, the
+        current field is bounded by the value of start, otherwise every value
+        of the field is a candidate. Only the first candidate of each field can
+        fail to lead to an occurrence because a less significant field is
+        still bounded, the only other dead ends are months without any day
+        matching the schedule. The matching days of a month only depend on
+        the weekday the month starts with and are looked up, so no day that
+        does not match is ever visited. So the cost is bounded by the number
+        of years and months, regardless of how sparse the schedule is.
+        """
+        minutes = self._values[_MINUTE]
+        hours = self._values[_HOUR]
+        months = self._values[_MONTH]
+        years = self._values[_YEAR]
+
+        for year in _candidates(years, start.year, _ranges[_YEAR][0],
+                                _ranges[_YEAR][-1], True, reverse):
+            year_exact = year == start.year
+            for month in _candidates(months, start.month, 1, 12,
+                                     year_exact, reverse):
+                month_exact = year_exact and month == start.month
+                (first_weekday, last_day) = calendar.monthrange(year, month)
+                days = self._days_of_month[first_weekday]
+                for day in _candidates(days, start.day, 1, last_day,
+                                       month_exact, reverse):
+                    day_exact = month_exact and day == start.day
+                    for hour in _candidates(hours, start.hour, 0, 23,
+                                            day_exact, reverse):
+                        hour_exact = day_exact and hour == start.hour
+                        for minute in _candidates(minutes, start.minute, 0, 59,
+                                                  hour_exact, reverse):
+                            return datetime.datetime(year, month, day,
+                                                     hour, minute)
+        return None
+
+    def _get_tables(self):
+        """
+        Return NumPy arrays that map the value of every field to whether it is
+        part of the schedule. The table of the year is indexed by the year
+        minus the first possible year.
+        """
+        if self._tables is None:
+            tables = []
+            for field in (_MONTH, _DAY, _YEAR, _WEEKDAY):
+                low = _ranges[field][0] if field == _YEAR else 0
+                table = numpy.zeros(_ranges[field][-1] - low + 1, dtype=bool)
+                table[[value - low for value in self._values[field]]] = True
+                tables.append(table)
+            time_table = numpy.zeros(24 * 60, dtype=bool)
+            time_table[list(self._times_of_day)] = True
+            tables.append(time_table)
+            self._tables = tuple(tables)
+        return self._tables
+
+    def _get_day_table(self, first_day, count):
+        """
+        Determine which days of a range of consecutive days have an occurrence
+        of the cronjob.
+
+        :param first_day: The first day of the range.
+        :type first_day: numpy.datetime64 with unit days
+
+        :param count: The number of days in the range.
+        :type count: int
+
+        :rtype: NumPy bool array of length count
+        """
+        (month_table, day_table, year_table, weekday_table, _) = \
+            self._get_tables()
+        days = first_day + numpy.arange(count)
+        month_starts = days.astype("datetime64[M]")
+        years = days.astype("datetime64[Y]").astype(int) + 1970
+        months = month_starts.astype(int) % 12 + 1
+        days_of_month = (days - month_starts).astype(int) + 1
+        # 1970-01-01 was a thursday
+        weekdays = (days.astype(int) + 3) % 7 + 1
+        year_indices = years - _ranges[_YEAR][0]
+        valid_years = (year_indices >= 0) & (year_indices < len(year_table))
+        if self._days_or_weekdays:
+            matching_days = (day_table[days_of_month] |
+                             weekday_table[weekdays])
+        else:
+            matching_days = (day_table[days_of_month] &
+                             weekday_table[weekdays])
+        return (valid_years &
+                year_table[numpy.clip(year_indices, 0, len(year_table) - 1)] &
+                month_table[months] &
+                matching_days)
+
+
+def _split_timestamps(timestamps):
+    """
+    Split timestamps into their day and their minute of the day. Seconds and
+    smaller units are ignored.
+
+    :param timestamps: The timestamps.
+    :type timestamps: iterable of datetime instances or NumPy datetime64
+        array
+
+    :returns: The days, the minutes since midnight, the first day and the
+        index of every day relative to the first day.
+    :rtype: tuple (NumPy datetime64 array, NumPy int array, NumPy datetime64,
+        NumPy int array)
+    """
+    minutes = numpy.asarray(timestamps, dtype="datetime64[m]")
+    days = minutes.astype("datetime64[D]")
+    times = (minutes - days).astype(int)
+    first_day = days.min()
+    return (days, times, first_day, (days - first_day).astype(int))
+
+
+def batch_matches(cronjobs, timestamps):
+    """
+    Determine for each timestamp whether it matches any of the cronjobs, like
+    :func:`Cronjob.matches()` does for a single datetime.
+
+    :param cronjobs: The cronjobs to check.
+    :type cronjobs: list of Cronjob instances
+
+    :param timestamps: The timestamps to check.
+    :type timestamps: iterable of datetime instances, or a NumPy datetime64
+        array if NumPy is installed
+
+    :returns: Whether each timestamp matches.
+    :rtype: NumPy bool array if NumPy is installed, list of bool otherwise
+    """
+    if numpy is None:
+        return [any(cronjob.matches(date_time) for cronjob in cronjobs) for
+                date_time in timestamps]
+    timestamps = numpy.asarray(timestamps, dtype="datetime64[m]")
+    result = numpy.zeros(len(timestamps), dtype=bool)
+    if len(timestamps) == 0:
+        return result
+    (_, times, first_day, day_indices) = _split_timestamps(timestamps)
+    day_count = int(day_indices.max()) + 1
+    for cronjob in cronjobs:
+        time_table = cronjob._get_tables()[-1]
+        day_table = cronjob._get_day_table(first_day, day_count)
+        result |= day_table[day_indices] & time_table[times]
+    return result
+
+
+def batch_prev_occurrences(cronjob, timestamps):
+    """
+    Determine the latest occurrence of the cronjob at or before each
+    timestamp, like :func:`Cronjob.prev_occurrence()` does for a single
+    datetime.
+
+    The occurrences of a cronjob are all combinations of the days and the
+    times of day it matches. So the latest occurrence is either on the day of
+    the timestamp, at the latest matching time of day before the timestamp,
+    or on the latest matching day before, at the last matching time of day.
+
+    :param cronjob: The cronjob to search the occurrences of.
+    :type cronjob: Cronjob instance
+
+    :param timestamps: The timestamps to search backwards from.
+    :type timestamps: iterable of datetime instances, or a NumPy datetime64
+        array if NumPy is installed
+
+    :returns: The latest occurrence at or before each timestamp. If the
+              cronjob never occurred before a timestamp, the result is NaT
+              with NumPy and None without.
+    :rtype: NumPy datetime64 array with a unit of minutes if NumPy is
+            installed, list of datetime instances or None otherwise
+    """
+    if numpy is None:
+        return [cronjob.prev_occurrence(date_time) for
+                date_time in timestamps]
+    timestamps = numpy.asarray(timestamps, dtype="datetime64[m]")
+    result = numpy.full(len(timestamps), numpy.datetime64("NaT"),
+                        dtype="datetime64[m]")
+    if len(timestamps) == 0:
+        return result
+    (days, times, first_day, day_indices) = _split_timestamps(timestamps)
+    day_table = cronjob._get_day_table(first_day,
+                                       int(day_indices.max()) + 1)
+    matching_days = numpy.flatnonzero(day_table)
+    times_of_day = numpy.array(cronjob._times_of_day)
+
+    # the latest time of day of the cronjob that is not after the timestamp
+    time_indices = numpy.searchsorted(times_of_day, times, side="right") - 1
+    same_day = day_table[day_indices] & (time_indices >= 0)
+    result[same_day] = (
+        days[same_day].astype("datetime64[m]") +
+        times_of_day[time_indices[same_day]].astype("timedelta64[m]"))
+
+    # the latest matching day strictly before the day of the timestamp
+    day_positions = numpy.searchsorted(matching_days, day_indices,
+                                       side="left") - 1
+    earlier_day = ~same_day & (day_positions >= 0)
+    result[earlier_day] = (
+        (first_day + matching_days[day_positions[earlier_day]]).astype(
+            "datetime64[m]") +
+        numpy.timedelta64(int(times_of_day[-1]), "m"))
+
+    # the latest occurrence lies before all days of the timestamps
+    before_first_day = ~same_day & (day_positions < 0)
+    if before_first_day.any():
+        occurrence = cronjob.prev_occurrence(
+            datetime.datetime.combine(first_day.item(), datetime.time()) -
+            _ONE_MINUTE)
+        if occurrence is not None:
+            result[before_first_day] = numpy.datetime64(occurrence, "m")
+    return result
+
+
+def _candidates(values, bound, low, high, bounded, reverse):
+    """
+    Helper function for Cronjob._search(). Returns all values of a sorted
+    tuple that lie between low and high in search order. If bounded is True,
+    the values have to be at or after bound in search order, too.
+    """
+    if bounded:
+        if reverse:
+            high = bound
+        else:
+            low = bound
+    selection = values[bisect.bisect_left(values, low):
+                       bisect.bisect_right(values, high)]
+    if reverse:
+        return reversed(selection)
+    return selection
+
+
+def _to_bitmask(values):
     """
-    Helper function for Cronjob.get_most_recent_occurence(). Shitty.
+    Converts a set of integers into a bitmask with bit n set if n is in the
+    set.
+
+    :param values: The values to convert.
+    :type values: set of int
+
+    :rtype: int
     """
-    if i == 4:
-        raise ValueError("d is older than every possible value in "
-                         "this crontab")
-    # not using indices, as that would rely on self.schedule to
-    # be sorted
-    # lets revert to the last position
-    i += 1
-    # lower it to the next possible value and continue
-    last_value = latest_schedule[i]
-    lower_values = [val for val in schedule[i]
-                    if val < last_value]
-    if len(lower_values) == 0:
-        _set_lower_value(schedule, latest_schedule, i)
-        return
-    latest_schedule[i] = max(lower_values)
+    mask = 0
+    for value in values:
+        mask |= 1 << value
+    return mask
+
+
+def _truncate_to_minute(date_time):
+    """
+    Returns the datetime with seconds and microseconds set to zero.
+    """
+    return date_time.replace(second=0, microsecond=0)
 
 
 def _parse_cronjob_string(cronjob_string):
@@ -316,9 +685,18 @@ def _parse_cronjob_string(cronjob_string):
     fields = _parse_string_to_fields(cronjob_string)
     if len(fields) != 6:
         raise ValueError("Too few or too many fields found.")
-    for i in _check_range:
+    for i in range(len(fields)):
         possible_values.append(
             _parse_expression_at_index(fields[i], i))
+
+    # sunday can be given as 0 or 7, all other values are invalid. this is
+    # done after ranges and steps have been applied over 0 to 7.
+    weekdays = possible_values[_WEEKDAY]
+    if _SUNDAY_ALIAS in weekdays:
+        weekdays.discard(_SUNDAY_ALIAS)
+        weekdays.add(_ranges[_WEEKDAY][-1])
+    if not weekdays.issubset(_ranges[_WEEKDAY]):
+        raise ParseError(fields[_WEEKDAY], "Invalid weekday.")
     return possible_values
 
 
@@ -329,10 +707,14 @@ def _parse_string_to_fields(cron_string):
     :param cron_string: The string to parse.
     :type cron_string: str
 
-    :returns: A list containing all fields found in the string.
+    :returns: A list containing all fields found in the string. If the
+        weekday is omitted, it is added as "*".
     :rtype: list of strings
     """
-    return cron_string.split()
+    fields = cron_string.split()
+    if len(fields) == _WEEKDAY:
+        fields.append("*")
+    return fields
 
 
 def _datetime_to_tuple(date_time):
@@ -354,24 +736,6 @@ def _datetime_to_tuple(date_time):
     return (d_minute, d_hour, d_day, d_month, d_year, d_weekday)
 
 
-def _tuple_to_datetime(date_time_tuple):
-    """
-    Converts a (minute, hour, day_of_month, month, year, weekday) tuple to
-    the corresponding datetime.
-
-    :param date_time_tuple: The tuple to convert.
-    :type date_time_tuple: tuple
-
-    :returns: A datetime derived from the tuple.
-    :rtype: datetime
-    """
-    return datetime.datetime(year=date_time_tuple[4],
-                             month=date_time_tuple[3],
-                             day=date_time_tuple[2],
-                             hour=date_time_tuple[1],
-                             minute=date_time_tuple[0])
-
-
 def _parse_expression_at_index(expression, index):
     """
     Parses the expression at a specific index and returns a set containing all
@@ -453,7 +817,7 @@ def _parse_subexpression_at_index(expression, index):
                 "Start value must be lower than or equal to end value.")
         possible_values = set(range(start, end + 1))
     elif '*' == rest:
-        possible_values = set(_ranges[index])
+        possible_values = set(_parse_ranges[index])
     elif _get_integer_at_index(rest, index) is not None:
         possible_values = set([_get_integer_at_index(rest, index)])
     else:
@@ -464,8 +828,9 @@ def _parse_subexpression_at_index(expression, index):
     # we do not have to do anything, but when it is not, we have to filter out
     # all values not met by the step criteria.
     if step != 1:
+        first = min(possible_values)
         possible_values = \
-            {i for i in possible_values if i % step == min(possible_values)}
+            {i for i in possible_values if (i - first) % step == 0}
     return possible_values
 
 
@@ -486,9 +851,7 @@ def _get_integer_at_index(parse_string, index):
     """
     if parse_string.isdigit():
         return int(parse_string)
-    if parse_string in _name_mapping[index]:
-        return _name_mapping[parse_string]
-    return None
+    return _name_mapping[index].get(parse_string.upper())
 
 
 class ParseError(Exception):
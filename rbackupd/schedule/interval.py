@@ -6,6 +6,8 @@ import datetime
 import logging
 import sys
 
+from rbackupd import clocks
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,22 +39,27 @@ class Interval(object):
 
     :param interval_string: Describes the interval.
     :type interval_string: str
+
+    :param clock: The clock used to determine the current date. If omitted,
+        the time of the system is used.
+    :type clock: clocks.SystemClock or clocks.ManualClock instance
     """
-    def __init__(self, interval_string):
+    def __init__(self, interval_string, clock=None):
         self.interval_string = interval_string
+        self.clock = clock if clock is not None else clocks.SYSTEM_CLOCK
 
     def get_oldest_datetime(self, reference=None):
         """
         Returns the oldest datetime that still lies inside the interval.
 
         :param reference: The reference time for the comparison. If missing, the
-            current date is taken.
+            current date of the clock is taken.
         :type reference: datetime instance
 
         :rtype: datetime instance
         """
         if reference is None:
-            reference = datetime.datetime.now().replace(microsecond=0)
+            reference = self.clock.now().replace(microsecond=0)
 
         return _interval_to_oldest_datetime(self.interval_string, reference)
 
@@ -0,0 +1,252 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides the scheduler that decides when tasks have to check for
+new and expired backups and runs them.
+
+Instead of letting every task poll its intervals every minute, the
+:class:`Scheduler` keeps all tasks in a heap ordered by the next occurrence of
+any of their intervals. A single thread sleeps until the earliest of these
+occurrences and is woken up early whenever the schedule changes, e.g. because a
+task was paused, stopped or added.
+
+Due tasks are run in a fixed-size pool of worker threads, so tasks that are not
+running do not cost a process or thread at all. A task is never run twice at
+the same time. After a run has finished, the task is scheduled again for the
+next occurrence after the start of the run, so occurrences that passed while
+the task was running are caught up immediately.
+
+The scheduler could be used like this::
+
+    import scheduler
+
+    backup_scheduler = scheduler.Scheduler(max_workers=4)
+    backup_scheduler.start()
+
+    # the task will be run immediately and then whenever one of its
+    # intervals occurs
+    backup_scheduler.add(task)
+
+    # the task will not be run again until it is added back
+    backup_scheduler.remove(task)
+
+    backup_scheduler.stop()
+"""
+
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import threading
+
+from rbackupd import clocks
+from rbackupd import constants as const
+from rbackupd import task as backuptask
+
+logger = logging.getLogger(__name__)
+
+
+# Marks a running task that has to be scheduled for its next occurrence after
+# the run has finished.
+_NEXT_OCCURRENCE = object()
+
+
+class Scheduler(object):
+    """
+    Runs tasks whenever one of their intervals occurs.
+
+    :param max_workers: The maximum number of tasks that are run at the same
+        time.
+    :type max_workers: int
+
+    :param clock: The clock used to determine when tasks are due. If omitted,
+        the time of the system is used.
+    :type clock: clocks.SystemClock or clocks.ManualClock instance
+    """
+
+    def __init__(self, max_workers, clock=None):
+        self.clock = clock if clock is not None else clocks.SYSTEM_CLOCK
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers)
+
+        # Maps the names of all running tasks to (task, pending) tuples that
+        # tell what should happen after the run: pending is None if the task
+        # was removed in the meantime, a datetime if it was added again or
+        # _NEXT_OCCURRENCE otherwise. The task is the one to schedule next,
+        # which is not the running one if it was replaced by a task with the
+        # same name.
+        self._running = {}
+
+        # The heap contains [due, sequence number, task] lists. Removed tasks
+        # are not deleted from the heap, as that would be O(n), but their
+        # entry is invalidated by setting the task to None.
+        self._heap = []
+        self._entries = {}
+        self._sequence = itertools.count()
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._active = False
+
+    def add(self, task, due=None):
+        """
+        Add a task to the scheduler. If the task is already scheduled, the time
+        it will be run next is replaced. If the task is currently running, it
+        will be scheduled for that time after the run has finished.
+
+        :param task: The task to add.
+        :type task: Task instance
+
+        :param due: The time the task will be run next. If omitted, the task
+            will be run immediately.
+        :type due: datetime instance
+        """
+        if due is None:
+            due = self.clock.now()
+        with self._condition:
+            self._invalidate(task)
+            if task.name in self._running:
+                self._running[task.name] = (task, due)
+            else:
+                self._push(task, due)
+            self._condition.notify()
+
+    def remove(self, task):
+        """
+        Remove a task from the scheduler, so it will not be run anymore. A run
+        that is already in progress is not interrupted. Removing a task that is
+        not scheduled is a no-op.
+
+        :param task: The task to remove.
+        :type task: Task instance
+        """
+        with self._condition:
+            self._invalidate(task)
+            if task.name in self._running:
+                self._running[task.name] = (task, None)
+            self._condition.notify()
+
+    def get_due_time(self, task):
+        """
+        Return the time the task will be run next, or None if it is not
+        scheduled or currently running.
+
+        :param task: The task to look up.
+        :type task: Task instance
+
+        :rtype: datetime instance or None
+        """
+        with self._condition:
+            entry = self._entries.get(task.name)
+            return None if entry is None else entry[0]
+
+    def is_running(self, task):
+        """
+        Determine whether the task is currently being run by a worker.
+
+        :param task: The task to look up.
+        :type task: Task instance
+
+        :rtype: bool
+        """
+        with self._condition:
+            return task.name in self._running
+
+    def start(self):
+        """
+        Start scheduling tasks in a separate thread.
+        """
+        logger.debug("Starting scheduler.")
+        with self._condition:
+            self._active = True
+        self._thread = threading.Thread(target=self._run,
+                                        name="scheduler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop scheduling tasks and wait for the scheduler thread and all running
+        tasks to finish.
+        """
+        logger.debug("Stopping scheduler.")
+        with self._condition:
+            self._active = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+
+    def _push(self, task, due):
+        entry = [due, next(self._sequence), task]
+        self._entries[task.name] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _invalidate(self, task):
+        entry = self._entries.pop(task.name, None)
+        if entry is not None:
+            entry[-1] = None
+
+    def _run(self):
+        with self._condition:
+            while self._active:
+                while self._heap and self._heap[0][-1] is None:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                (due, _, task) = self._heap[0]
+                now = self.clock.now()
+                delay = (due - now).total_seconds()
+                if delay > 0:
+                    # The wait is capped so that we notice changes of the wall
+                    # clock (or a suspended system) in reasonable time, as the
+                    # timeout itself is measured with a monotonic clock.
+                    self._condition.wait(
+                        min(delay, const.SCHEDULER_MAX_SLEEP_SECONDS))
+                    continue
+
+                heapq.heappop(self._heap)
+                del self._entries[task.name]
+                logger.debug("Running task \"%s\" due at %s.",
+                             task.name, due)
+                self._running[task.name] = (task, _NEXT_OCCURRENCE)
+                self._executor.submit(self._run_task, task)
+
+    def _run_task(self, task):
+        """
+        Run the task in a worker thread and schedule it again afterwards.
+        """
+        # the timestamp is taken here and not when the task was submitted, as
+        # the task might have waited for a free worker
+        timestamp = self.clock.now()
+        try:
+            task.run(timestamp)
+        except backuptask.BackupError as error:
+            logger.error("Task \"%s\" failed: %s", task.name, error.message)
+        except Exception:
+            # the worker threads must survive whatever goes wrong in a task,
+            # otherwise the task would never be scheduled again
+            logger.exception("Task \"%s\" failed unexpectedly.", task.name)
+        finally:
+            self._reschedule(task, timestamp)
+
+    def _reschedule(self, task, timestamp):
+        with self._condition:
+            (task, pending) = self._running.pop(task.name)
+            if pending is None:
+                return
+            if pending is _NEXT_OCCURRENCE:
+                due = task.scheduling_info.get_next_occurrence(timestamp)
+            else:
+                due = pending
+            if due is None:
+                logger.info("Task \"%s\" has no future occurrences and "
+                            "will not be scheduled again.", task.name)
+                return
+            logger.debug("Task \"%s\" is due next at %s.", task.name, due)
+            self._push(task, due)
+            self._condition.notify()
@@ -0,0 +1,256 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides means to split a single source into shards that are
+copied by separate rsync processes at the same time.
+
+For a source containing millions of files, a single rsync process has to build
+and compare a huge file list, which takes a lot of memory and uses only a
+single core. Splitting the source by its top-level directories bounds the size
+of every file list and lets the shards be compared in parallel.
+
+The first shard always copies the source itself, excluding all top-level
+directories that belong to the other shards. This way, the files directly in
+the source and the attributes of the source folder itself are copied exactly
+once. All other shards copy a set of top-level directories. As the transfer
+uses ``--relative``, all shards end up in the same layout in the backup.
+
+The top-level directories are distributed so that every shard has about the
+same number of files, based on the number of files every directory had during
+the last backup. After a shard has been copied, its directories are walked to
+count all their files, not only the ones rsync transferred, as the time rsync
+needs depends on the size of the file list. These numbers are kept in the
+:class:`ShardHistory` of the destination::
+
+    destination ---+--- .rbackupd ---+--- shards
+
+A source could be split like this::
+
+    import sharding
+
+    history = sharding.ShardHistory(destination)
+    weights = history.get_weights(source)
+    entries = sharding.get_entries(source)
+    shards = sharding.assign(entries, weights, count=4)
+
+    # shards[0] has to be copied with the entries of all other shards
+    # excluded, shards[1:] are lists of top-level directories
+"""
+
+import heapq
+import json
+import logging
+import os
+import re
+
+from rbackupd import constants as const
+
+logger = logging.getLogger(__name__)
+
+# The key of the weight of all files directly in the source. These are always
+# copied by the first shard.
+REST = "."
+
+
+def get_entries(source):
+    """
+    Return the names of all top-level directories of a source, which are the
+    units the source can be split into. Symlinks to directories are not
+    followed, they are copied by the first shard.
+
+    :param source: The path of the source.
+    :type source: str
+
+    :rtype: list of str
+    """
+    if not os.path.isdir(source) or os.path.islink(source):
+        return []
+    return sorted(entry.name for entry in os.scandir(source) if
+                  entry.is_dir(follow_symlinks=False))
+
+
+def assign(entries, weights, count):
+    """
+    Distribute the entries to the given number of shards, so that the sum of
+    the weights of every shard is about the same. The weight of the files
+    directly in the source (the :data:`REST` key) always goes to the first
+    shard. Entries without a known weight are assumed to weigh as much as the
+    average entry.
+
+    This uses the longest processing time rule: the entries are assigned in
+    order of decreasing weight, each to the shard that has the least weight
+    so far.
+
+    :param entries: The names of the top-level directories.
+    :type entries: list of str
+
+    :param weights: The weights of the entries, by name.
+    :type weights: dict
+
+    :param count: The number of shards.
+    :type count: int
+
+    :returns: A list with the entries of every shard. Shards might be empty.
+    :rtype: list of lists of str
+    """
+    known = [weights[entry] for entry in entries if entry in weights]
+    default_weight = float(sum(known)) / len(known) if known else 1
+
+    shards = [[] for _ in range(count)]
+    # the heap contains (weight so far, index) tuples of all shards
+    loads = [(weights.get(REST, 0) if index == 0 else 0, index) for
+             index in range(count)]
+    heapq.heapify(loads)
+    for entry in sorted(entries,
+                        key=lambda entry: (-weights.get(entry,
+                                                        default_weight),
+                                           entry)):
+        (load, index) = heapq.heappop(loads)
+        shards[index].append(entry)
+        heapq.heappush(loads,
+                       (load + weights.get(entry, default_weight), index))
+    return [sorted(shard) for shard in shards]
+
+
+def escape_pattern(path):
+    """
+    Escape the wildcard characters in a path, so rsync matches the path
+    literally when it is used as a filter pattern.
+
+    :type path: str
+
+    :rtype: str
+    """
+    # rsync only treats backslashes as escape characters if the pattern
+    # contains a wildcard
+    if not re.search(r"[*?\[]", path):
+        return path
+    return re.sub(r"([*?\[\\])", r"\\\1", path)
+
+
+def count_files(path):
+    """
+    Return the number of files and directories below a directory. Symlinks
+    are counted, but not followed. Directories that cannot be read are
+    skipped.
+
+    :param path: The path of the directory.
+    :type path: str
+
+    :rtype: int
+    """
+    count = 0
+    pending = [path]
+    while pending:
+        try:
+            iterator = os.scandir(pending.pop())
+        except OSError:
+            continue
+        for entry in iterator:
+            count += 1
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+            except OSError:
+                continue
+    return count
+
+
+def count_entries(source, entries):
+    """
+    Count the files of the given top-level directories of a source by walking
+    them. The :data:`REST` key counts the files directly in the source that
+    are not top-level directories. Entries that cannot be read at all are left
+    out instead of being counted as empty.
+
+    :param source: The path of the source.
+    :type source: str
+
+    :param entries: The names of the top-level directories, and :data:`REST`
+        for the files directly in the source.
+    :type entries: list of str
+
+    :returns: The number of files of every entry, by name.
+    :rtype: dict
+    """
+    counts = {}
+    for entry in entries:
+        if entry == REST:
+            try:
+                counts[REST] = sum(
+                    1 for child in os.scandir(source) if
+                    not child.is_dir(follow_symlinks=False))
+            except OSError as error:
+                logger.debug("Could not count the files in \"%s\": %s",
+                             source, str(error))
+            continue
+        path = os.path.join(source, entry)
+        if not os.access(path, os.R_OK | os.X_OK):
+            logger.debug("Could not count the files in \"%s\".", path)
+            continue
+        counts[entry] = count_files(path)
+    return counts
+
+
+class ShardHistory(object):
+    """
+    The number of files of the top-level directories of all sharded sources
+    of a destination, as seen in the last backup.
+
+    :param destination: The path to the destination.
+    :type destination: str
+    """
+
+    def __init__(self, destination):
+        self.folder = os.path.join(destination, const.NAME_CATALOG_FOLDER)
+        self.path = os.path.join(self.folder, const.NAME_SHARD_HISTORY_FILE)
+
+    def _load(self):
+        try:
+            with open(self.path) as history_file:
+                content = json.load(history_file)
+        except (IOError, OSError):
+            return {}
+        except ValueError as error:
+            logger.warning("Shard history at \"%s\" is invalid and will be "
+                           "ignored: %s", self.path, str(error))
+            return {}
+        if not isinstance(content, dict):
+            return {}
+        return content
+
+    def get_weights(self, source):
+        """
+        Return the weights of the top-level directories of a source.
+
+        :param source: The path of the source.
+        :type source: str
+
+        :rtype: dict
+        """
+        weights = self._load().get(source)
+        if not isinstance(weights, dict):
+            return {}
+        return weights
+
+    def update(self, counts):
+        """
+        Replace the weights of the given sources and write the history
+        atomically.
+
+        :param counts: The weights of the top-level directories, by source.
+        :type counts: dict
+
+        :raise OSError: if the history could not be written
+        """
+        content = self._load()
+        content.update(counts)
+        if not os.path.exists(self.folder):
+            os.mkdir(self.folder)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as history_file:
+            json.dump(content, history_file, separators=(",", ":"))
+            history_file.flush()
+            os.fsync(history_file.fileno())
+        os.rename(temp_path, self.path)
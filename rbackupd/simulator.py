@@ -0,0 +1,443 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides a simulator that shows how the backups of a task evolve
+over a long time, without copying any data or waiting for the schedule.
+
+The simulator runs the real logic of :class:`task.Task` that decides which
+backups are necessary and which are expired, but keeps all backups in memory
+instead of on disk and reads the time from a :class:`clocks.ManualClock`. After
+every run, the clock jumps right to the next time one of the intervals occurs,
+just like the scheduler would wake up the task, so a year of schedules takes a
+few seconds.
+
+The result is a :class:`SimulationReport` with the number of backups of every
+interval at the end, the maximum number of backups at any time, how many
+backups were created and removed, and how many operations of every kind the
+task performed::
+
+    import datetime
+
+    import simulator
+
+    simulation = simulator.Simulator(
+        intervals=[("hourly", "0 * * * * *", 24, "1d"),
+                   ("daily", "0 0 * * * *", 7, "1w")],
+        start=datetime.datetime(2014, 1, 1))
+    report = simulation.run(datetime.timedelta(days=365))
+
+    print(report.format())
+
+The simulator can also be run from the command line, either for a task of a
+configuration file or for intervals given directly::
+
+    python -m rbackupd.simulator --config /etc/rbackupd/rbackupd.conf \\
+        --task home --days 365
+    python -m rbackupd.simulator --interval hourly "0 * * * * *" 24 1d \\
+        --days 30
+"""
+
+import argparse
+import collections
+import datetime
+import logging
+import os
+import sys
+
+from rbackupd import backupstorage
+from rbackupd import clocks
+from rbackupd import constants as const
+from rbackupd import task as backuptask
+from rbackupd.schedule import cron
+from rbackupd.schedule import interval
+
+logger = logging.getLogger(__name__)
+
+# The names of the operations that are counted during a simulation.
+OPERATION_TRANSFER = "transfer"
+OPERATION_LINK = "link"
+OPERATION_MOVE = "move"
+OPERATION_UNLINK = "unlink"
+OPERATION_REMOVE = "remove"
+
+# The destination the simulated backups pretend to be stored in.
+_DESTINATION = "/simulated"
+
+
+class SimulatedBackup(backupstorage.BackupStorage):
+    """
+    A backup that only exists in memory. It counts the operations done with it
+    in the given counter.
+
+    :param path: The path the backup pretends to be stored at.
+    :type path: str
+
+    :param operations: The counter of all operations of the simulation.
+    :type operations: collections.Counter instance
+    """
+
+    def __init__(self, path, operations):
+        super(SimulatedBackup, self).__init__()
+        self.path = path
+        self._operations = operations
+        self._finished = False
+        self._has_data = False
+        self._link_target = None
+        self._statistics = {}
+
+    def set_metadata(self, name, date, interval_name):
+        self._name = name
+        self._date = date
+        self._interval_name = interval_name
+
+    def set_statistics(self, statistics):
+        self._statistics = dict(statistics)
+
+    def prepare(self):
+        pass
+
+    def finish(self):
+        self._finished = True
+
+    def is_finished(self):
+        return self._finished
+
+    def fill(self):
+        """
+        Pretend that the data was copied into the backup.
+        """
+        self._has_data = True
+
+    def link_data_from(self, storage):
+        self._operations[OPERATION_LINK] += 1
+        self._link_target = storage.path
+
+    def remove_data_link(self):
+        if self._link_target is None:
+            raise backupstorage.BackupStorageIllegalOperationError(
+                self, "data is not a link")
+        self._operations[OPERATION_UNLINK] += 1
+        self._link_target = None
+
+    def move_data_to(self, storage):
+        if not self._has_data:
+            raise backupstorage.BackupStorageIllegalOperationError(
+                self, "backup has no data to move")
+        self._operations[OPERATION_MOVE] += 1
+        self._has_data = False
+        storage.fill()
+
+    def data_is_link(self):
+        return self._link_target is not None
+
+    def data_is_link_to(self, storage):
+        return self._link_target == storage.path
+
+    @property
+    def date(self):
+        return self._date
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def interval_name(self):
+        return self._interval_name
+
+    @property
+    def link_target(self):
+        return self._link_target
+
+    @property
+    def statistics(self):
+        return self._statistics
+
+    @property
+    def folder(self):
+        return os.path.basename(self.path)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, const.NAME_BACKUP_SUBFOLDER)
+
+
+class _SimulatedTask(backuptask.Task):
+    """
+    A task whose backups only exist in memory. Everything that would touch the
+    disk or run rsync is replaced, the decisions are made by the real task.
+    """
+
+    def __init__(self, scheduling_info, clock):
+        self.operations = collections.Counter()
+        self.created = 0
+        super(_SimulatedTask, self).__init__(
+            name="simulation",
+            sources=[],
+            destination=_DESTINATION,
+            scheduling_info=scheduling_info,
+            one_filesystem=False,
+            rsync_cmd=None,
+            rsync_args="",
+            rsync_logfile_options=None,
+            rsync_filter=None,
+            clock=clock)
+
+    def _read_backups(self):
+        return []
+
+    def _save_catalog(self, backups):
+        pass
+
+    def _register_backup(self, backup):
+        self.created += 1
+        super(_SimulatedTask, self)._register_backup(backup)
+
+    def _new_backup_storage(self, folder_name):
+        return SimulatedBackup(os.path.join(self.destination, folder_name),
+                               self.operations)
+
+    def get_backup_params(self):
+        return backuptask.BackupParameters(
+            link_refs=[],
+            rsync_cmd=self.rsync_cmd,
+            rsync_args=self.rsync_args,
+            rsync_filter=self.rsync_filter,
+            rsync_logfile_options=self.rsync_logfile_options)
+
+    def create_backup(self, new_backup, params):
+        self.operations[OPERATION_TRANSFER] += 1
+        new_backup.fill()
+
+    def _dispose_backup(self, backup):
+        self.operations[OPERATION_REMOVE] += 1
+
+
+class SimulationReport(object):
+    """
+    The outcome of a simulation.
+
+    :param start: The time the simulation started at.
+    :type start: datetime instance
+
+    :param end: The time the simulation ended at.
+    :type end: datetime instance
+
+    :param runs: The number of times the task was run.
+    :type runs: int
+
+    :param created: The number of backups that were created, including
+        backups that are only links to another backup.
+    :type created: int
+
+    :param snapshots: The number of backups of every interval at the end.
+    :type snapshots: dict
+
+    :param max_snapshots: The maximum number of backups at any time.
+    :type max_snapshots: int
+
+    :param operations: The number of operations of every kind.
+    :type operations: dict
+    """
+
+    def __init__(self, start, end, runs, created, snapshots, max_snapshots,
+                 operations):
+        self.start = start
+        self.end = end
+        self.runs = runs
+        self.created = created
+        self.snapshots = snapshots
+        self.max_snapshots = max_snapshots
+        self.operations = operations
+
+    @property
+    def removed(self):
+        """
+        The number of backups that were removed.
+        """
+        return self.operations.get(OPERATION_REMOVE, 0)
+
+    @property
+    def churn_per_day(self):
+        """
+        The average number of backups that were created or removed per day.
+
+        :rtype: float
+        """
+        days = (self.end - self.start).total_seconds() / 86400
+        if days <= 0:
+            return 0.0
+        return (self.created + self.removed) / days
+
+    def format(self):
+        """
+        Return the report as human readable text.
+
+        :rtype: str
+        """
+        lines = ["Simulated %s to %s, %s runs." % (
+            self.start.isoformat(), self.end.isoformat(), self.runs)]
+        lines.append("Backups at the end:")
+        for (interval_name, count) in self.snapshots.items():
+            lines.append("  %-20s %s" % (interval_name, count))
+        lines.append("Maximum number of backups: %s" % self.max_snapshots)
+        lines.append("Created: %s, removed: %s, churn: %.2f per day" % (
+            self.created, self.removed, self.churn_per_day))
+        lines.append("Operations:")
+        for (operation, count) in sorted(self.operations.items()):
+            lines.append("  %-20s %s" % (operation, count))
+        return "\n".join(lines)
+
+
+class Simulator(object):
+    """
+    Simulates the backups of a task with the given intervals.
+
+    :param intervals: The intervals of the task, as tuples of the name, the
+        cron pattern, the number of backups to keep and the maximum age of
+        backups, in the order of the configuration file.
+    :type intervals: list of (str, str, int, str) tuples
+
+    :param start: The time the simulation starts at.
+    :type start: datetime instance
+    """
+
+    def __init__(self, intervals, start):
+        self.clock = clocks.ManualClock(start)
+        scheduling_info = backuptask.TaskSchedulingInfo()
+        for (name, cron_pattern, keep_count, keep_age) in intervals:
+            scheduling_info.append(backuptask.IntervalInfo(
+                name=name,
+                cron_pattern=cron.Cronjob(cron_pattern, clock=self.clock),
+                keep_count=keep_count,
+                keep_age=interval.Interval(keep_age, clock=self.clock)))
+        self.interval_names = [name for (name, _, _, _) in intervals]
+        self.task = _SimulatedTask(scheduling_info, self.clock)
+
+    def run(self, duration):
+        """
+        Run the task whenever one of its intervals occurs until the given time
+        has passed.
+
+        :param duration: The time to simulate.
+        :type duration: timedelta instance
+
+        :rtype: SimulationReport instance
+        """
+        start = self.clock.now()
+        end = start + duration
+        runs = 0
+        max_snapshots = len(self.task.backups)
+        self.task.start()
+        try:
+            now = start
+            while now <= end:
+                self.task.run(now)
+                runs += 1
+                max_snapshots = max(max_snapshots, len(self.task.backups))
+                due = self.task.scheduling_info.get_next_occurrence(now)
+                if due is None or due > end:
+                    break
+                self.clock.set(due)
+                now = due
+        finally:
+            self.task.stop()
+        self.clock.set(max(end, self.clock.now()))
+
+        snapshots = collections.OrderedDict(
+            (name, len(self.task.backups.get_interval(name))) for
+            name in self.interval_names)
+        return SimulationReport(start=start,
+                                end=end,
+                                runs=runs,
+                                created=self.task.created,
+                                snapshots=snapshots,
+                                max_snapshots=max_snapshots,
+                                operations=dict(self.task.operations))
+
+
+def read_intervals(config_path, task_name):
+    """
+    Read the intervals of a task from a configuration file.
+
+    :param config_path: The path of the configuration file.
+    :type config_path: str
+
+    :param task_name: The name of the task.
+    :type task_name: str
+
+    :returns: The intervals in the format :class:`Simulator` expects.
+    :rtype: list of (str, str, int, str) tuples
+    """
+    # reading the configuration needs configobj, which is not needed to
+    # simulate intervals given directly
+    from rbackupd import configmapper
+
+    mapper = configmapper.ConfigMapper(config_path)
+    task_section = mapper.task(task_name, fallback_on_default=True)
+    intervals = []
+    for interval_name in task_section.interval_names:
+        intervals.append((
+            interval_name,
+            task_section.get_subsection(
+                const.CONF_SECTION_INTERVALS)[interval_name],
+            int(task_section.get_subsection(
+                const.CONF_SECTION_KEEP)[interval_name]),
+            task_section.get_subsection(
+                const.CONF_SECTION_AGE)[interval_name]))
+    return intervals
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m rbackupd.simulator",
+        description="Simulate the backups of a task over a long time.")
+    parser.add_argument("--config", help="the configuration file to read")
+    parser.add_argument("--task", help="the task of the configuration file")
+    parser.add_argument("--interval", nargs=4, action="append", default=[],
+                        metavar=("NAME", "CRON", "KEEP", "KEEP_AGE"),
+                        help="an interval of the task, can be given "
+                        "several times")
+    parser.add_argument("--days", type=int, default=365,
+                        help="the number of days to simulate")
+    parser.add_argument("--start", default=None,
+                        help="the start of the simulation, as %s" %
+                        const.DATE_FORMAT.replace("%", "%%"))
+    args = parser.parse_args(argv)
+    if (args.config is None) == (len(args.interval) == 0):
+        parser.error("either --config or --interval has to be given")
+    if args.config is not None and args.task is None:
+        parser.error("--config needs --task")
+    return args
+
+
+def main(argv):
+    """
+    Run a simulation as specified on the command line and print the report.
+
+    :param argv: The command line arguments without the program name.
+    :type argv: list of str
+    """
+    args = _parse_args(argv)
+    # the decisions of every single run are not interesting here
+    logging.getLogger("rbackupd").setLevel(logging.WARNING)
+
+    if args.config is not None:
+        intervals = read_intervals(args.config, args.task)
+    else:
+        intervals = [(name, cron_pattern, int(keep_count), keep_age) for
+                     (name, cron_pattern, keep_count, keep_age) in
+                     args.interval]
+    if args.start is None:
+        start = datetime.datetime.now().replace(second=0, microsecond=0)
+    else:
+        start = datetime.datetime.strptime(args.start, const.DATE_FORMAT)
+
+    simulation = Simulator(intervals, start)
+    report = simulation.run(datetime.timedelta(days=args.days))
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
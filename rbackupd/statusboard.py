@@ -0,0 +1,157 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+"""
+This module provides the status board, which holds the current status of all
+tasks.
+
+Every task publishes what it is doing to the board: its state, the phase of
+the current run, when the run started, how many bytes it has transferred so
+far and the result and duration of the last run. The D-Bus interface and any
+other reader only look at the board and never have to ask the tasks
+themselves, so reading the status of all tasks neither waits for a running
+backup nor takes a lock.
+
+The status of a task is a :class:`TaskRecord`, which is immutable. Publishing
+a change creates a new record and a new mapping of all records, which then
+replaces the old mapping at once. So readers always get a consistent snapshot,
+even while tasks are updating their records in other threads::
+
+    import statusboard
+
+    board = statusboard.StatusBoard()
+    board.update("home", state="working", phase=statusboard.PHASE_TRANSFER)
+
+    for (name, record) in sorted(board.snapshot().items()):
+        print(name, record.state, record.phase, record.bytes_transferred)
+"""
+
+import collections
+import threading
+
+# The phases of a run of a task.
+PHASE_IDLE = "idle"
+PHASE_CHECK = "check"
+PHASE_TRANSFER = "transfer"
+PHASE_EXPIRE = "expire"
+
+# The results of a run of a task.
+RESULT_SUCCESS = "success"
+RESULT_FAILURE = "failure"
+
+
+class TaskRecord(collections.namedtuple("TaskRecord", [
+        "state",
+        "phase",
+        "started",
+        "bytes_transferred",
+        "last_result",
+        "last_duration",
+        "last_error"])):
+    """
+    The status of a task at one point in time.
+
+    - state: the name of the :class:`task.TaskStatus` of the task
+    - phase: what the current run is doing, one of the PHASE_* constants
+    - started: the start of the current or last run as datetime instance, or
+      None if the task has not been run yet
+    - bytes_transferred: the number of bytes the current or last run has
+      transferred
+    - last_result: the result of the last run, one of the RESULT_* constants,
+      or None if the task has not finished a run yet
+    - last_duration: the duration of the last run in seconds, or None
+    - last_error: the error the last run failed with, or None if it succeeded
+    """
+
+    __slots__ = ()
+
+
+# The record of a task that has not published anything yet.
+EMPTY_RECORD = TaskRecord(state=None,
+                          phase=PHASE_IDLE,
+                          started=None,
+                          bytes_transferred=0,
+                          last_result=None,
+                          last_duration=None,
+                          last_error=None)
+
+
+class StatusBoard(object):
+    """
+    Holds the records of all tasks. Updates are serialized, reads never block.
+
+    :param listener: A callable that is called with the name of the task, the
+        old and the new record after every update, in the thread that made
+        the update. It is called while the board is locked, so the calls are
+        made in the order of the updates. It must return quickly and must not
+        update the board itself.
+    :type listener: callable
+    """
+
+    def __init__(self, listener=None):
+        # This dictionary is never modified after it has been assigned, so it
+        # can be read without a lock.
+        self._records = {}
+        self._lock = threading.Lock()
+        self.listener = listener
+
+    def update(self, name, **changes):
+        """
+        Change some fields of the record of a task. All other fields keep
+        their values.
+
+        :param name: The name of the task.
+        :type name: str
+
+        :param changes: The new values of the fields of the record.
+
+        :returns: The new record.
+        :rtype: TaskRecord instance
+        """
+        with self._lock:
+            records = dict(self._records)
+            old_record = records.get(name, EMPTY_RECORD)
+            record = old_record._replace(**changes)
+            records[name] = record
+            self._records = records
+            if self.listener is not None:
+                self.listener(name, old_record, record)
+        return record
+
+    def remove(self, name):
+        """
+        Remove the record of a task. Nothing happens if the task has no
+        record.
+
+        :param name: The name of the task.
+        :type name: str
+        """
+        with self._lock:
+            if name not in self._records:
+                return
+            records = dict(self._records)
+            del records[name]
+            self._records = records
+
+    def get(self, name):
+        """
+        Return the record of a task.
+
+        :param name: The name of the task.
+        :type name: str
+
+        :rtype: TaskRecord instance
+
+        :raise KeyError: if the task has no record
+        """
+        return self._records[name]
+
+    def snapshot(self):
+        """
+        Return the records of all tasks at one point in time. The mapping must
+        not be modified.
+
+        :returns: The records by the name of their task.
+        :rtype: dict
+        """
+        return self._records
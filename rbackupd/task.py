@@ -5,16 +5,25 @@
 The task module.
 """
 
-import datetime
+import collections
+import concurrent.futures
 import enum
+import functools
 import logging
-import multiprocessing
 import os
+import shlex
 import sys
-import time
+import threading
+import uuid
 
+from rbackupd import backupset
 from rbackupd import backupstorage
+from rbackupd import catalog
+from rbackupd import clocks
 from rbackupd import constants as const
+from rbackupd import limits
+from rbackupd import sharding
+from rbackupd import statusboard
 from rbackupd.cmd import files
 from rbackupd.cmd import rsync
 
@@ -37,7 +46,16 @@ class Task(object):
                  rsync_cmd,
                  rsync_args,
                  rsync_logfile_options,
-                 rsync_filter):
+                 rsync_filter,
+                 transfer_limiter=None,
+                 reclaimer=None,
+                 report_progress=False,
+                 progress_listener=None,
+                 rsync_workers=1,
+                 shards=1,
+                 clock=None,
+                 status_board=None,
+                 backup_listener=None):
         self.name = name
         self.sources = sources
         self.destination = destination
@@ -48,29 +66,132 @@ class Task(object):
         self.rsync_args = rsync_args
         self.rsync_logfile_options = rsync_logfile_options
         self.rsync_filter = rsync_filter
-
-        self._backups = self._read_backups()
-
-        self._prcess = None
+        # the maximum number of rsync processes that copy the sources into a
+        # backup at the same time, one per source
+        self.rsync_workers = rsync_workers
+        # the number of rsync processes every single source is split into
+        self.shards = shards
+
+        self.transfer_limiter = transfer_limiter
+        self.reclaimer = reclaimer
+
+        # the clock all decisions about necessary and expired backups are
+        # based on
+        self.clock = clock if clock is not None else clocks.SYSTEM_CLOCK
+
+        # whether rsync should report its progress, and a callable that is
+        # called with the task and the progress whenever it is updated
+        self.report_progress = report_progress
+        self.progress_listener = progress_listener
+        self._progress = None
+        self._progress_lock = threading.Lock()
+        # the time and percentage of the progress last published to the
+        # status board
+        self._published_progress = None
+
+        self._catalog = catalog.Catalog(self.destination)
+        self._shard_history = sharding.ShardHistory(self.destination)
+        self._backups = backupset.BackupSet(self._read_backups())
 
         self._status = TaskStatus.stopped
 
-        self._pausing_event = multiprocessing.Event()
-        self._event_exit = multiprocessing.Event()
-        self._paused_event = multiprocessing.Event()
+        # guards the status against the scheduler starting a run while the
+        # task is being paused or stopped
+        self._lock = threading.Lock()
+        self._idle_event = threading.Event()
+        self._idle_event.set()
+
+        # the board the task publishes its status to, a task that is not
+        # managed by a backup manager gets a board of its own
+        if status_board is None:
+            status_board = statusboard.StatusBoard()
+        self.status_board = status_board
+        # a task replacing another one with the same name on a reload must
+        # not overwrite the state of the old task, which may still be running
+        # until it is stopped, the new task publishes its state when started
+        if self.name not in self.status_board.snapshot():
+            self.status_board.update(self.name, state=self._status.name)
+
+        # a callable that is called with the task and the new backup whenever
+        # a backup has been created
+        self.backup_listener = backup_listener
 
     def _is_latest_symlink(self, folder):
         return folder == const.SYMLINK_LATEST_NAME
 
+    def _is_hidden(self, folder):
+        return folder.startswith(".")
+
     @property
     def backups(self):
         assert(self._backups is not None)
         return self._backups
 
+    @property
+    def progress(self):
+        """
+        The progress of the transfer that is currently running, or None if
+        there is none or its progress is not known.
+
+        :rtype: rsync.TransferProgress instance or None
+        """
+        return self._progress
+
+    def _update_progress(self, progress):
+        self._progress = progress
+        if progress is None:
+            self._published_progress = None
+        else:
+            self._publish_progress(progress)
+        if self.progress_listener is not None:
+            self.progress_listener(self, progress)
+
+    def _publish_progress(self, progress):
+        """
+        Publish the transferred bytes to the status board. rsync reports its
+        progress many times a second, so this is only done once per
+        :data:`const.PROGRESS_PUBLISH_INTERVAL_SECONDS` or when the
+        percentage changes.
+        """
+        now = self.clock.monotonic()
+        if self._published_progress is not None:
+            (published, percent) = self._published_progress
+            if (percent == progress.percent and
+                    now - published < const.PROGRESS_PUBLISH_INTERVAL_SECONDS):
+                return
+        self._published_progress = (now, progress.percent)
+        self._publish(bytes_transferred=progress.bytes_done)
+
+    @property
+    def trash_folder(self):
+        """
+        The folder in the destination expired backups are moved to before they
+        are deleted by the reclaimer.
+        """
+        return os.path.join(self.destination, const.NAME_TRASH_FOLDER)
+
     def _read_backups(self):
         """
         Parse the backups that already exist at the destination into objects and
-        return them in a list.
+        return them in a list. If the catalog of the destination is up to date,
+        the backups are taken from there, otherwise all backup folders are
+        inspected and the catalog is rewritten.
+
+        :rtype: list of Backup instances
+        """
+        backups = self._catalog.load()
+        if backups is not None:
+            logger.debug("Task \"%s\": Read %s backups from catalog.",
+                         self.name, len(backups))
+            return backups
+
+        backups = self._scan_backups()
+        self._save_catalog(backups)
+        return backups
+
+    def _scan_backups(self):
+        """
+        Read all backups by inspecting every folder in the destination.
 
         :rtype: list of Backup instances
         """
@@ -82,6 +203,11 @@ class Task(object):
                              "\"%s\".", self.name, folder)
                 continue
 
+            if self._is_hidden(folder):
+                logger.debug("Task \"%s\": Ignoring hidden folder "
+                             "\"%s\".", self.name, folder)
+                continue
+
             backup = backupstorage.BackupFolder(
                 os.path.join(self.destination, folder))
 
@@ -108,9 +234,22 @@ class Task(object):
 
         return backups
 
+    def _save_catalog(self, backups):
+        """
+        Write the given backups to the catalog of the destination. Failing to
+        do so is not fatal, as a stale catalog is detected and ignored the next
+        time it is read.
+        """
+        try:
+            self._catalog.save(backups)
+        except (IOError, OSError) as error:
+            logger.warning("Task \"%s\": Could not write catalog: %s",
+                           self.name, str(error))
+
     def _register_backup(self, backup):
         """
-        Add a new backup to the already existing backups.
+        Add a new backup to the already existing backups. The catalog is not
+        written, the caller saves it once it has registered all new backups.
 
         :param backup: The backup to register.
         :type backup: Backup instance
@@ -118,18 +257,20 @@ class Task(object):
         assert(self._backups is not None)
         logger.debug("Task \"%s\": Registering backup \"%s\".",
                      self.name, backup.name)
-        self._backups.append(backup)
+        self._backups.add(backup)
 
     def _unregister_backup(self, backup):
         """
-        Removes a backup from the backups known to this task.
+        Removes a backup from the backups known to this task. The catalog is
+        not written, the caller saves it once it has unregistered all expired
+        backups.
 
         :param backup: The backup to unregister.
         :type backup: Backup instance
+
+        :raise ValueError: if the backup is not registered
         """
         assert(self._backups is not None)
-        if backup not in self._backups:
-            raise ValueError("backup not found")
         logger.debug("Task \"%s\": Unregistering backup \"%s\".",
                      self.name, backup.name)
         self._backups.remove(backup)
@@ -141,6 +282,7 @@ class Task(object):
         :rtype: list of IntervalInfos instances
         """
         necessary_backups = []
+        now = self.clock.now()
         for interval_info in self.scheduling_info.interval_infos:
             logger.debug("Task \"%s\": Checking interval \"%s\" for "
                          "necessary backups.",
@@ -153,8 +295,9 @@ class Task(object):
                              self.name)
                 necessary_backups.append(interval_info)
                 continue
-            if interval_info.cronjob.has_occured_since(latest_backup.date,
-                                                       include_start=False):
+            if interval_info.cronjob.has_occured_between(latest_backup.date,
+                                                         now,
+                                                         include_start=False):
                 logger.debug("Task \"%s\": Backup necessary as interval "
                              "occurred since latest backup.",
                              self.name)
@@ -181,32 +324,58 @@ class Task(object):
             date=timestamp.strftime(const.DATE_FORMAT),
             interval_name=interval_info.name)
 
-        new_backup = backupstorage.BackupFolder(os.path.join(
-            self.destination, new_folder_name))
+        new_backup = self._new_backup_storage(new_folder_name)
 
         params = self.get_backup_params()
         new_backup.set_metadata(name=new_folder_name,
                                 date=timestamp,
                                 interval_name=interval_info.name)
         new_backup.prepare()
-        self.create_backup(new_backup, params)
+        try:
+            self.create_backup(new_backup, params)
+        except Exception:
+            # the task tries again at the next occurrence, so every failure
+            # would leave another unfinished backup behind
+            self._discard_unfinished_backup(new_backup)
+            raise
         new_backup.finish()
         self._register_backup(new_backup)
 
         # all other necessary backups will just be symlinked to the one just
-        # created
-        for interval_info in necessary_interval_infos[1:]:
-            self._create_symlink_backup(timestamp=timestamp,
-                                        target=new_backup,
-                                        interval_info=interval_info)
+        # created. the catalog is written once afterwards, even if one of the
+        # symlinks fails.
+        try:
+            for interval_info in necessary_interval_infos[1:]:
+                self._create_symlink_backup(timestamp=timestamp,
+                                            target=new_backup,
+                                            interval_info=interval_info)
+        finally:
+            self._save_catalog(self._backups)
+
+        if self.backup_listener is not None:
+            self.backup_listener(self, new_backup)
+
+    def _discard_unfinished_backup(self, backup):
+        """
+        Get rid of a backup whose creation failed. It is not registered, so
+        it is only disposed of. Failing to do so is logged, as the error that
+        made the creation fail is more important.
+        """
+        logger.info("Task \"%s\": Removing the unfinished backup \"%s\".",
+                    self.name, backup.name)
+        try:
+            self._dispose_backup(backup)
+        except (OSError, files.FileOperationError) as error:
+            logger.warning("Task \"%s\": Could not remove the unfinished "
+                           "backup \"%s\": %s", self.name, backup.path,
+                           str(error))
 
     def _create_symlink_backup(self, timestamp, target, interval_info):
         symlink_name = self._get_folder_name(
             name=self.name,
             date=timestamp.strftime(const.DATE_FORMAT),
             interval_name=interval_info.name)
-        symlink_backup = backupstorage.BackupFolder(os.path.join(
-            self.destination, symlink_name))
+        symlink_backup = self._new_backup_storage(symlink_name)
         symlink_backup.set_metadata(name=symlink_name,
                                     date=timestamp,
                                     interval_name=interval_info.name)
@@ -215,6 +384,16 @@ class Task(object):
         symlink_backup.finish()
         self._register_backup(symlink_backup)
 
+    def _new_backup_storage(self, folder_name):
+        """
+        Return the storage a new backup with the given folder name is created
+        in.
+
+        :rtype: BackupStorage instance
+        """
+        return backupstorage.BackupFolder(os.path.join(self.destination,
+                                                       folder_name))
+
     def _get_folder_name(self, name, date, interval_name):
         return const.PATTERN_BACKUP_FOLDER.format(
             name=name,
@@ -227,46 +406,367 @@ class Task(object):
 
         :returns: Information about the new backup.
         :rtype: BackupParameters instance
+
+        :raise BackupError: if no old backup can be used to hardlink from
+            although there are old backups
         """
         logger.debug("Task \"%s\": Getting parameters of new backup.",
                      self.name)
-        new_link_ref = self._get_latest_backup()
-        if new_link_ref is not None:
-            logger.debug("Link-ref of new backup: \"%s\"",
-                         new_link_ref.data_path)
+        link_refs = self._get_link_refs()
+        if link_refs:
+            logger.debug("Link-refs of new backup: %s",
+                         ", ".join("\"%s\"" % link_ref.data_path for
+                                   link_ref in link_refs))
         else:
             logger.debug("No link ref as no old backup found.")
         backup_params = BackupParameters(
-            link_ref=new_link_ref,
+            link_refs=link_refs,
             rsync_cmd=self.rsync_cmd,
             rsync_args=self.rsync_args,
             rsync_filter=self.rsync_filter,
             rsync_logfile_options=self.rsync_logfile_options)
         return backup_params
 
+    def _get_link_refs(self):
+        """
+        Return the backups rsync should hardlink unchanged files from, best
+        candidates first: the latest backup, then the latest backup of every
+        interval, then the most recent backups. This way, files that were
+        changed and reverted later, or that only exist in the backup of
+        another interval, do not have to be copied again.
+
+        Backups whose data is only a link to another backup are replaced by
+        that backup. Backups on another filesystem than the destination are
+        left out, as files cannot be hardlinked across filesystems and rsync
+        would silently copy everything instead.
+
+        :rtype: list of BackupStorage instances
+
+        :raise BackupError: if there are old backups, but the filesystem of
+            the destination cannot be determined or none of them is on it
+        """
+        latest_backups = [self._get_latest_backup_of_interval(interval_info)
+                          for interval_info in
+                          self.scheduling_info.interval_infos]
+        candidates = (
+            [self._get_latest_backup()] +
+            sorted([backup for backup in latest_backups if backup is not None],
+                   key=lambda backup: (backup.date, backup.path),
+                   reverse=True) +
+            self._backups.get_recent(const.LINK_REF_RECENT_COUNT))
+
+        if candidates[0] is None:
+            # there are no old backups at all, so there is nothing to link
+            return []
+
+        try:
+            device = limits.get_device(self.destination)
+        except OSError as error:
+            raise BackupError(
+                self,
+                "Could not determine the device of the destination \"%s\", "
+                "so the new backup might be a full copy: %s" %
+                (self.destination, str(error)))
+
+        link_refs = collections.OrderedDict()
+        foreign_devices = set()
+        for backup in candidates:
+            if backup is None:
+                continue
+            if backup.link_target is not None:
+                backup = self._backups.get_by_path(backup.link_target)
+                if backup is None:
+                    continue
+            if backup.path in link_refs:
+                continue
+            try:
+                backup_device = limits.get_device(backup.data_path)
+            except OSError as error:
+                logger.debug("Ignoring link-ref candidate \"%s\": %s",
+                             backup.data_path, str(error))
+                continue
+            if backup_device != device:
+                logger.warning("Task \"%s\": Ignoring link-ref candidate "
+                               "\"%s\" as it is on another filesystem than "
+                               "the destination.", self.name, backup.data_path)
+                foreign_devices.add(backup_device)
+                continue
+            link_refs[backup.path] = backup
+            if len(link_refs) == const.RSYNC_MAX_LINK_DEST:
+                break
+        if not link_refs and foreign_devices:
+            raise BackupError(
+                self,
+                "None of the old backups is on the same filesystem as the "
+                "destination \"%s\", so the new backup would be a full copy. "
+                "Check whether the destination is mounted correctly." %
+                self.destination)
+        return list(link_refs.values())
+
     def create_backup(self, new_backup, params):
-        destination = new_backup.data_path
-        if params.link_ref is None:
-            link_dest = None
+        """
+        Copy the sources into the new backup. If the task has a transfer
+        limiter, this waits until a transfer to the destination device may
+        start. All rsync processes of the backup run in that one slot.
+
+        :param new_backup: The prepared backup to copy the data into.
+        :type new_backup: BackupStorage instance
+
+        :param params: The parameters of the backup.
+        :type params: BackupParameters instance
+
+        The statistics of rsync and the time the phases of the creation took
+        are saved in the statistics of the backup.
+
+        :raise BackupError: if rsync failed
+        """
+        self._publish(phase=statusboard.PHASE_TRANSFER)
+        started = self.clock.monotonic()
+        if self.transfer_limiter is None:
+            statistics = self._create_backup(new_backup, params)
+            slot_wait = 0.0
         else:
-            link_dest = params.link_ref.data_path
+            with self.transfer_limiter.slot(
+                    limits.get_device(self.destination)):
+                slot_wait = self.clock.monotonic() - started
+                statistics = self._create_backup(new_backup, params)
+        statistics["time.slot_wait"] = round(slot_wait, 3)
+        statistics["time.total"] = round(self.clock.monotonic() - started, 3)
+        new_backup.set_statistics(statistics)
+        self._publish(bytes_transferred=statistics.get(
+            "rsync.total_transferred_file_size", 0))
+
+    def _create_backup(self, new_backup, params):
+        destination = new_backup.data_path
+        link_dests = [link_ref.data_path for link_ref in params.link_refs]
         logger.info("Creating backup \"%s\".", new_backup.name)
-        (returncode, stdoutdata, stderrdata) = rsync.rsync(
+
+        transfers = self._get_transfers(params)
+        progresses = [None] * len(transfers)
+        started = self.clock.monotonic()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=min(max(self.rsync_workers, self.shards),
+                                    len(transfers))) as pool:
+                futures = [pool.submit(self._run_rsync,
+                                       transfer=transfer,
+                                       destination=destination,
+                                       link_dests=link_dests,
+                                       params=params,
+                                       progress_callback=functools.partial(
+                                           self._update_partial_progress,
+                                           progresses, index))
+                           for (index, transfer) in enumerate(transfers)]
+                results = [future.result() for future in futures]
+        finally:
+            self._update_progress(None)
+
+        transfer_time = self.clock.monotonic() - started
+
+        failures = ["rsync failed with code %s for %s. Stderr:\n%s" % (
+                    returncode, ", ".join(transfer.sources), stderr_tail) for
+                    (transfer, (returncode, stderr_tail, _)) in
+                    zip(transfers, results) if returncode != 0]
+        if failures:
+            raise BackupError(self, "\n".join(failures))
+        self._update_shard_history(transfers)
+        logger.info("Backup finished successfully.")
+        hardlink_statistics = self._check_hardlinks(new_backup,
+                                                    params.link_refs)
+        self._relink_latest_symlink(new_backup)
+
+        # the statistics of all rsync processes are summed up
+        statistics = collections.Counter()
+        for (_, _, stats) in results:
+            statistics.update(stats)
+        statistics = dict(("rsync." + key, value) for
+                          (key, value) in statistics.items())
+        statistics["rsync.processes"] = len(transfers)
+        statistics["time.transfer"] = round(transfer_time, 3)
+        statistics.update(hardlink_statistics)
+        return statistics
+
+    def _check_hardlinks(self, new_backup, link_refs):
+        """
+        Check whether rsync actually hardlinked the unchanged files of a new
+        backup to the link refs, by looking at a small sample of files. A file
+        is unchanged if it has the same size, modification time, mode and
+        owner as the file at the same path in one of the link refs.
+
+        :returns: The number of unchanged files in the sample and how many of
+            them are hardlinked, as statistics of the backup.
+        :rtype: dict
+        """
+        if not link_refs:
+            return {}
+        unchanged = 0
+        linked = 0
+        for relative_path in files.sample_files(
+                new_backup.data_path,
+                count=const.HARDLINK_SAMPLE_FILES,
+                max_entries=const.HARDLINK_SAMPLE_MAX_ENTRIES):
+            try:
+                stat = os.lstat(os.path.join(new_backup.data_path,
+                                             relative_path))
+            except OSError:
+                continue
+            is_linked = False
+            is_unchanged = False
+            for link_ref in link_refs:
+                try:
+                    ref_stat = os.lstat(os.path.join(link_ref.data_path,
+                                                     relative_path))
+                except OSError:
+                    continue
+                if (stat.st_dev, stat.st_ino) == (ref_stat.st_dev,
+                                                  ref_stat.st_ino):
+                    is_linked = True
+                    break
+                if _is_unchanged(stat, ref_stat):
+                    is_unchanged = True
+            if is_linked:
+                linked += 1
+                unchanged += 1
+            elif is_unchanged:
+                unchanged += 1
+
+        if unchanged and not linked:
+            logger.error("Task \"%s\": None of %s unchanged files checked in "
+                         "\"%s\" is hardlinked to an old backup, the backup "
+                         "is probably a full copy.",
+                         self.name, unchanged, new_backup.path)
+        elif linked < unchanged:
+            logger.warning("Task \"%s\": Only %s of %s unchanged files "
+                           "checked in \"%s\" are hardlinked to an old "
+                           "backup.",
+                           self.name, linked, unchanged, new_backup.path)
+        else:
+            logger.debug("Task \"%s\": All %s unchanged files checked are "
+                         "hardlinked.", self.name, unchanged)
+        return {"link.unchanged_sampled": unchanged,
+                "link.hardlinked_sampled": linked}
+
+    def _get_transfers(self, params):
+        """
+        Split the sources into the transfers that are run by separate rsync
+        processes.
+
+        :rtype: list of _Transfer instances
+        """
+        if self.shards > 1:
+            if _uses_relative_paths(params.rsync_args):
+                return [transfer for source in self.sources for
+                        transfer in self._get_shard_transfers(source, params)]
+            logger.warning("Task \"%s\": Sharding needs rsync to be run with "
+                           "--relative, the sources will not be sharded.",
+                           self.name)
+        # with more than one worker, every source is copied by its own rsync
+        # process. this is a lot faster if the sources are located on
+        # different devices.
+        if self.rsync_workers > 1 and len(self.sources) > 1:
+            return [_Transfer([source], params.rsync_filter) for
+                    source in self.sources]
+        return [_Transfer(self.sources, params.rsync_filter)]
+
+    def _get_shard_transfers(self, source, params):
+        entries = sharding.get_entries(source)
+        if len(entries) < 2:
+            return [_Transfer([source], params.rsync_filter)]
+        shards = sharding.assign(
+            entries=entries,
+            weights=self._shard_history.get_weights(source),
+            count=self.shards)
+        logger.debug("Task \"%s\": Sharding \"%s\" into %s.",
+                     self.name, source, shards)
+
+        # the first shard copies everything that is not part of another shard
+        # with --relative, the patterns are anchored at the root directory
+        root = os.path.normpath(source).rstrip("/")
+        excludes = [sharding.escape_pattern("%s/%s" % (root, entry)) for
+                    shard in shards[1:] for entry in shard]
+        transfers = [_Transfer(
+            [source], params.rsync_filter.with_excludes(excludes),
+            shard_source=source,
+            shard_entries=[sharding.REST] + shards[0])]
+        for shard in shards[1:]:
+            if shard:
+                transfers.append(_Transfer(
+                    [os.path.join(source, entry) for entry in shard],
+                    params.rsync_filter,
+                    shard_source=source,
+                    shard_entries=shard))
+        return transfers
+
+    def _update_shard_history(self, transfers):
+        """
+        Remember the number of files of every top-level directory of the
+        sharded sources, so the next backup can balance the shards better.
+        """
+        counts = collections.defaultdict(dict)
+        for transfer in transfers:
+            if transfer.shard_source is not None:
+                counts[transfer.shard_source].update(transfer.shard_counts)
+        for (source, count) in list(counts.items()):
+            if not count:
+                logger.warning("Task \"%s\": Could not count the files of "
+                               "\"%s\", the shards will not be rebalanced.",
+                               self.name, source)
+                del counts[source]
+        if not counts:
+            return
+        try:
+            self._shard_history.update(counts)
+        except (IOError, OSError) as error:
+            logger.warning("Task \"%s\": Could not write shard history: %s",
+                           self.name, str(error))
+
+    def _run_rsync(self, transfer, destination, link_dests, params,
+                   progress_callback):
+        """
+        Run a single transfer into the destination.
+
+        :returns: The returncode of rsync, the last lines it wrote to stderr
+            and the statistics it printed.
+        :rtype: tuple (int, str, dict)
+        """
+        file_counter = rsync.LineCounter()
+        stats_parser = rsync.StatsParser()
+        stdout_handlers = [file_counter, stats_parser,
+                           rsync.LineLogger(logging.DEBUG)]
+        if self.report_progress:
+            stdout_handlers.append(rsync.ProgressParser(progress_callback))
+        (returncode, _, stderr_tail) = rsync.rsync(
             command=params.rsync_cmd,
-            sources=self.sources,
+            sources=transfer.sources,
             destination=destination,
-            link_ref=link_dest,
+            link_refs=link_dests,
             arguments=params.rsync_args,
-            rsyncfilter=params.rsync_filter,
-            loggingOptions=params.rsync_logfile_options)
-        if returncode != 0:
-            logger.critical("Rsync failed. Aborting. Stderr:\n%s",
-                            stderrdata)
-            sys.exit(const.EXIT_RSYNC_FAILED)
-        else:
-            logger.debug("Rsync finished successfully.")
-        logger.info("Backup finished successfully.")
-        self._relink_latest_symlink(new_backup)
+            rsyncfilter=transfer.rsync_filter,
+            loggingOptions=params.rsync_logfile_options,
+            stdout_handlers=stdout_handlers,
+            progress=self.report_progress,
+            stats=True)
+        if returncode == 0:
+            logger.debug("Rsync for %s finished successfully, %s lines of "
+                         "output.", ", ".join(transfer.sources),
+                         file_counter.count)
+            # rsync only prints the files it transferred, so the shard is
+            # walked to count all of its files. this runs in the thread of
+            # the transfer, so the shards are counted in parallel.
+            if transfer.shard_source is not None:
+                transfer.shard_counts = sharding.count_entries(
+                    transfer.shard_source, transfer.shard_entries)
+        return (returncode, stderr_tail, stats_parser.stats)
+
+    def _update_partial_progress(self, progresses, index, progress):
+        """
+        Update the progress of one of several rsync processes running at the
+        same time and publish the combined progress of all of them.
+        """
+        with self._progress_lock:
+            progresses[index] = progress
+            self._update_progress(rsync.TransferProgress.combine(
+                [partial for partial in progresses if partial is not None]))
 
     def get_expired_backups(self, timestamp):
         """
@@ -274,38 +774,25 @@ class Task(object):
 
         :rtype: list of Backup instances
         """
-        # we will sort the folders and just loop from oldest to newest until we
-        # have enough expired backups.
-        expired_backups = []
+        # a backup might be expired both by count and by age, but must only be
+        # returned once. the dictionary keeps the order the backups are found.
+        expired_backups = collections.OrderedDict()
+        now = self.clock.now()
         for interval_info in self.scheduling_info.interval_infos:
             logger.debug("Task \"%s\": Checking interval \"%s\" for "
                          "expired backups.",
                          self.name,
                          interval_info.name)
 
-            backups_of_that_interval = [backup for
-                                        backup in self.backups if
-                                        backup.interval_name ==
-                                        interval_info.name]
+            for expired_backup in (
+                    self._get_expired_backups_by_count(
+                        interval_info.name, interval_info.keep_count) +
+                    self._get_expired_backups_by_age(
+                        interval_info.name,
+                        interval_info.get_keep_age(reference=now))):
+                expired_backups[expired_backup.path] = expired_backup
 
-            expired_backups.extend(
-                self._get_expired_backups_by_count(
-                    backups_of_that_interval,
-                    self.scheduling_info.get_info_by_name(interval_info.name).
-                    keep_count))
-
-            for expired_backup in self._get_expired_backups_by_age(
-                    backups_of_that_interval,
-                    self.scheduling_info.get_info_by_name(interval_info.name).
-                    keep_age):
-                if expired_backup not in expired_backups:
-                    expired_backups.append(expired_backup)
-
-        return expired_backups
-
-    def _get_all_links_to(self, target):
-        return [backup for backup in self.backups if
-                backup.data_is_link_to(target)]
+        return list(expired_backups.values())
 
     def handle_expired_backups(self, timestamp):
         """
@@ -317,43 +804,82 @@ class Task(object):
         if len(expired_backups) == 0:
             logger.verbose("No expired backups.")
             return
+        self._publish(phase=statusboard.PHASE_EXPIRE)
+
+        # the catalog is written once after all expired backups are gone, or
+        # after the first one that could not be removed
+        try:
+            for expired_backup in expired_backups:
+                self._remove_expired_backup(expired_backup)
+        finally:
+            self._save_catalog(self._backups)
 
-        for expired_backup in expired_backups:
-            logger.info("Expired backup: \"%s\".",
-                        expired_backup.name)
+    def _remove_expired_backup(self, expired_backup):
+        """
+        Remove an expired backup and unregister it. If other backups are
+        symlinks to it, its data is moved to the first of them and the others
+        are linked to that one.
+
+        :param expired_backup: The backup to remove.
+        :type expired_backup: Backup instance
+        """
+        logger.info("Expired backup: \"%s\".",
+                    expired_backup.name)
 
-            if not expired_backup.data_is_link():
+        if expired_backup.link_target is None:
 
-                symlinks = self._get_all_links_to(expired_backup)
+            symlinks = self._backups.get_links_to(expired_backup)
 
-                if len(symlinks) != 0:
-                    new_real_backup = symlinks[0]
-                    logger.debug("Linked folder at \"%s\" points to the "
-                                 "expired backup \"%s\", data will be moved "
-                                 "over.",
-                                 new_real_backup.path,
-                                 expired_backup.path)
+            if len(symlinks) != 0:
+                new_real_backup = symlinks[0]
+                logger.debug("Linked folder at \"%s\" points to the "
+                             "expired backup \"%s\", data will be moved "
+                             "over.",
+                             new_real_backup.path,
+                             expired_backup.path)
 
-                    # move the data from the expired backup to the new "real"
-                    # backup
-                    new_real_backup.remove_data_link()
-                    expired_backup.move_data_to(new_real_backup)
+                # move the data from the expired backup to the new "real"
+                # backup
+                new_real_backup.remove_data_link()
+                expired_backup.move_data_to(new_real_backup)
+                self._backups.update_link(new_real_backup)
 
-                    # update all remaining symlinks to point to the new backup
-                    # instead of the expired one
-                    for remaining_symlink in symlinks[1:]:
-                        logger.debug("Fixing folder at \"%s\" so it points to "
-                                     "\"%s\"..",
-                                     remaining_symlink.path,
-                                     new_real_backup.path)
+                # update all remaining symlinks to point to the new backup
+                # instead of the expired one
+                for remaining_symlink in symlinks[1:]:
+                    logger.debug("Fixing folder at \"%s\" so it points to "
+                                 "\"%s\"..",
+                                 remaining_symlink.path,
+                                 new_real_backup.path)
 
-                        remaining_symlink.remove_data_link()
-                        remaining_symlink.link_data_from(new_real_backup)
+                    remaining_symlink.remove_data_link()
+                    remaining_symlink.link_data_from(new_real_backup)
+                    self._backups.update_link(remaining_symlink)
 
-            expired_backup.remove()
-            self._unregister_backup(expired_backup)
+        self._dispose_backup(expired_backup)
+        self._unregister_backup(expired_backup)
 
-            logger.info("Backup removed successfully.")
+        logger.info("Backup removed successfully.")
+
+    def _dispose_backup(self, backup):
+        """
+        Get rid of the folder of an expired backup. If the task has a
+        reclaimer, the folder is only moved into the trash folder and deleted
+        in the background, otherwise it is deleted right away.
+        """
+        if self.reclaimer is None:
+            backup.remove()
+            return
+        if not os.path.exists(self.trash_folder):
+            os.mkdir(self.trash_folder)
+        # the name in the trash has to be unique, as a backup with the same
+        # name might be created and expire again before the first one is
+        # deleted
+        trash_path = os.path.join(
+            self.trash_folder, "%s.%s" % (backup.folder, uuid.uuid4().hex))
+        logger.info("Moving backup \"%s\" to the trash.", backup.name)
+        files.move(backup.path, trash_path)
+        self.reclaimer.add(trash_path)
 
     def _relink_latest_symlink(self, backup):
         """
@@ -364,90 +890,116 @@ class Task(object):
                      destination)
         symlink_latest = os.path.join(self.destination,
                                       const.SYMLINK_LATEST_NAME)
-        if os.path.islink(symlink_latest):
-            files.remove_symlink(symlink_latest)
-        files.create_symlink(destination, symlink_latest)
+        files.replace_symlink(destination, symlink_latest)
         logger.debug("Latest symlink fixed.")
 
-    def _get_expired_backups_by_count(self, backups, max_count):
+    def _get_expired_backups_by_count(self, interval_name, max_count):
         """
-        Returns all backups that are expired relative to the maximum count of
-        kept backups. Practically, just returns all backups except the
-        "max_count" oldest.
+        Returns all backups of the interval that are expired relative to the
+        maximum count of kept backups. Practically, just returns all backups
+        except the "max_count" latest.
         """
-        expired_backups = []
-        count = len(backups) - max_count
-        backups.sort(key=lambda backup: backup.date, reverse=False)
-        for i in range(0, count):
+        expired_backups = self._backups.get_oldest(interval_name, max_count)
+        for backup in expired_backups:
             logger.debug("Backup \"%s\" is expired because count %s is "
                          "exceeded.",
-                         backups[i].name,
+                         backup.name,
                          max_count)
-            expired_backups.append(backups[i])
         return expired_backups
 
-    def _get_expired_backups_by_age(self, backups, max_age):
+    def _get_expired_backups_by_age(self, interval_name, max_age):
         """
-        Returns all backups that are expired relative to the maximum age of
-        kept backups. It pracically just returns all backups older than
-        max_age.
+        Returns all backups of the interval that are expired relative to the
+        maximum age of kept backups. It pracically just returns all backups
+        older than max_age.
         """
-        expired_backups = []
-        for backup in backups:
-            if backup.date < max_age:
-                logger.debug("Backup \"%s\" expired because it is older than "
-                             "\"%s\" which is the oldest possible time",
-                             backup.name,
-                             max_age.isoformat())
-                expired_backups.append(backup)
+        expired_backups = self._backups.get_older_than(interval_name, max_age)
+        for backup in expired_backups:
+            logger.debug("Backup \"%s\" expired because it is older than "
+                         "\"%s\" which is the oldest possible time",
+                         backup.name,
+                         max_age.isoformat())
         return expired_backups
 
     def _get_latest_backup(self):
         """
         Returns the latest/youngest backup, or None if there is none.
         """
-        if len(self.backups) == 0:
-            return None
-        if len(self.backups) == 1:
-            return self.backups[0]
-        latest = self.backups[0]
-        for backup in self.backups:
-            if backup.date > latest.date:
-                latest = backup
-        return latest
+        return self._backups.latest()
 
     def _get_latest_backup_of_interval(self, interval):
         """
         Returns the latest/youngest backup of the given interval, or None if
         there is none.
-        :param interval: The name of the interval to search for.
-        :type interval: string
+        :param interval: The interval to search for.
+        :type interval: IntervalInfo instance
         """
-        if len(self.backups) == 0:
-            return None
-        latest = None
-        for backup in self.backups:
-            if latest is None and backup.interval_name == interval.name:
-                latest = backup
-            elif latest is not None:
-                if (backup.interval_name == interval.name and
-                        backup.date > latest.date):
-                    latest = backup
-        return latest
+        return self._backups.latest(interval.name)
 
     @property
     def status(self):
+        if not self._idle_event.is_set():
+            return TaskStatus.working
         return self._status
 
+    def _publish(self, **changes):
+        """
+        Update the record of the task on its status board.
+        """
+        self.status_board.update(self.name, **changes)
+
+    def run(self, timestamp):
+        """
+        Check for new and expired backups once. This is called by the
+        scheduler in one of its worker threads whenever the task is due. If
+        the task is not active, nothing is done.
+
+        :param timestamp: The timestamp all potentially created backups will be
+                          assigned.
+        :type timestamp: datetime.datetime instance
+
+        :raise BackupError: if a backup could not be created
+        """
+        with self._lock:
+            if self._status != TaskStatus.active:
+                logger.debug("Task \"%s\" is %s, skipping run.",
+                             self.name, self._status.name)
+                return
+            self._idle_event.clear()
+            self._publish(state=TaskStatus.working.name,
+                          phase=statusboard.PHASE_CHECK,
+                          started=self.clock.now(),
+                          bytes_transferred=0)
+        started = self.clock.monotonic()
+        error = None
+        try:
+            logger.debug("checking task %s at %s", self.name, timestamp)
+            self.create_backups_if_necessary(timestamp=timestamp)
+            self.handle_expired_backups(timestamp=timestamp)
+        except Exception as exception:
+            error = str(exception)
+            raise
+        finally:
+            # the status is published while holding the lock, so a concurrent
+            # pause or stop cannot be overwritten by the state of the run
+            with self._lock:
+                self._idle_event.set()
+                self._publish(
+                    state=self._status.name,
+                    phase=statusboard.PHASE_IDLE,
+                    last_result=(statusboard.RESULT_SUCCESS if error is None
+                                 else statusboard.RESULT_FAILURE),
+                    last_duration=round(self.clock.monotonic() - started, 3),
+                    last_error=error)
+
     def start(self):
         """
-        Start the monitoring of the task in a new process.
+        Start the monitoring of the task, so it will be run by the scheduler.
         """
         logger.debug("Starting task \"%s\".", self.name)
-        self._process = multiprocessing.Process(target=self._monitor,
-                                                args=())
-        self._process.start()
-        self._status = TaskStatus.active
+        with self._lock:
+            self._status = TaskStatus.active
+            self._publish(state=self.status.name)
 
     def stop(self, block=True):
         """
@@ -455,30 +1007,25 @@ class Task(object):
         monitoring with the :func:`start()` method.
 
         :param block: Specifies that the method call should block until the task
-            is actually paused and has finished an already running operation. If
-            set to `False`, the task might still do work after the function
-            returns, but will not start another operation.
-
-            .. note:: If you plan on restarting the task, you must not set this
-                to `False` or you will get undefinied behaviour.
+            has finished an already running operation. If set to `False`, the
+            task might still do work after the function returns, but will not
+            start another operation.
         :type block: bool
         """
         logger.debug("Stopping task \"%s\".", self.name)
-        self._pause_monitoring(block=block)
-        self._kill_process()
-        self._status = TaskStatus.stopped
+        self._change_status(TaskStatus.stopped, block=block)
 
     def abort(self):
         """
-        Stops the monitoring of the task brutally, i.e. it just kills the
-        monitoring process.
+        Stops the monitoring of the task without waiting for an already running
+        operation to finish.
 
-        .. warning:: This method might leave an invalid backup behind and should
-            be avoided.
+        .. warning:: The running operation will still finish in the background,
+            so restarting the task right away might lead to overlapping
+            operations.
         """
         logger.debug("Aborting task \"%s\".", self.name)
-        self._kill_process()
-        self._status = TaskStatus.stopped
+        self._change_status(TaskStatus.stopped, block=False)
 
     def pause(self, block=True):
         """
@@ -494,8 +1041,7 @@ class Task(object):
         :type block: bool
         """
         logger.debug("Pausing task \"%s\".", self.name)
-        self._pause_monitoring(block=block)
-        self._status = TaskStatus.paused
+        self._change_status(TaskStatus.paused, block=block)
 
     def resume(self):
         """
@@ -505,57 +1051,18 @@ class Task(object):
         :raise ValueError: if the task is not paused
         """
         logger.debug("Resuming task \"%s\".", self.name)
-        if not self.status == TaskStatus.paused:
-            raise ValueError("task is not paused, cannot be resumed")
-        self._resume_monitoring()
-        self._status = TaskStatus.active
-
-    def _kill_process(self):
-        self._process.terminate()
-        self._process.join()
-
-    def _pause_monitoring(self, block=True):
-        self._pausing_event.clear()
-        if block:
-            self._paused_event.wait()
-
-    def _resume_monitoring(self):
-        self._pausing_event.set()
-
-    def _monitor(self):
-        """
-        This is the method that runs in a separate task and checks for new and
-        expired backups whenever `event` is raised.
-
-        :param event: The event that triggers the monitoring.
-        :type event: multiprocessing.event instance
-        """
-
-        self._event_exit.clear()
-        self._pausing_event.set()
-
-        while True:
-            self._paused_event.set()
-            self._pausing_event.wait()
-            self._paused_event.clear()
-
-            self._status = TaskStatus.working
-            start = datetime.datetime.now()
-            logger.debug("checking task %s at %s", self.name, start)
-            self.create_backups_if_necessary(timestamp=start)
-            self.handle_expired_backups(timestamp=start)
+        with self._lock:
+            if not self._status == TaskStatus.paused:
+                raise ValueError("task is not paused, cannot be resumed")
             self._status = TaskStatus.active
+            self._publish(state=self.status.name)
 
-            wait_seconds = 60 - datetime.datetime.now().second
-            logger.debug("Sleeping %s seconds.", wait_seconds)
-            while wait_seconds > 0:
-                if not self._pausing_event.is_set():
-                    self._paused_event.set()
-                    self._pausing_event.wait()
-                    self._paused_event.clear()
-                    break
-                time.sleep(1)
-                wait_seconds -= 1
+    def _change_status(self, status, block):
+        with self._lock:
+            self._status = status
+            self._publish(state=self.status.name)
+        if block:
+            self._idle_event.wait()
 
 
 class TaskStatus(enum.Enum):
@@ -594,6 +1101,17 @@ class IntervalInfo(object):
     def keep_age(self):
         return self._keep_age.get_oldest_datetime()
 
+    def get_keep_age(self, reference):
+        """
+        Return the oldest date a backup of the interval may have at the given
+        time.
+
+        :type reference: datetime instance
+
+        :rtype: datetime instance
+        """
+        return self._keep_age.get_oldest_datetime(reference)
+
 
 class TaskSchedulingInfo(object):
     """
@@ -614,6 +1132,23 @@ class TaskSchedulingInfo(object):
             raise ValueError("interval info already in scheduling info")
         self.interval_infos.append(interval_info)
 
+    def get_next_occurrence(self, date_time):
+        """
+        Return the earliest occurrence of any interval strictly after the given
+        datetime, or None if no interval will occur again.
+
+        :type date_time: datetime instance
+
+        :rtype: datetime instance or None
+        """
+        occurrences = [interval_info.cronjob.next_occurrence(date_time) for
+                       interval_info in self.interval_infos]
+        occurrences = [occurrence for occurrence in occurrences if
+                       occurrence is not None]
+        if len(occurrences) == 0:
+            return None
+        return min(occurrences)
+
     def get_info_by_name(self, name):
         """
         Return the interval info with the given name.
@@ -626,11 +1161,88 @@ class TaskSchedulingInfo(object):
         raise ValueError("no interval_info with name \"%s\" found.")
 
 
+class BackupError(Exception):
+    """
+    Error that is raised when a task fails to create a backup.
+
+    :param task: The task that failed.
+    :type task: Task instance
+
+    :param message: A message with more specific information about the error.
+    :type message: str
+    """
+
+    def __init__(self, task, message):
+        Exception.__init__(self, message)
+        self.task = task
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def _uses_relative_paths(rsync_args):
+    """
+    Determine whether the given rsync arguments contain --relative.
+    """
+    for arg in shlex.split(rsync_args):
+        if arg == "--relative":
+            return True
+        if arg.startswith("-") and not arg.startswith("--") and "R" in arg:
+            return True
+    return False
+
+
+def _is_unchanged(stat, ref_stat):
+    """
+    Determine whether rsync would consider a file unchanged compared to the
+    file in a link ref and therefore hardlink it, given the results of
+    os.lstat() of both.
+
+    :rtype: bool
+    """
+    return (stat.st_size == ref_stat.st_size and
+            int(stat.st_mtime) == int(ref_stat.st_mtime) and
+            stat.st_mode == ref_stat.st_mode and
+            stat.st_uid == ref_stat.st_uid and
+            stat.st_gid == ref_stat.st_gid)
+
+
+class _Transfer(object):
+    """
+    The sources copied into a backup by a single rsync process.
+
+    :param sources: The sources to copy.
+    :type sources: list of str
+
+    :param rsync_filter: The filter used for the transfer.
+    :type rsync_filter: rsync.Filter instance
+
+    :param shard_source: The sharded source this transfer copies a shard of,
+        or None if it copies complete sources.
+    :type shard_source: str
+
+    :param shard_entries: The top-level directories of the shard, and
+        :data:`sharding.REST` if it copies the files directly in the source.
+    :type shard_entries: list of str
+    """
+
+    def __init__(self, sources, rsync_filter, shard_source=None,
+                 shard_entries=None):
+        self.sources = sources
+        self.rsync_filter = rsync_filter
+        self.shard_source = shard_source
+        self.shard_entries = shard_entries or []
+        # the number of files of every entry of the shard, counted after the
+        # transfer succeeded
+        self.shard_counts = {}
+
+
 class BackupParameters(object):
 
-    def __init__(self, link_ref, rsync_cmd, rsync_args, rsync_filter,
+    def __init__(self, link_refs, rsync_cmd, rsync_args, rsync_filter,
                  rsync_logfile_options):
-        self.link_ref = link_ref
+        self.link_refs = link_refs
         self.rsync_cmd = rsync_cmd
         self.rsync_args = rsync_args
         self.rsync_filter = rsync_filter
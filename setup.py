@@ -37,7 +37,7 @@ setuptools.setup(
 
     install_requires = ['configobj'],
     setup_requires = [],
-    extras_require = {},
+    extras_require = {'batch': ['numpy']},
     tests_require = ['tox'],
 
     license = 'GNU GPL',
@@ -51,7 +51,7 @@ setuptools.setup(
         'Operating System :: POSIX :: Linux',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3.5',
         'Topic :: System',
         'Topic :: System :: Archiving',
         'Topic :: System :: Archiving :: Backup',
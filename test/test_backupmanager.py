@@ -0,0 +1,455 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import concurrent.futures
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from rbackupd import constants as const
+from rbackupd import simulator
+from rbackupd.cmd import rsync
+from rbackupd.config import configmanager
+
+try:
+    from rbackupd import backupmanager
+except ImportError:
+    # dbus-python and PyGObject are not installed
+    backupmanager = None
+
+CONF_FOLDER = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "conf")
+
+
+class FakeScheduler(object):
+
+    def __init__(self):
+        self.tasks = []
+        self.due_times = {}
+
+    def add(self, task, due=None):
+        if task not in self.tasks:
+            self.tasks.append(task)
+        self.due_times[task] = due
+
+    def remove(self, task):
+        if task in self.tasks:
+            self.tasks.remove(task)
+
+    def get_due_time(self, task):
+        return self.due_times.get(task)
+
+
+class FakeConfigMapper(object):
+    """
+    Holds the settings of the tasks instead of a configuration file. Setting
+    error makes the next reload fail with it.
+    """
+
+    def __init__(self, settings):
+        self.config_path = "rbackupd.conf"
+        self.settings = settings
+        self.error = None
+
+    @property
+    def task_names(self):
+        return sorted(self.settings)
+
+    def reload_config(self):
+        if self.error is not None:
+            raise self.error
+
+
+class FakeTask(object):
+    """
+    A task created from settings. Settings with "invalid" make creating the
+    task exit like the backup manager does for invalid values, settings with
+    "broken" make it raise.
+    """
+
+    def __init__(self, name, settings):
+        if settings.get("invalid"):
+            raise SystemExit(const.EXIT_CONFIG_FILE_INVALID)
+        if settings.get("broken"):
+            raise ValueError("broken task")
+        self.name = name
+        self.settings = settings
+        self.running = False
+        self.trash_folder = os.path.join(settings["destination"], ".trash")
+
+    def start(self):
+        self.running = True
+
+    def stop(self, block=True):
+        self.running = False
+
+
+@unittest.skipIf(backupmanager is None,
+                 "dbus-python and PyGObject are required")
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        config_path = os.path.join(self.folder, "rbackupd.conf")
+        shutil.copy(os.path.join(CONF_FOLDER, "rbackupd.conf"), config_path)
+        with mock.patch.object(const, "DEFAULT_SCHEME_PATH",
+                               os.path.join(CONF_FOLDER, "scheme.ini")), \
+                mock.patch("dbus.SystemBus"), \
+                mock.patch("dbus.service.BusName"), \
+                mock.patch("dbus.service.Object.__init__",
+                           return_value=None):
+            self.manager = backupmanager.BackupManager(config_path)
+        self.manager.scheduler = FakeScheduler()
+        self.manager.reclaimer = mock.Mock()
+
+    def tearDown(self):
+        self.manager._control_executor.shutdown()
+        self.manager._config_executor.shutdown()
+        shutil.rmtree(self.folder)
+
+    def load_tasks(self, settings):
+        self.manager.configmapper = FakeConfigMapper(settings)
+        self.manager._get_task_settings = (
+            lambda name: self.manager.configmapper.settings[name])
+        self.manager._get_task = FakeTask
+        self.manager._load_tasks()
+        for task in self.manager.tasks:
+            task.start()
+            self.manager.scheduler.add(task)
+
+    def reload(self, settings):
+        self.manager.configmapper.settings = settings
+        self.manager.reload_config()
+        # wait until all tasks have been replaced
+        executor = self.manager._control_executor
+        self.manager._control_executor = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=1))
+        executor.shutdown(wait=True)
+
+    def get_tasks(self):
+        return dict((task.name, task) for task in self.manager.tasks)
+
+    def test_reload_unchanged(self):
+        self.load_tasks({"a": {"destination": "/a"}})
+        old_task = self.get_tasks()["a"]
+        self.reload({"a": {"destination": "/a"}})
+        self.assertIs(self.get_tasks()["a"], old_task)
+        self.assertTrue(old_task.running)
+
+    def test_reload_added(self):
+        self.load_tasks({"a": {"destination": "/a"}})
+        self.reload({"a": {"destination": "/a"},
+                     "b": {"destination": "/b"}})
+        tasks = self.get_tasks()
+        self.assertEqual(sorted(tasks), ["a", "b"])
+        self.assertTrue(tasks["b"].running)
+        self.assertIn(tasks["b"], self.manager.scheduler.tasks)
+        self.manager.reclaimer.recover.assert_called_once_with("/b/.trash")
+
+    def test_reload_removed(self):
+        self.load_tasks({"a": {"destination": "/a"},
+                         "b": {"destination": "/b"}})
+        old_task = self.get_tasks()["b"]
+        self.reload({"a": {"destination": "/a"}})
+        self.assertEqual(sorted(self.get_tasks()), ["a"])
+        self.assertFalse(old_task.running)
+        self.assertNotIn(old_task, self.manager.scheduler.tasks)
+        self.assertNotIn("b", self.manager._configured_settings)
+
+    def test_reload_changed(self):
+        self.load_tasks({"a": {"destination": "/a"}})
+        old_task = self.get_tasks()["a"]
+        self.reload({"a": {"destination": "/c"}})
+        new_task = self.get_tasks()["a"]
+        self.assertIsNot(new_task, old_task)
+        self.assertEqual(new_task.settings, {"destination": "/c"})
+        self.assertFalse(old_task.running)
+        self.assertTrue(new_task.running)
+        self.assertEqual(self.manager.scheduler.tasks, [new_task])
+
+    def test_reload_changed_to_invalid(self):
+        self.load_tasks({"a": {"destination": "/a"},
+                         "b": {"destination": "/b"}})
+        old_tasks = self.get_tasks()
+        with self.assertLogs("rbackupd.backupmanager", "ERROR"):
+            self.reload({"a": {"destination": "/a", "invalid": True},
+                         "b": {"destination": "/b", "broken": True}})
+        # the old tasks keep running and are still listed
+        self.assertEqual(self.get_tasks(), old_tasks)
+        for task in old_tasks.values():
+            self.assertTrue(task.running)
+            self.assertIn(task, self.manager.scheduler.tasks)
+        self.assertEqual(self.manager._configured_settings,
+                         {"a": {"destination": "/a"},
+                          "b": {"destination": "/b"}})
+
+        # the next reload tries again
+        self.reload({"a": {"destination": "/c"},
+                     "b": {"destination": "/b", "broken": False}})
+        self.assertEqual(self.get_tasks()["a"].settings,
+                         {"destination": "/c"})
+        self.assertIsNot(self.get_tasks()["b"], old_tasks["b"])
+
+    def test_reload_added_invalid(self):
+        self.load_tasks({"a": {"destination": "/a"}})
+        with self.assertLogs("rbackupd.backupmanager", "ERROR"):
+            self.reload({"a": {"destination": "/a"},
+                         "b": {"destination": "/b", "invalid": True}})
+        self.assertEqual(sorted(self.get_tasks()), ["a"])
+        self.assertNotIn("b", self.manager._configured_settings)
+
+    def test_reload_invalid_config(self):
+        self.load_tasks({"a": {"destination": "/a"}})
+        old_task = self.get_tasks()["a"]
+        self.manager.configmapper.error = configmanager.ValidationError(
+            "invalid")
+        with self.assertLogs("rbackupd.backupmanager", "ERROR"):
+            self.reload({})
+        self.assertIs(self.get_tasks()["a"], old_task)
+        self.assertTrue(old_task.running)
+
+    def test_reload_failure_is_logged(self):
+        self.load_tasks({"a": {"destination": "/a"}})
+        self.manager.scheduler.remove = mock.Mock(
+            side_effect=RuntimeError("scheduler stopped"))
+        with self.assertLogs("rbackupd.backupmanager", "ERROR") as logs:
+            self.reload({"a": {"destination": "/c"}})
+        self.assertIn("scheduler stopped", "\n".join(logs.output))
+        # the settings were not applied, so the next reload tries again
+        self.assertEqual(self.manager._configured_settings,
+                         {"a": {"destination": "/a"}})
+
+    def simulate_task(self):
+        """
+        Let the backup manager manage the task of a simulation. Signals are
+        recorded instead of being emitted and calls that have to be made from
+        the main loop are made right away.
+        """
+        self.start = datetime.datetime(2014, 1, 1)
+        simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 24, "1d")],
+            start=self.start)
+        task = simulation.task
+        task.status_board.listener = self.manager._on_task_record
+        task.backup_listener = self.manager._on_backup_finished
+        task.progress_listener = self.manager._on_task_progress
+        self.manager.status_board = task.status_board
+        self.manager.tasks = [task]
+        for name in ("TaskStatusChanged", "BackupFinished", "TaskProgress"):
+            setattr(self.manager, name, mock.Mock())
+        self.patch_main_loop()
+        return task
+
+    def patch_main_loop(self):
+        """
+        Make calls that are scheduled in the main loop right away, in the
+        thread that schedules them.
+        """
+        patcher = mock.patch("gi.repository.GObject.idle_add",
+                             side_effect=lambda func, *args: func(*args))
+        self.idle_add = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call_async(self, method, executor, *args):
+        """
+        Call a D-Bus method that replies asynchronously and wait until the
+        executor it uses has run it.
+
+        :returns: The reply and the error callback.
+        :rtype: tuple
+        """
+        reply_handler = mock.Mock()
+        error_handler = mock.Mock()
+        method(*args, reply_handler=reply_handler,
+               error_handler=error_handler)
+        executor.shutdown(wait=True)
+        return (reply_handler, error_handler)
+
+    def test_get_task(self):
+        task = self.simulate_task()
+        expected = {"status": "stopped",
+                    "phase": "idle",
+                    "bytes_transferred": 0,
+                    "sources": [],
+                    "destination": task.destination,
+                    "one_filesystem": False,
+                    "rsync_args": "",
+                    "rsync_workers": 1,
+                    "shards": 1,
+                    "intervals": {"hourly": "0 * * * * *"},
+                    "keep": {"hourly": 24}}
+        self.assertEqual(self.manager.GetTask(task.name), expected)
+        self.assertEqual(self.manager.GetTasks(), {task.name: expected})
+
+        self.manager.scheduler.add(task, self.start)
+        expected["next_run"] = "2014-01-01T00:00:00"
+        self.assertEqual(self.manager.GetTask(task.name), expected)
+        self.assertRaises(ValueError, self.manager.GetTask, "missing")
+
+    def test_get_tasks_without_record(self):
+        task = self.simulate_task()
+        # a task that is being replaced might not have a record yet
+        self.manager.status_board.remove(task.name)
+        self.assertEqual(self.manager.GetTasks(), {})
+
+    def test_get_task_state(self):
+        task = self.simulate_task()
+        task.start()
+        task.run(self.start)
+        self.assertEqual(self.manager.GetTaskState(task.name),
+                         {"status": "active",
+                          "phase": "idle",
+                          "bytes_transferred": 0,
+                          "started": "2014-01-01T00:00:00",
+                          "last_result": "success",
+                          "last_duration": 0})
+        self.assertEqual(self.manager.GetTaskStatus(task.name), "active")
+        self.assertRaises(ValueError, self.manager.GetTaskState, "missing")
+
+    def test_get_task_progress(self):
+        task = self.simulate_task()
+        self.assertEqual(self.manager.GetTaskProgress(task.name), {})
+        task._update_progress(rsync.TransferProgress(
+            bytes_done=1000, percent=10, rate=2.5, eta=30, files_total=5))
+        progress = {"bytes_done": 1000,
+                    "percent": 10,
+                    "rate": 2.5,
+                    "eta": 30,
+                    "files_total": 5}
+        self.assertEqual(self.manager.GetTaskProgress(task.name), progress)
+        self.manager.TaskProgress.assert_called_once_with(task.name,
+                                                          progress)
+
+        # the end of the transfer is signalled with an empty dictionary
+        task._update_progress(None)
+        self.assertEqual(self.manager.GetTaskProgress(task.name), {})
+        self.manager.TaskProgress.assert_called_with(task.name, {})
+
+    def test_task_status_changed(self):
+        task = self.simulate_task()
+        task.start()
+        task.run(self.start)
+        # only changes of the state are signalled, not every update
+        signals = [args for (args, _) in
+                   self.manager.TaskStatusChanged.call_args_list]
+        self.assertEqual([(name, state["status"]) for (name, state) in
+                          signals],
+                         [(task.name, "active"),
+                          (task.name, "working"),
+                          (task.name, "active")])
+        self.assertEqual(signals[1][1],
+                         {"status": "working",
+                          "phase": "check",
+                          "bytes_transferred": 0,
+                          "started": "2014-01-01T00:00:00"})
+        self.assertEqual(signals[-1][1],
+                         self.manager.GetTaskState(task.name))
+
+    def test_backup_finished(self):
+        task = self.simulate_task()
+
+        def create_backup(new_backup, params):
+            new_backup.set_statistics(
+                {"time.total": 1.5,
+                 "rsync.total_transferred_file_size": 1000})
+        task.create_backup = create_backup
+        task.start()
+        task.run(self.start)
+        backup = task.backups.latest()
+        self.manager.BackupFinished.assert_called_once_with(
+            task.name,
+            {"name": backup.name,
+             "interval": "hourly",
+             "date": "2014-01-01T00:00:00",
+             "path": backup.path,
+             "duration": 1.5,
+             "bytes_transferred": 1000})
+
+    def test_change_config(self):
+        self.patch_main_loop()
+        (reply_handler, error_handler) = self.call_async(
+            self.manager.SetTaskOneFilesystem, self.manager._config_executor,
+            "main", True)
+        reply_handler.assert_called_once_with()
+        error_handler.assert_not_called()
+        # the reply is sent from the main loop
+        self.idle_add.assert_called_once_with(
+            self.manager._call_in_main_loop, reply_handler)
+        self.assertTrue(self.manager.configmapper.task("main").one_filesystem)
+
+    def test_change_config_error(self):
+        self.patch_main_loop()
+        (reply_handler, error_handler) = self.call_async(
+            self.manager.SetTaskOneFilesystem, self.manager._config_executor,
+            "missing", True)
+        reply_handler.assert_not_called()
+        self.assertEqual(error_handler.call_count, 1)
+        self.assertIsInstance(error_handler.call_args[0][0], KeyError)
+
+    def test_change_config_runs_outside_main_thread(self):
+        self.patch_main_loop()
+        threads = []
+        reply_handler = mock.Mock()
+        self.manager._change_config(
+            lambda: threads.append(threading.current_thread()),
+            reply_handler, mock.Mock())
+        self.manager._config_executor.shutdown(wait=True)
+        self.assertNotEqual(threads, [threading.current_thread()])
+        reply_handler.assert_called_once_with()
+
+    def test_change_config_reply_with_result(self):
+        self.patch_main_loop()
+        reply_handler = mock.Mock()
+        self.manager._change_config(lambda: "result", reply_handler,
+                                    mock.Mock())
+        self.manager._config_executor.shutdown(wait=True)
+        reply_handler.assert_called_once_with("result")
+
+    def test_pause_task(self):
+        task = self.simulate_task()
+        task.start()
+        self.manager.scheduler.add(task)
+        (reply_handler, error_handler) = self.call_async(
+            self.manager.PauseTask, self.manager._control_executor, task.name)
+        reply_handler.assert_called_once_with()
+        error_handler.assert_not_called()
+        self.assertEqual(task.status.name, "paused")
+        self.assertNotIn(task, self.manager.scheduler.tasks)
+
+    def test_stop_task(self):
+        task = self.simulate_task()
+        task.start()
+        self.manager.scheduler.add(task)
+        (reply_handler, error_handler) = self.call_async(
+            self.manager.StopTask, self.manager._control_executor, task.name)
+        reply_handler.assert_called_once_with()
+        error_handler.assert_not_called()
+        self.assertEqual(task.status.name, "stopped")
+        self.assertNotIn(task, self.manager.scheduler.tasks)
+
+    def check_control_error(self, method, name):
+        task = self.simulate_task()
+        error = RuntimeError("%s failed" % name)
+        with mock.patch.object(task, name, side_effect=error):
+            (reply_handler, error_handler) = self.call_async(
+                method, self.manager._control_executor, task.name)
+        reply_handler.assert_not_called()
+        error_handler.assert_called_once_with(error)
+
+    def test_pause_task_error(self):
+        self.check_control_error(self.manager.PauseTask, "pause")
+
+    def test_stop_task_error(self):
+        self.check_control_error(self.manager.StopTask, "stop")
+
+    def test_pause_missing_task(self):
+        self.simulate_task()
+        reply_handler = mock.Mock()
+        self.assertRaises(ValueError, self.manager.PauseTask, "missing",
+                          reply_handler=reply_handler,
+                          error_handler=mock.Mock())
+        reply_handler.assert_not_called()
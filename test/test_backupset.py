@@ -0,0 +1,107 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import unittest
+
+from rbackupd import backupset
+
+
+class FakeBackup(object):
+
+    def __init__(self, path, date, interval_name, link_target=None):
+        self.path = path
+        self.date = date
+        self.interval_name = interval_name
+        self.link_target = link_target
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.hourly = [FakeBackup("h%s" % i,
+                                  datetime.datetime(2014, 1, 1, i),
+                                  "hourly")
+                       for i in range(10)]
+        self.daily = [FakeBackup("d%s" % i,
+                                 datetime.datetime(2013, 12, i + 1),
+                                 "daily")
+                      for i in range(3)]
+        # add them in an arbitrary order
+        self.backups = backupset.BackupSet(
+            self.hourly[5:] + self.daily + self.hourly[:5])
+
+    def test_len_and_contains(self):
+        self.assertEqual(len(self.backups), 13)
+        for backup in self.hourly + self.daily:
+            self.assertIn(backup, self.backups)
+        self.assertNotIn(FakeBackup("h0", self.hourly[0].date, "hourly"),
+                         self.backups)
+
+    def test_add_duplicate(self):
+        self.assertRaises(ValueError, self.backups.add, self.hourly[0])
+
+    def test_get_interval_sorted(self):
+        self.assertEqual(self.backups.get_interval("hourly"), self.hourly)
+        self.assertEqual(self.backups.get_interval("weekly"), [])
+
+    def test_latest(self):
+        self.assertIs(self.backups.latest("daily"), self.daily[-1])
+        self.assertIs(self.backups.latest(), self.hourly[-1])
+        self.assertIsNone(self.backups.latest("weekly"))
+        self.assertIsNone(backupset.BackupSet().latest())
+
+    def test_remove(self):
+        self.backups.remove(self.hourly[-1])
+        self.assertIs(self.backups.latest("hourly"), self.hourly[-2])
+        self.assertRaises(ValueError, self.backups.remove, self.hourly[-1])
+        for backup in self.daily:
+            self.backups.remove(backup)
+        self.assertIsNone(self.backups.latest("daily"))
+        self.assertEqual(len(self.backups), 9)
+
+    def test_get_oldest(self):
+        self.assertEqual(self.backups.get_oldest("hourly", 7),
+                         self.hourly[:3])
+        self.assertEqual(self.backups.get_oldest("hourly", 10), [])
+        self.assertEqual(self.backups.get_oldest("hourly", 20), [])
+
+    def test_get_older_than(self):
+        self.assertEqual(
+            self.backups.get_older_than("hourly",
+                                        datetime.datetime(2014, 1, 1, 3)),
+            self.hourly[:3])
+        self.assertEqual(
+            self.backups.get_older_than("daily", datetime.datetime(2013, 1, 1)),
+            [])
+
+    def test_links(self):
+        target = self.daily[0]
+        links = [FakeBackup("w%s" % i, target.date, "weekly", target.path)
+                 for i in range(2)]
+        for link in reversed(links):
+            self.backups.add(link)
+        self.assertEqual(self.backups.get_links_to(target), links)
+        self.assertEqual(self.backups.get_links_to(self.daily[1]), [])
+
+        self.backups.remove(links[0])
+        self.assertEqual(self.backups.get_links_to(target), links[1:])
+
+    def test_update_link(self):
+        link = FakeBackup("w0", self.daily[0].date, "weekly",
+                          self.daily[0].path)
+        self.backups.add(link)
+        link.link_target = self.daily[1].path
+        self.backups.update_link(link)
+        self.assertEqual(self.backups.get_links_to(self.daily[0]), [])
+        self.assertEqual(self.backups.get_links_to(self.daily[1]), [link])
+        link.link_target = None
+        self.backups.update_link(link)
+        self.assertEqual(self.backups.get_links_to(self.daily[1]), [])
+
+    def test_get_recent(self):
+        self.assertEqual(self.backups.get_recent(3),
+                         self.hourly[-1:-4:-1])
+        self.assertEqual(self.backups.get_recent(20),
+                         self.hourly[::-1] + self.daily[::-1])
+        self.assertEqual(self.backups.get_recent(0), [])
@@ -0,0 +1,92 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from rbackupd import backupstorage
+from rbackupd import constants as const
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, const.NAME_META_FILE)
+        self.date = datetime.datetime(2014, 1, 2, 3, 4, 5)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, content):
+        with open(self.path, "w") as meta_file:
+            meta_file.write(content)
+
+    def test_roundtrip(self):
+        meta_file = backupstorage.BackupMetadataFile(self.path)
+        meta_file.set_info("backup", self.date, "daily")
+        meta_file.statistics = {"rsync.number_of_files": 1234,
+                                "time.transfer": 1.5}
+        meta_file.write()
+
+        read_file = backupstorage.BackupMetadataFile(self.path)
+        read_file.read()
+        self.assertEqual(read_file.name, "backup")
+        self.assertEqual(read_file.date, self.date)
+        self.assertEqual(read_file.interval, "daily")
+        self.assertEqual(read_file.statistics,
+                         {"rsync.number_of_files": 1234,
+                          "time.transfer": 1.5})
+
+    def test_read_legacy(self):
+        self.write("backup\n2014-01-02T03:04:05\ndaily\n")
+        meta_file = backupstorage.BackupMetadataFile(self.path)
+        meta_file.read()
+        self.assertEqual(meta_file.name, "backup")
+        self.assertEqual(meta_file.date, self.date)
+        self.assertEqual(meta_file.interval, "daily")
+        self.assertEqual(meta_file.statistics, {})
+
+    def test_unknown_keys_are_kept(self):
+        self.write("rbackupd-metadata 2\nname=backup\n"
+                   "date=2014-01-02T03:04:05\ninterval=daily\n"
+                   "future.key=some value\n")
+        meta_file = backupstorage.BackupMetadataFile(self.path)
+        meta_file.read()
+        self.assertEqual(meta_file.statistics, {"future.key": "some value"})
+
+    def test_invalid(self):
+        for content in ("backup\n2014-01-02T03:04:05\n",
+                        "rbackupd-metadata 99\nname=a\ndate=b\ninterval=c\n",
+                        "rbackupd-metadata 2\nname=backup\ninterval=daily\n",
+                        "rbackupd-metadata 2\nname=backup\ninvalid\n",
+                        "rbackupd-metadata 2\nname=backup\ndate=invalid\n"
+                        "interval=daily\n"):
+            self.write(content)
+            meta_file = backupstorage.BackupMetadataFile(self.path)
+            self.assertRaises(backupstorage.InvalidMetaFileError,
+                              meta_file.read)
+
+    def test_invalid_backup_folder(self):
+        self.write("invalid")
+        backup = backupstorage.BackupFolder(self.folder)
+        with self.assertRaises(backupstorage.InvalidBackupError) as context:
+            backup.load_metadata()
+        self.assertEqual(context.exception.path, self.folder)
+        self.assertIn("invalid number of lines", str(context.exception))
+
+    def test_backup_folder_statistics(self):
+        backup = backupstorage.BackupFolder(os.path.join(self.folder, "b"))
+        backup.set_metadata(name="b", date=self.date, interval_name="daily")
+        backup.prepare()
+        os.mkdir(backup.data_path)
+        backup.set_statistics({"time.total": 2.0})
+        backup.finish()
+
+        restored = backupstorage.BackupFolder(backup.path)
+        restored.restore_metadata(name="b", date=self.date,
+                                  interval_name="daily")
+        self.assertEqual(restored.statistics, {"time.total": 2.0})
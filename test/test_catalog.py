@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from rbackupd import backupstorage
+from rbackupd import catalog
+from rbackupd import constants as const
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.destination = tempfile.mkdtemp()
+        self.catalog = catalog.Catalog(self.destination)
+        self.backups = [self.create_backup("task_%s_daily" % i,
+                                           datetime.datetime(2014, 1, i + 1))
+                        for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.destination)
+
+    def create_backup(self, name, date, link_to=None):
+        backup = backupstorage.BackupFolder(
+            os.path.join(self.destination, name))
+        backup.set_metadata(name=name, date=date, interval_name="daily")
+        backup.prepare()
+        if link_to is None:
+            os.mkdir(backup.data_path)
+        else:
+            backup.link_data_from(link_to)
+        backup.finish()
+        return backup
+
+    def test_missing_catalog(self):
+        self.assertIsNone(self.catalog.load())
+
+    def test_roundtrip(self):
+        self.catalog.save(self.backups)
+        loaded = self.catalog.load()
+        self.assertEqual([(b.path, b.name, b.date, b.interval_name) for
+                          b in loaded],
+                         [(b.path, b.name, b.date, b.interval_name) for
+                          b in self.backups])
+
+    def test_link_target(self):
+        link = self.create_backup("task_link_daily",
+                                  datetime.datetime(2014, 1, 1),
+                                  link_to=self.backups[0])
+        self.assertEqual(link.link_target, self.backups[0].path)
+
+        scanned = backupstorage.BackupFolder(link.path)
+        scanned.load_metadata()
+        self.assertEqual(scanned.link_target, self.backups[0].path)
+
+        self.catalog.save(self.backups + [link])
+        loaded = dict((b.path, b.link_target) for b in self.catalog.load())
+        self.assertEqual(loaded[link.path], self.backups[0].path)
+        self.assertIsNone(loaded[self.backups[0].path])
+
+    def test_catalog_folder_does_not_make_catalog_stale(self):
+        self.catalog.save(self.backups)
+        self.catalog.save(self.backups)
+        self.assertIsNotNone(self.catalog.load())
+
+    def test_stale_after_new_backup(self):
+        self.catalog.save(self.backups)
+        self.create_backup("task_new_daily", datetime.datetime(2014, 2, 1))
+        self.assertIsNone(self.catalog.load())
+
+    def test_stale_after_removed_backup(self):
+        self.catalog.save(self.backups)
+        shutil.rmtree(self.backups[0].path)
+        self.assertIsNone(self.catalog.load())
+
+    def test_invalid_catalog(self):
+        os.mkdir(self.catalog.folder)
+        with open(self.catalog.path, "w") as catalog_file:
+            catalog_file.write("{invalid")
+        self.assertIsNone(self.catalog.load())
+
+    def test_no_temporary_file_left(self):
+        self.catalog.save(self.backups)
+        self.assertEqual(os.listdir(os.path.join(self.destination,
+                                                 const.NAME_CATALOG_FOLDER)),
+                         [const.NAME_CATALOG_FILE])
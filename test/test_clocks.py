@@ -0,0 +1,39 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import unittest
+
+from rbackupd import clocks
+from rbackupd.schedule import cron
+from rbackupd.schedule import interval
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.start = datetime.datetime(2014, 1, 1, 0, 30)
+        self.clock = clocks.ManualClock(self.start)
+
+    def test_manual_clock(self):
+        self.assertEqual(self.clock.now(), self.start)
+        self.clock.advance(datetime.timedelta(hours=1))
+        self.assertEqual(self.clock.now(),
+                         datetime.datetime(2014, 1, 1, 1, 30))
+        self.assertEqual(self.clock.monotonic(), 3600)
+        self.clock.set(datetime.datetime(2014, 1, 2))
+        self.assertEqual(self.clock.monotonic(), 84600)
+        self.assertRaises(ValueError, self.clock.set, self.start)
+
+    def test_cronjob_uses_clock(self):
+        cronjob = cron.Cronjob("0 * * * * *", clock=self.clock)
+        self.assertFalse(cronjob.has_occured_since(self.start))
+        self.assertEqual(cronjob.get_most_recent_occurence(),
+                         datetime.datetime(2014, 1, 1, 0, 0))
+        self.clock.advance(datetime.timedelta(minutes=30))
+        self.assertTrue(cronjob.has_occured_since(self.start))
+
+    def test_interval_uses_clock(self):
+        keep_age = interval.Interval("2d", clock=self.clock)
+        self.assertEqual(keep_age.get_oldest_datetime(),
+                         datetime.datetime(2013, 12, 30, 0, 30))
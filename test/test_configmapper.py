@@ -0,0 +1,99 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rbackupd import configmapper
+from rbackupd import constants as const
+from rbackupd.config import configmanager
+
+CONF_FOLDER = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "conf")
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.config_path = os.path.join(self.folder, "rbackupd.conf")
+        shutil.copy(os.path.join(CONF_FOLDER, "rbackupd.conf"),
+                    self.config_path)
+        self.scheme_path = const.DEFAULT_SCHEME_PATH
+        const.DEFAULT_SCHEME_PATH = os.path.join(CONF_FOLDER, "scheme.ini")
+        self.mapper = configmapper.ConfigMapper(self.config_path)
+        self.workers = self.mapper.workers
+
+    def tearDown(self):
+        const.DEFAULT_SCHEME_PATH = self.scheme_path
+        shutil.rmtree(self.folder)
+
+    def read_workers(self):
+        return configmapper.ConfigMapper(self.config_path).workers
+
+    def test_write_without_transaction(self):
+        self.mapper.workers = self.workers + 1
+        self.assertEqual(self.read_workers(), self.workers + 1)
+        self.assertEqual(os.listdir(self.folder), ["rbackupd.conf"])
+
+    def test_commit(self):
+        self.mapper.begin()
+        self.mapper.workers = self.workers + 1
+        self.mapper.task("main").one_filesystem = True
+        self.assertEqual(self.read_workers(), self.workers)
+        self.mapper.commit()
+        self.assertFalse(self.mapper.in_transaction)
+        mapper = configmapper.ConfigMapper(self.config_path)
+        self.assertEqual(mapper.workers, self.workers + 1)
+        self.assertTrue(mapper.task("main").one_filesystem)
+
+    def test_abort(self):
+        self.mapper.begin()
+        self.mapper.workers = self.workers + 1
+        self.mapper.abort()
+        self.assertEqual(self.mapper.workers, self.workers)
+        self.assertEqual(self.read_workers(), self.workers)
+
+    def test_invalid_commit(self):
+        self.mapper.begin()
+        self.mapper.workers = "many"
+        self.assertRaises(configmanager.ValidationError, self.mapper.commit)
+        self.assertFalse(self.mapper.in_transaction)
+        self.assertEqual(self.mapper.workers, self.workers)
+        self.assertEqual(self.read_workers(), self.workers)
+
+    def test_transaction(self):
+        with self.mapper.transaction():
+            self.mapper.workers = self.workers + 1
+        self.assertEqual(self.read_workers(), self.workers + 1)
+        with self.assertRaises(KeyError):
+            with self.mapper.transaction():
+                self.mapper.workers = self.workers + 2
+                self.mapper.task("missing")
+        self.assertEqual(self.mapper.workers, self.workers + 1)
+
+    def test_nested_transaction_fails(self):
+        self.mapper.begin()
+        self.assertRaises(ValueError, self.mapper.begin)
+        self.mapper.abort()
+        self.assertRaises(ValueError, self.mapper.commit)
+        self.assertRaises(ValueError, self.mapper.abort)
+
+    def test_reload_config(self):
+        other = configmapper.ConfigMapper(self.config_path)
+        other.workers = self.workers + 1
+        self.mapper.begin()
+        self.mapper.task("main").one_filesystem = True
+        self.mapper.reload_config()
+        self.assertFalse(self.mapper.in_transaction)
+        self.assertEqual(self.mapper.workers, self.workers + 1)
+        self.assertFalse(self.mapper.task("main").one_filesystem)
+
+    def test_reload_invalid_config(self):
+        with open(self.config_path, "a") as config_file:
+            config_file.write("[scheduler]\nworkers = many\n")
+        self.assertRaises(configmanager.ConfigError,
+                          self.mapper.reload_config)
+        self.assertEqual(self.mapper.workers, self.workers)
@@ -16,6 +16,8 @@ class Tests(unittest.TestCase):
 
         self.now = datetime.datetime.now()
 
+        self.minute = datetime.timedelta(minutes=1)
+
         # highest possible value
         self.d_in_hi = datetime.datetime(2015, 11,  5, 15,  1)
         # lowest possible value
@@ -105,3 +107,205 @@ class Tests(unittest.TestCase):
         for d in self.d_all:
             self.assertEqual(self.c1.has_occured_between(d, d),
                              self.c1.matches(d))
+
+    def test_prev_occurrence(self):
+        d = datetime.datetime(2014, 8, 7, 23, 12, 30)
+        self.assertEqual(self.c1.prev_occurrence(d),
+                         datetime.datetime(2014, 8, 5, 15, 1))
+
+    def test_prev_occurrence_none_when_too_old(self):
+        for d in self.d_out_lo:
+            self.assertIsNone(self.c1.prev_occurrence(d))
+
+    def test_next_occurrence(self):
+        d = datetime.datetime(2014, 8, 5, 15, 1)
+        self.assertEqual(self.c1.next_occurrence(d),
+                         datetime.datetime(2014, 11, 5, 10, 1))
+
+    def test_next_occurrence_exact(self):
+        for d in self.d_in_exact:
+            self.assertEqual(self.c1.next_occurrence(d - self.minute), d)
+            self.assertNotEqual(self.c1.next_occurrence(d), d)
+
+    def test_next_occurrence_none_when_too_young(self):
+        for d in self.d_out_hi:
+            self.assertIsNone(self.c1.next_occurrence(d))
+
+    def test_next_occurrence_sparse(self):
+        c = cron.Cronjob("0 0 29 2 * *")
+        self.assertEqual(c.next_occurrence(datetime.datetime(2097, 3, 1)),
+                         datetime.datetime(2104, 2, 29))
+        self.assertEqual(c.prev_occurrence(datetime.datetime(2104, 2, 28)),
+                         datetime.datetime(2096, 2, 29))
+
+    def test_next_occurrence_skips_short_months(self):
+        c = cron.Cronjob("0 12 31 * * *")
+        self.assertEqual(c.next_occurrence(datetime.datetime(2014, 3, 31, 13)),
+                         datetime.datetime(2014, 5, 31, 12))
+
+    def test_iter_occurrences(self):
+        c = cron.Cronjob("*/20 3 * * * *")
+        start = datetime.datetime(2014, 1, 1, 3, 20)
+        end = datetime.datetime(2014, 1, 2, 3, 20)
+        self.assertEqual(list(c.iter_occurrences(start, end)),
+                         [datetime.datetime(2014, 1, 1, 3, 20),
+                          datetime.datetime(2014, 1, 1, 3, 40),
+                          datetime.datetime(2014, 1, 2, 3, 0),
+                          datetime.datetime(2014, 1, 2, 3, 20)])
+
+    def test_occurrences_match_brute_force(self):
+        c = cron.Cronjob("*/7 3,15 1,31 * * *")
+        d = datetime.datetime(2014, 1, 29)
+        end = datetime.datetime(2014, 3, 3)
+        expected = []
+        while d <= end:
+            if c.matches(d):
+                expected.append(d)
+            d += self.minute
+        self.assertEqual(
+            list(c.iter_occurrences(datetime.datetime(2014, 1, 29), end)),
+            expected)
+
+    def test_never_matching_schedule_fails(self):
+        self.assertRaises(cron.ParseError, cron.Cronjob, "0 0 30 2 * *")
+
+    def test_weekday(self):
+        c = cron.Cronjob("0 2 * * * MON-FRI")
+        # 2014-11-07 is a friday
+        self.assertTrue(c.matches(datetime.datetime(2014, 11, 7, 2)))
+        self.assertFalse(c.matches(datetime.datetime(2014, 11, 8, 2)))
+        self.assertEqual(c.next_occurrence(datetime.datetime(2014, 11, 7, 3)),
+                         datetime.datetime(2014, 11, 10, 2))
+        self.assertEqual(c.prev_occurrence(datetime.datetime(2014, 11, 10)),
+                         datetime.datetime(2014, 11, 7, 2))
+        saturday = datetime.datetime(2014, 11, 8)
+        self.assertTrue(c.has_occured_between(
+            saturday, datetime.datetime(2014, 11, 10, 2)))
+        self.assertFalse(c.has_occured_between(
+            saturday, datetime.datetime(2014, 11, 10)))
+
+    def test_weekday_omitted(self):
+        self.assertEqual(cron.Cronjob("0 2 * * *").schedule,
+                         cron.Cronjob("0 2 * * * *").schedule)
+
+    def test_weekday_sunday(self):
+        self.assertEqual(cron.Cronjob("0 0 * * * 0").schedule,
+                         cron.Cronjob("0 0 * * * 7").schedule)
+        self.assertEqual(cron.Cronjob("0 0 * * * 0-6").schedule,
+                         cron.Cronjob("0 0 * * * *").schedule)
+        self.assertEqual(cron.Cronjob("0 0 * * * sun").schedule,
+                         cron.Cronjob("0 0 * * * 7").schedule)
+        self.assertRaises(cron.ParseError, cron.Cronjob, "0 0 * * * 8")
+
+    def test_weekday_step(self):
+        # steps start at sunday as 0, like in cron
+        self.assertEqual(cron.Cronjob("0 0 * * * */2").schedule,
+                         cron.Cronjob("0 0 * * * SUN,TUE,THU,SAT").schedule)
+        c = cron.Cronjob("0 0 * * * */2")
+        # 2014-11-16 is a sunday
+        self.assertEqual(
+            [c.matches(datetime.datetime(2014, 11, 16 + day))
+             for day in range(7)],
+            [True, False, True, False, True, False, True])
+        self.assertEqual(cron.Cronjob("0 0 * * * 2-6/2").schedule,
+                         cron.Cronjob("0 0 * * * TUE,THU,SAT").schedule)
+
+    def test_weekday_range_with_sunday(self):
+        self.assertEqual(cron.Cronjob("0 0 * * * 0-3").schedule,
+                         cron.Cronjob("0 0 * * * SUN,MON,TUE,WED").schedule)
+        self.assertEqual(cron.Cronjob("0 0 * * * 0-7").schedule,
+                         cron.Cronjob("0 0 * * * *").schedule)
+
+    def test_step_after_range_start(self):
+        self.assertEqual(cron.Cronjob("10-30/10 * * * * *").schedule,
+                         cron.Cronjob("10,20,30 * * * * *").schedule)
+
+    def test_month_names(self):
+        self.assertEqual(cron.Cronjob("0 0 1 JAN-JUN * *").schedule,
+                         cron.Cronjob("0 0 1 1-6 * *").schedule)
+        self.assertRaises(cron.ParseError, cron.Cronjob, "0 0 1 FOO * *")
+
+    def test_day_of_month_or_weekday(self):
+        c = cron.Cronjob("0 0 13 * * FRI")
+        # the 13th and every friday
+        self.assertTrue(c.matches(datetime.datetime(2014, 11, 13)))
+        self.assertTrue(c.matches(datetime.datetime(2014, 11, 14)))
+        self.assertFalse(c.matches(datetime.datetime(2014, 11, 15)))
+        # like in cron, a field starting with "*" only restricts the other
+        # field, even with a step value: odd days that are fridays
+        c = cron.Cronjob("0 0 */2 * * FRI")
+        self.assertTrue(c.matches(datetime.datetime(2014, 11, 7)))
+        self.assertTrue(c.matches(datetime.datetime(2014, 11, 21)))
+        self.assertFalse(c.matches(datetime.datetime(2014, 11, 14)))
+        self.assertFalse(c.matches(datetime.datetime(2014, 11, 1)))
+
+    def test_weekday_occurrences_match_brute_force(self):
+        for pattern in ("*/30 3,15 * * * SAT,SUN",
+                        "0 12 31 * * MON",
+                        "0 0 */10 2-3 * 2-3"):
+            c = cron.Cronjob(pattern)
+            d = datetime.datetime(2014, 1, 25)
+            end = datetime.datetime(2014, 4, 3)
+            expected = []
+            while d <= end:
+                if c.matches(d):
+                    expected.append(d)
+                d += self.minute
+            self.assertEqual(
+                list(c.iter_occurrences(datetime.datetime(2014, 1, 25), end)),
+                expected)
+            self.assertEqual(
+                c.prev_occurrence(end),
+                expected[-1])
+
+    def test_weekday_sparse(self):
+        # the first of february on a monday
+        c = cron.Cronjob("0 0 */31 2 * MON")
+        self.assertEqual(c.next_occurrence(datetime.datetime(2016, 2, 2)),
+                         datetime.datetime(2021, 2, 1))
+        self.assertEqual(c.prev_occurrence(datetime.datetime(2027, 1, 31)),
+                         datetime.datetime(2021, 2, 1))
+
+    def get_batch_timestamps(self):
+        # every 173 minutes over several years, plus timestamps with seconds
+        # and timestamps outside of the range of c1
+        start = datetime.datetime(2011, 12, 30, 23, 59)
+        timestamps = [start + i * 173 * self.minute for i in range(12000)]
+        timestamps += [datetime.datetime(2012, 6, 5, 10, 1, 59),
+                       datetime.datetime(1850, 1, 1),
+                       datetime.datetime(2012, 2, 29, 0, 0)]
+        return timestamps
+
+    def check_batch(self):
+        cronjobs = [self.c1,
+                    cron.Cronjob("*/7 3,15 1,31 * * *"),
+                    cron.Cronjob("0 0 29 2 * *"),
+                    cron.Cronjob("30 8 * * * MON-FRI"),
+                    cron.Cronjob("0 0 13 * * FRI")]
+        timestamps = self.get_batch_timestamps()
+        self.assertEqual(
+            list(cron.batch_matches(cronjobs, timestamps)),
+            [any(c.matches(d) for c in cronjobs) for d in timestamps])
+        for cronjob in cronjobs:
+            occurrences = cron.batch_prev_occurrences(cronjob, timestamps)
+            if cron.numpy is not None:
+                occurrences = [None if cron.numpy.isnat(occurrence) else
+                               occurrence.item() for
+                               occurrence in occurrences]
+            self.assertEqual(occurrences,
+                             [cronjob.prev_occurrence(d) for
+                              d in timestamps])
+
+    @unittest.skipIf(cron.numpy is None, "NumPy is not installed")
+    def test_batch_numpy(self):
+        self.check_batch()
+        self.assertEqual(len(cron.batch_matches([self.c1], [])), 0)
+        self.assertEqual(len(cron.batch_prev_occurrences(self.c1, [])), 0)
+
+    def test_batch_fallback(self):
+        numpy = cron.numpy
+        cron.numpy = None
+        try:
+            self.check_batch()
+        finally:
+            cron.numpy = numpy
@@ -0,0 +1,134 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from rbackupd.cmd import files
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tree = os.path.join(self.folder, "tree")
+        for directory in ("a", "a/b", "a/b/c", "d"):
+            os.makedirs(os.path.join(self.tree, directory))
+        for path in ("file", "a/file", "a/b/file", "a/b/c/file", "d/file"):
+            with open(os.path.join(self.tree, path), "w") as new_file:
+                new_file.write(path)
+        self.outside = os.path.join(self.folder, "outside")
+        os.mkdir(self.outside)
+        os.symlink(self.outside, os.path.join(self.tree, "a", "link"))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_create_symlink_is_relative(self):
+        linkname = os.path.join(self.folder, "link")
+        files.create_symlink(os.path.join(self.tree, "a"), linkname)
+        self.assertEqual(os.readlink(linkname), os.path.join("tree", "a"))
+        self.assertTrue(os.path.samefile(linkname,
+                                         os.path.join(self.tree, "a")))
+        self.assertRaises(ValueError, files.create_symlink,
+                          self.tree, linkname)
+
+    def test_remove_symlink(self):
+        linkname = os.path.join(self.tree, "a", "link")
+        files.remove_symlink(linkname + "/")
+        self.assertFalse(os.path.lexists(linkname))
+        self.assertTrue(os.path.exists(self.outside))
+        self.assertRaises(ValueError, files.remove_symlink, self.tree)
+
+    def test_replace_symlink(self):
+        linkname = os.path.join(self.folder, "latest")
+        files.replace_symlink(os.path.join(self.tree, "a"), linkname)
+        files.replace_symlink(os.path.join(self.tree, "d"), linkname)
+        self.assertEqual(os.readlink(linkname), os.path.join("tree", "d"))
+        self.assertEqual(sorted(os.listdir(self.folder)),
+                         ["latest", "outside", "tree"])
+        self.assertRaises(ValueError, files.replace_symlink,
+                          self.tree, self.outside)
+
+    def test_move(self):
+        target = os.path.join(self.folder, "moved")
+        files.move(self.tree, target)
+        self.assertFalse(os.path.exists(self.tree))
+        self.assertTrue(os.path.isfile(os.path.join(target, "a/b/c/file")))
+
+    def test_move_error(self):
+        self.assertRaises(files.FileOperationError, files.move,
+                          self.tree, os.path.join(self.folder, "no/such"))
+
+    def test_remove_recursive(self):
+        files.remove_recursive(self.tree, workers=2)
+        self.assertFalse(os.path.exists(self.tree))
+        # symlinks must not be followed
+        self.assertTrue(os.path.exists(self.outside))
+        self.assertRaises(ValueError, files.remove_recursive, self.tree)
+
+    def test_remove_recursive_file(self):
+        path = os.path.join(self.tree, "file")
+        files.remove_recursive(path)
+        self.assertFalse(os.path.exists(path))
+
+    def test_copy_hardlinks(self):
+        target = os.path.join(self.folder, "copy")
+        os.chmod(os.path.join(self.tree, "a", "b"), 0o750)
+        files.copy_hardlinks(self.tree, target, workers=2)
+        for path in ("file", "a/file", "a/b/file", "a/b/c/file", "d/file"):
+            source_stat = os.stat(os.path.join(self.tree, path))
+            target_stat = os.stat(os.path.join(target, path))
+            self.assertEqual(source_stat.st_ino, target_stat.st_ino)
+        self.assertTrue(os.path.islink(os.path.join(target, "a", "link")))
+        self.assertEqual(os.stat(os.path.join(target, "a", "b")).st_mode,
+                         os.stat(os.path.join(self.tree, "a", "b")).st_mode)
+        self.assertEqual(os.stat(os.path.join(target, "d")).st_mtime,
+                         os.stat(os.path.join(self.tree, "d")).st_mtime)
+        self.assertRaises(ValueError, files.copy_hardlinks, self.tree, target)
+
+    def fail_for(self, function, failing_path):
+        """
+        Return a replacement for an os function that fails for the given path
+        and calls the original for all others.
+        """
+        def replacement(path, *args, **kwargs):
+            if path == failing_path:
+                raise PermissionError(1, "Operation not permitted", path)
+            return function(path, *args, **kwargs)
+        return replacement
+
+    def test_remove_recursive_continues_after_error(self):
+        failing_path = os.path.join(self.tree, "a", "file")
+        with mock.patch("os.unlink", self.fail_for(os.unlink, failing_path)):
+            with self.assertRaises(files.FileOperationError) as context:
+                files.remove_recursive(self.tree, workers=2)
+        self.assertEqual([path for (path, _) in context.exception.errors if
+                          path == failing_path], [failing_path])
+        # the siblings and the subtree of the failed entry are removed
+        self.assertEqual(os.listdir(os.path.join(self.tree, "a")), ["file"])
+        self.assertEqual(os.listdir(self.tree), ["a"])
+
+    def test_copy_hardlinks_continues_after_error(self):
+        target = os.path.join(self.folder, "copy")
+        failing_path = os.path.join(self.tree, "a", "file")
+        with mock.patch("os.link", self.fail_for(os.link, failing_path)):
+            with self.assertRaises(files.FileOperationError) as context:
+                files.copy_hardlinks(self.tree, target, workers=2)
+        self.assertEqual([path for (path, _) in context.exception.errors],
+                         [failing_path])
+        self.assertFalse(os.path.exists(os.path.join(target, "a", "file")))
+        for path in ("file", "a/link", "a/b/file", "a/b/c/file", "d/file"):
+            self.assertTrue(os.path.lexists(os.path.join(target, path)))
+
+    def test_sample_files(self):
+        self.assertEqual(files.sample_files(self.tree, 10, 100),
+                         ["file", "a/file", "d/file", "a/b/file",
+                          "a/b/c/file"])
+        self.assertEqual(files.sample_files(self.tree, 2, 100),
+                         ["file", "a/file"])
+        # the walk stops after the given number of entries: a, d, file
+        self.assertEqual(files.sample_files(self.tree, 10, 3), ["file"])
@@ -0,0 +1,55 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import threading
+import time
+import unittest
+
+from rbackupd import limits
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = limits.TransferLimiter(max_transfers=2,
+                                              max_transfers_per_device=1)
+        self.started = []
+
+    def start_transfer(self, name, device):
+        def transfer():
+            self.limiter.acquire(device)
+            self.started.append(name)
+        thread = threading.Thread(target=transfer)
+        thread.daemon = True
+        thread.start()
+        # give the thread time to queue up, so the order is deterministic
+        time.sleep(0.1)
+        return thread
+
+    def test_invalid_limits(self):
+        self.assertRaises(ValueError, limits.TransferLimiter, 0, 1)
+        self.assertRaises(ValueError, limits.TransferLimiter, 1, 0)
+
+    def test_per_device_limit(self):
+        self.start_transfer("a1", 1)
+        self.start_transfer("a2", 1)
+        self.assertEqual(self.started, ["a1"])
+        self.limiter.release(1)
+        time.sleep(0.1)
+        self.assertEqual(self.started, ["a1", "a2"])
+
+    def test_other_device_overtakes(self):
+        self.start_transfer("a1", 1)
+        self.start_transfer("a2", 1)
+        self.start_transfer("b1", 2)
+        self.assertEqual(self.started, ["a1", "b1"])
+
+    def test_global_limit_fifo(self):
+        self.start_transfer("a1", 1)
+        self.start_transfer("b1", 2)
+        self.start_transfer("c1", 3)
+        self.start_transfer("d1", 4)
+        self.assertEqual(self.started, ["a1", "b1"])
+        self.limiter.release(1)
+        time.sleep(0.1)
+        self.assertEqual(self.started, ["a1", "b1", "c1"])
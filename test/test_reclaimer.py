@@ -0,0 +1,87 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from rbackupd import reclaimer
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.trash = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.trash)
+
+    def create_tree(self, name, file_count):
+        path = os.path.join(self.trash, name)
+        os.makedirs(os.path.join(path, "sub"))
+        for i in range(file_count):
+            with open(os.path.join(path, "sub", str(i)), "w"):
+                pass
+        return path
+
+    def wait_until_done(self, backup_reclaimer, timeout=5):
+        deadline = time.time() + timeout
+        while backup_reclaimer.pending and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_removes_queued_paths(self):
+        paths = [self.create_tree("backup%s" % i, 5) for i in range(3)]
+        backup_reclaimer = reclaimer.Reclaimer()
+        backup_reclaimer.start()
+        for path in paths:
+            backup_reclaimer.add(path)
+        self.wait_until_done(backup_reclaimer)
+        backup_reclaimer.stop()
+        self.assertEqual(os.listdir(self.trash), [])
+
+    def test_recover(self):
+        for i in range(3):
+            self.create_tree("backup%s" % i, 5)
+        backup_reclaimer = reclaimer.Reclaimer()
+        backup_reclaimer.recover(self.trash)
+        self.assertEqual(backup_reclaimer.pending, 3)
+        # recovering twice must not queue anything twice
+        backup_reclaimer.recover(self.trash)
+        self.assertEqual(backup_reclaimer.pending, 3)
+        backup_reclaimer.start()
+        self.wait_until_done(backup_reclaimer)
+        backup_reclaimer.stop()
+        self.assertEqual(os.listdir(self.trash), [])
+
+    def test_recover_missing_trash(self):
+        backup_reclaimer = reclaimer.Reclaimer()
+        backup_reclaimer.recover(os.path.join(self.trash, "missing"))
+        self.assertEqual(backup_reclaimer.pending, 0)
+
+    def test_rate_limit(self):
+        # 8 files and 2 directories at 50 per second take at least 0.18s, as
+        # the first one is removed immediately
+        path = self.create_tree("backup", 8)
+        backup_reclaimer = reclaimer.Reclaimer(files_per_second=50)
+        backup_reclaimer.start()
+        start = time.time()
+        backup_reclaimer.add(path)
+        self.wait_until_done(backup_reclaimer)
+        duration = time.time() - start
+        backup_reclaimer.stop()
+        self.assertFalse(os.path.exists(path))
+        self.assertGreaterEqual(duration, 0.17)
+
+    def test_stop_aborts_removal(self):
+        path = self.create_tree("backup", 20)
+        backup_reclaimer = reclaimer.Reclaimer(files_per_second=2)
+        backup_reclaimer.start()
+        backup_reclaimer.add(path)
+        time.sleep(0.1)
+        start = time.time()
+        backup_reclaimer.stop()
+        self.assertLess(time.time() - start, 1)
+        # the rest is still there and can be recovered later
+        self.assertTrue(os.path.exists(path))
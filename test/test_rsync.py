@@ -0,0 +1,154 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import io
+import sys
+import unittest
+
+from rbackupd.cmd import rsync
+
+# Stands in for rsync: writes many lines to stdout and a few to stderr. The
+# sources and the destination end up in sys.argv.
+SCRIPT = """
+import sys
+for i in range(20000):
+    sys.stdout.write("file%s\\n" % i)
+    if i % 5000 == 0:
+        sys.stderr.write("warning%s\\n" % i)
+sys.stdout.write("last")
+sys.exit(int(sys.argv[1]))
+"""
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.rsyncfilter = rsync.Filter([], [], [], [], [])
+
+    def run_fake_rsync(self, returncode, **kwargs):
+        return rsync.rsync(command=sys.executable,
+                           sources=["-c", SCRIPT, str(returncode)],
+                           destination="destination",
+                           link_refs=[],
+                           arguments="",
+                           rsyncfilter=self.rsyncfilter,
+                           loggingOptions=None,
+                           **kwargs)
+
+    def test_handlers_get_every_line(self):
+        stdout_lines = []
+        stderr_lines = []
+        (returncode, stdout_tail, stderr_tail) = self.run_fake_rsync(
+            3,
+            stdout_handlers=[stdout_lines.append],
+            stderr_handlers=[stderr_lines.append])
+        self.assertEqual(returncode, 3)
+        self.assertEqual(len(stdout_lines), 20001)
+        self.assertEqual(stdout_lines[:2], ["file0", "file1"])
+        self.assertEqual(stdout_lines[-1], "last")
+        self.assertEqual(stderr_lines,
+                         ["warning0", "warning5000", "warning10000",
+                          "warning15000"])
+        self.assertEqual(stderr_tail, "\n".join(stderr_lines))
+
+    def test_failing_handler_stops_rsync(self):
+        def fail(line):
+            raise ValueError("invalid line")
+        # rsync writes more than fits into the pipe, so it would block
+        # forever if it was not stopped
+        self.assertRaises(ValueError, self.run_fake_rsync, 0,
+                          stdout_handlers=[fail])
+
+    def test_tail_is_bounded(self):
+        counter = rsync.LineCounter()
+        (returncode, stdout_tail, _) = self.run_fake_rsync(
+            0, stdout_handlers=[counter])
+        self.assertEqual(returncode, 0)
+        self.assertEqual(counter.count, 20001)
+        lines = stdout_tail.split("\n")
+        self.assertEqual(len(lines), rsync.TailBuffer().lines.maxlen)
+        self.assertEqual(lines[-1], "last")
+
+    def test_iter_lines(self):
+        stream = io.BufferedReader(io.BytesIO(
+            b"first\n\nsec" + b"ond\r  10%\r  20%\nlast \xff"))
+        self.assertEqual(list(rsync._iter_lines(stream, chunk_size=4)),
+                         ["first", "second", "  10%", "  20%",
+                          "last �"])
+
+    def test_tail_buffer(self):
+        tail = rsync.TailBuffer(maxlen=2)
+        for line in ("a", "b", "c"):
+            tail(line)
+        self.assertEqual(tail.get_text(), "b\nc")
+
+    def test_parse_progress(self):
+        progress = rsync.ProgressParser.parse(
+            "      1,234,567  45%   12.50MB/s    1:01:23 "
+            "(xfr#12, to-chk=345/1000)")
+        self.assertEqual(progress.bytes_done, 1234567)
+        self.assertEqual(progress.percent, 45)
+        self.assertEqual(progress.rate, 12.5 * 1024 * 1024)
+        self.assertEqual(progress.eta, 3683)
+        self.assertEqual(progress.files_transferred, 12)
+        self.assertEqual(progress.files_done, 655)
+        self.assertEqual(progress.files_total, 1000)
+
+    def test_parse_progress_without_files(self):
+        progress = rsync.ProgressParser.parse(
+            "          2,50G  10%    1,00kB/s    0:00:12")
+        self.assertEqual(progress.bytes_done, int(2.5 * 1024 ** 3))
+        self.assertEqual(progress.rate, 1024)
+        self.assertIsNone(progress.files_total)
+
+    def test_progress_parser_ignores_other_lines(self):
+        updates = []
+        parser = rsync.ProgressParser(updates.append)
+        for line in ("sending incremental file list", "dir/file",
+                     "  100  100%  0.00kB/s  0:00:00 (xfr#1, ir-chk=9/11)"):
+            parser(line)
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0].files_done, 2)
+
+    def test_combine_progress(self):
+        combined = rsync.TransferProgress.combine([
+            rsync.TransferProgress(bytes_done=100, percent=50, rate=10.0,
+                                   eta=10, files_transferred=1,
+                                   files_done=2, files_total=4),
+            rsync.TransferProgress(bytes_done=300, percent=50, rate=20.0,
+                                   eta=30, files_transferred=3,
+                                   files_done=4, files_total=8)])
+        self.assertEqual(combined.bytes_done, 400)
+        self.assertEqual(combined.percent, 50)
+        self.assertEqual(combined.rate, 30.0)
+        self.assertEqual(combined.eta, 30)
+        self.assertEqual(combined.files_done, 6)
+        self.assertEqual(combined.files_total, 12)
+
+    def test_combine_progress_partially_known(self):
+        combined = rsync.TransferProgress.combine([
+            rsync.TransferProgress(bytes_done=100, percent=100, rate=0.0,
+                                   eta=0, files_transferred=1,
+                                   files_done=2, files_total=2),
+            rsync.TransferProgress(bytes_done=100, percent=0, rate=1.0,
+                                   eta=0)])
+        self.assertEqual(combined.percent, 100)
+        self.assertIsNone(combined.files_total)
+
+    def test_stats_parser(self):
+        parser = rsync.StatsParser()
+        for line in ("Report: 2014.txt",
+                     "Number of files: 1,234 (reg: 1,000, dir: 234)",
+                     "Number of regular files transferred: 5",
+                     "Total file size: 12.35M bytes",
+                     "Literal data: 1,234 bytes",
+                     "File list generation time: 0.001 seconds",
+                     "sent 12,345 bytes  received 123 bytes",
+                     "Speedup: 1.5"):
+            parser(line)
+        self.assertEqual(parser.stats,
+                         {"number_of_files": 1234,
+                          "number_of_regular_files_transferred": 5,
+                          "total_file_size": 12350000,
+                          "literal_data": 1234,
+                          "file_list_generation_time": 0.001})
@@ -0,0 +1,109 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import threading
+import time
+import unittest
+
+from rbackupd import scheduler
+from rbackupd import task
+from rbackupd.schedule import cron
+
+
+class FakeTask(object):
+
+    def __init__(self, name, cron_pattern, runs, event, block=None):
+        self.name = name
+        self.scheduling_info = task.TaskSchedulingInfo([
+            task.IntervalInfo(name="interval",
+                              cron_pattern=cron.Cronjob(cron_pattern),
+                              keep_count=1,
+                              keep_age=None)])
+        self.runs = runs
+        self.event = event
+        self.block = block
+
+    def run(self, timestamp):
+        self.runs.append(self.name)
+        self.event.set()
+        if self.block is not None:
+            self.block.wait()
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatched = []
+        self.event = threading.Event()
+        self.scheduler = scheduler.Scheduler(max_workers=2)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def fake_task(self, name, block=None):
+        return FakeTask(name, "0 0 1 1 * *", self.dispatched, self.event,
+                        block)
+
+    def test_dispatch_immediately(self):
+        self.scheduler.add(self.fake_task("a"))
+        self.assertTrue(self.event.wait(5))
+        self.assertEqual(self.dispatched, ["a"])
+
+    def test_reschedule_after_dispatch(self):
+        fake_task = self.fake_task("a")
+        self.scheduler.add(fake_task)
+        self.assertTrue(self.event.wait(5))
+        now = datetime.datetime.now()
+        due = datetime.datetime(now.year + 1, 1, 1)
+        for _ in range(50):
+            if self.scheduler.get_due_time(fake_task) is not None:
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.scheduler.get_due_time(fake_task), due)
+
+    def test_no_dispatch_before_due(self):
+        fake_task = self.fake_task("a")
+        due = datetime.datetime.now() + datetime.timedelta(days=1)
+        self.scheduler.add(fake_task, due=due)
+        self.assertFalse(self.event.wait(0.2))
+        self.assertEqual(self.scheduler.get_due_time(fake_task), due)
+
+    def test_remove(self):
+        fake_task = self.fake_task("a")
+        self.scheduler.add(fake_task,
+                           due=datetime.datetime.now() +
+                           datetime.timedelta(seconds=0.2))
+        self.scheduler.remove(fake_task)
+        self.assertFalse(self.event.wait(0.5))
+        self.assertIsNone(self.scheduler.get_due_time(fake_task))
+
+    def test_remove_while_running(self):
+        block = threading.Event()
+        fake_task = self.fake_task("a", block)
+        self.scheduler.add(fake_task)
+        self.assertTrue(self.event.wait(5))
+        self.assertTrue(self.scheduler.is_running(fake_task))
+        self.scheduler.remove(fake_task)
+        block.set()
+        for _ in range(50):
+            if not self.scheduler.is_running(fake_task):
+                break
+            time.sleep(0.1)
+        self.assertFalse(self.scheduler.is_running(fake_task))
+        self.assertIsNone(self.scheduler.get_due_time(fake_task))
+
+    def test_replace_while_running(self):
+        block = threading.Event()
+        old_task = self.fake_task("a", block)
+        self.scheduler.add(old_task)
+        self.assertTrue(self.event.wait(5))
+        new_runs = []
+        new_event = threading.Event()
+        new_task = FakeTask("a", "0 0 1 1 * *", new_runs, new_event)
+        self.scheduler.add(new_task)
+        block.set()
+        self.assertTrue(new_event.wait(5))
+        self.assertEqual(new_runs, ["a"])
+        self.assertEqual(self.dispatched, ["a"])
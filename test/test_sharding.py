@@ -0,0 +1,90 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from rbackupd import sharding
+from rbackupd.cmd import rsync
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_get_entries(self):
+        for name in ("b", "a", "c"):
+            os.mkdir(os.path.join(self.folder, name))
+        open(os.path.join(self.folder, "file"), "w").close()
+        os.symlink(os.path.join(self.folder, "a"),
+                   os.path.join(self.folder, "link"))
+        self.assertEqual(sharding.get_entries(self.folder), ["a", "b", "c"])
+        self.assertEqual(
+            sharding.get_entries(os.path.join(self.folder, "file")), [])
+
+    def test_assign_balances_weights(self):
+        weights = {"a": 50, "b": 40, "c": 30, "d": 20, "e": 10}
+        shards = sharding.assign(sorted(weights), weights, count=2)
+        loads = [sum(weights[entry] for entry in shard) for shard in shards]
+        self.assertEqual(sorted(loads), [70, 80])
+        self.assertEqual(sorted(sum(shards, [])), sorted(weights))
+
+    def test_assign_counts_rest_for_first_shard(self):
+        weights = {sharding.REST: 100, "a": 10, "b": 10}
+        shards = sharding.assign(["a", "b"], weights, count=2)
+        self.assertEqual(shards, [[], ["a", "b"]])
+
+    def test_assign_unknown_weights(self):
+        shards = sharding.assign(["a", "b", "c", "d"], {}, count=2)
+        self.assertEqual([len(shard) for shard in shards], [2, 2])
+        # new entries weigh as much as the average known one
+        shards = sharding.assign(["a", "b", "new"], {"a": 10, "b": 10},
+                                 count=3)
+        self.assertEqual(shards, [["a"], ["b"], ["new"]])
+
+    def test_escape_pattern(self):
+        self.assertEqual(sharding.escape_pattern("/home/user"), "/home/user")
+        self.assertEqual(sharding.escape_pattern("/home/a*b[1]\\"),
+                         "/home/a\\*b\\[1]\\\\")
+
+    def test_count_entries(self):
+        os.makedirs(os.path.join(self.folder, "a", "sub"))
+        os.mkdir(os.path.join(self.folder, "b"))
+        for path in (("a", "file"), ("a", "sub", "file"), ("file",)):
+            open(os.path.join(self.folder, *path), "w").close()
+        os.symlink(os.path.join(self.folder, "a"),
+                   os.path.join(self.folder, "link"))
+        # unchanged files count as well, not only transferred ones
+        self.assertEqual(
+            sharding.count_entries(self.folder,
+                                   [sharding.REST, "a", "b", "missing"]),
+            {sharding.REST: 2, "a": 3, "b": 0})
+        self.assertEqual(sharding.count_entries(self.folder, ["b"]),
+                         {"b": 0})
+
+    def test_history(self):
+        history = sharding.ShardHistory(self.folder)
+        self.assertEqual(history.get_weights("/home"), {})
+        history.update({"/home": {"a": 1}, "/srv": {"b": 2}})
+        history.update({"/home": {"a": 3}})
+        self.assertEqual(history.get_weights("/home"), {"a": 3})
+        self.assertEqual(history.get_weights("/srv"), {"b": 2})
+
+    def test_filter_with_excludes(self):
+        rsync_filter = rsync.Filter(include_patterns=["inc"],
+                                    exclude_patterns=["exc"],
+                                    include_files=[],
+                                    exclude_files=[],
+                                    filters=["+ filter"])
+        args = rsync_filter.with_excludes(["/home/a"]).get_args()
+        self.assertEqual(args, ["--filter", "- /home/a",
+                                "--filter", "+ filter",
+                                "--include", "inc",
+                                "--exclude", "exc"])
+        self.assertEqual(rsync_filter.filters, ["+ filter"])
@@ -0,0 +1,55 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import unittest
+
+from rbackupd import simulator
+
+
+class Tests(unittest.TestCase):
+
+    def test_retention(self):
+        simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 24, "1w"),
+                       ("daily", "0 0 * * * *", 7, "1w")],
+            start=datetime.datetime(2014, 1, 1))
+        report = simulation.run(datetime.timedelta(days=30))
+
+        # hourly runs from the start to the end, both included
+        self.assertEqual(report.runs, 30 * 24 + 1)
+        self.assertEqual(report.snapshots, {"hourly": 24, "daily": 7})
+        # expired backups are removed in the same run that creates new ones
+        self.assertEqual(report.max_snapshots, 24 + 7)
+        self.assertEqual(report.created, 30 * 24 + 1 + 31)
+        self.assertEqual(report.removed, report.created - 24 - 7)
+        # every daily backup is a link to the hourly backup of midnight
+        self.assertEqual(report.operations[simulator.OPERATION_TRANSFER],
+                         report.runs)
+        self.assertGreaterEqual(report.operations[simulator.OPERATION_LINK],
+                                31)
+
+    def test_keep_age(self):
+        simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 1000, "1d")],
+            start=datetime.datetime(2014, 1, 1))
+        report = simulation.run(datetime.timedelta(days=3))
+        # the backups of the last 24 hours plus the one at the boundary
+        self.assertEqual(report.snapshots, {"hourly": 25})
+        self.assertIn("hourly", report.format())
+
+    def test_catalog_saved_once_per_phase(self):
+        simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 1000, "1w")],
+            start=datetime.datetime(2014, 1, 1))
+        simulation.run(datetime.timedelta(days=1))
+        saves = []
+        task = simulation.task
+        task._save_catalog = saves.append
+        task.scheduling_info.interval_infos[0].keep_count = 1
+        simulation.clock.set(datetime.datetime(2014, 1, 2, 1))
+        task.start()
+        task.run(simulation.clock.now())
+        # one save after the new backup, one after expiring the other 25
+        self.assertEqual(len(saves), 2)
+        self.assertEqual(len(task.backups), 1)
@@ -0,0 +1,160 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import shutil
+import tempfile
+import unittest
+
+from rbackupd import simulator
+from rbackupd import statusboard
+from rbackupd import task
+from rbackupd.cmd import rsync
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.board = statusboard.StatusBoard()
+        self.start = datetime.datetime(2014, 1, 1)
+        self.simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 24, "1d")],
+            start=self.start)
+        self.task = self.simulation.task
+
+    def test_update(self):
+        record = self.board.update("a", state="active")
+        self.assertEqual(record.state, "active")
+        self.assertEqual(record.phase, statusboard.PHASE_IDLE)
+        self.board.update("a", phase=statusboard.PHASE_TRANSFER)
+        self.assertEqual(self.board.get("a").state, "active")
+        self.assertEqual(self.board.get("a").phase,
+                         statusboard.PHASE_TRANSFER)
+        self.assertRaises(KeyError, self.board.get, "b")
+
+    def test_snapshot_is_not_changed(self):
+        self.board.update("a", state="active")
+        snapshot = self.board.snapshot()
+        self.board.update("a", state="paused")
+        self.board.update("b", state="active")
+        self.assertEqual(list(snapshot.keys()), ["a"])
+        self.assertEqual(snapshot["a"].state, "active")
+        self.assertEqual(len(self.board.snapshot()), 2)
+
+    def test_remove(self):
+        self.board.update("a", state="active")
+        self.board.remove("a")
+        self.board.remove("a")
+        self.assertEqual(self.board.snapshot(), {})
+
+    def test_task_status(self):
+        board = self.task.status_board
+        self.assertEqual(board.get(self.task.name).state,
+                         task.TaskStatus.stopped.name)
+        self.task.start()
+        self.assertEqual(board.get(self.task.name).state,
+                         task.TaskStatus.active.name)
+        self.task.pause(block=False)
+        self.assertEqual(board.get(self.task.name).state,
+                         task.TaskStatus.paused.name)
+        self.task.resume()
+        self.assertEqual(board.get(self.task.name).state,
+                         task.TaskStatus.active.name)
+
+    def test_new_task_keeps_state_of_old_task(self):
+        board = self.task.status_board
+        self.task.start()
+        board.update(self.task.name, state=task.TaskStatus.working.name)
+        destination = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, destination)
+        new_task = task.Task(
+            name=self.task.name,
+            sources=[],
+            destination=destination,
+            scheduling_info=self.task.scheduling_info,
+            one_filesystem=False,
+            rsync_cmd=None,
+            rsync_args="",
+            rsync_logfile_options=None,
+            rsync_filter=None,
+            status_board=board)
+        self.assertEqual(board.get(self.task.name).state,
+                         task.TaskStatus.working.name)
+        new_task.start()
+        self.assertEqual(board.get(self.task.name).state,
+                         task.TaskStatus.active.name)
+
+    def test_task_run(self):
+        self.task.start()
+        self.task.run(self.start)
+        record = self.task.status_board.get(self.task.name)
+        self.assertEqual(record.state, task.TaskStatus.active.name)
+        self.assertEqual(record.phase, statusboard.PHASE_IDLE)
+        self.assertEqual(record.started, self.start)
+        self.assertEqual(record.last_result, statusboard.RESULT_SUCCESS)
+        self.assertEqual(record.last_duration, 0)
+        self.assertIsNone(record.last_error)
+
+    def test_task_run_failure(self):
+        def fail(new_backup, params):
+            self.assertEqual(
+                self.task.status_board.get(self.task.name).state,
+                task.TaskStatus.working.name)
+            raise task.BackupError(self.task, "disk full")
+        self.task.create_backup = fail
+        self.task.start()
+        self.assertRaises(task.BackupError, self.task.run, self.start)
+        record = self.task.status_board.get(self.task.name)
+        self.assertEqual(record.state, task.TaskStatus.active.name)
+        self.assertEqual(record.last_result, statusboard.RESULT_FAILURE)
+        self.assertEqual(record.last_error, "disk full")
+
+    def test_listener(self):
+        changes = []
+        board = statusboard.StatusBoard(
+            listener=lambda name, old, new: changes.append(
+                (name, old.state, new.state)))
+        board.update("a", state="active")
+        board.update("a", phase=statusboard.PHASE_CHECK)
+        self.assertEqual(changes, [("a", None, "active"),
+                                   ("a", "active", "active")])
+
+    def test_listener_called_in_order(self):
+        locked = []
+        board = statusboard.StatusBoard(
+            listener=lambda name, old, new: locked.append(
+                board._lock.locked()))
+        board.update("a", state="active")
+        # the listener is called before the next update can start
+        self.assertEqual(locked, [True])
+
+    def test_progress_throttled(self):
+        updates = []
+        self.task.status_board.listener = (
+            lambda name, old, new: updates.append(new.bytes_transferred))
+
+        def progress(bytes_done, percent):
+            self.task._update_progress(rsync.TransferProgress(
+                bytes_done=bytes_done, percent=percent, rate=0, eta=0))
+        progress(100, 1)
+        progress(200, 1)
+        progress(300, 1)
+        # a new percentage is published at once
+        progress(400, 2)
+        self.simulation.clock.advance(datetime.timedelta(seconds=1))
+        progress(500, 2)
+        self.assertEqual(updates, [100, 400, 500])
+        # the end of a transfer resets the throttle
+        self.task._update_progress(None)
+        progress(0, 0)
+        self.assertEqual(updates, [100, 400, 500, 0])
+
+    def test_backup_listener(self):
+        backups = []
+        self.task.backup_listener = (
+            lambda backup_task, backup: backups.append(
+                (backup_task.name, backup.interval_name, backup.date)))
+        self.task.start()
+        self.task.run(self.start)
+        self.task.run(self.start)
+        self.assertEqual(backups, [(self.task.name, "hourly", self.start)])
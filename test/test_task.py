@@ -0,0 +1,112 @@
+# -*- encoding: utf-8 -*-
+# Copyright (c) 2014 Hannes Körber <hannes.koerber+rbackupd@gmail.com>
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from rbackupd import constants as const
+from rbackupd import sharding
+from rbackupd import simulator
+from rbackupd import task
+from rbackupd.cmd import rsync
+from rbackupd.schedule import cron
+from rbackupd.schedule import interval
+
+
+class Tests(unittest.TestCase):
+
+    def setUp(self):
+        self.simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 24, "1d")],
+            start=datetime.datetime(2014, 1, 1))
+        self.simulation.run(datetime.timedelta(hours=3))
+        self.task = self.simulation.task
+
+    def get_link_refs(self, get_device):
+        with mock.patch("rbackupd.limits.get_device", get_device):
+            return self.task._get_link_refs()
+
+    def test_link_refs(self):
+        link_refs = self.get_link_refs(lambda path: 1)
+        self.assertEqual([backup.date.hour for backup in link_refs],
+                         [3, 2, 1, 0])
+
+    def test_link_refs_without_backups(self):
+        simulation = simulator.Simulator(
+            intervals=[("hourly", "0 * * * * *", 24, "1d")],
+            start=datetime.datetime(2014, 1, 1))
+        self.task = simulation.task
+
+        def get_device(path):
+            raise OSError("not mounted")
+        self.assertEqual(self.get_link_refs(get_device), [])
+
+    def test_link_refs_on_foreign_device(self):
+        def get_device(path):
+            return 1 if path == self.task.destination else 2
+        self.assertRaises(task.BackupError, self.get_link_refs, get_device)
+
+    def test_link_refs_partly_on_foreign_device(self):
+        def get_device(path):
+            return 2 if "T01" in path else 1
+        link_refs = self.get_link_refs(get_device)
+        self.assertEqual([backup.date.hour for backup in link_refs],
+                         [3, 2, 0])
+
+    def test_link_refs_unknown_destination_device(self):
+        def get_device(path):
+            if path == self.task.destination:
+                raise OSError("not mounted")
+            return 1
+        self.assertRaises(task.BackupError, self.get_link_refs, get_device)
+
+    def test_shard_history_without_counts(self):
+        transfers = [task._Transfer(["/src"], None, shard_source="/src",
+                                    shard_entries=[sharding.REST, "a"]),
+                     task._Transfer(["/src/b"], None, shard_source="/src",
+                                    shard_entries=["b"])]
+        transfers[1].shard_counts = {"b": 3}
+        with mock.patch.object(self.task._shard_history, "update") as update:
+            self.task._update_shard_history(transfers)
+            update.assert_called_once_with({"/src": {"b": 3}})
+            transfers[1].shard_counts = {}
+            with self.assertLogs("rbackupd.task", "WARNING"):
+                self.task._update_shard_history(transfers)
+            self.assertEqual(update.call_count, 1)
+
+    def test_failed_rsync_removes_unfinished_backup(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        source = os.path.join(folder, "source")
+        destination = os.path.join(folder, "destination")
+        os.mkdir(source)
+        os.mkdir(destination)
+        scheduling_info = task.TaskSchedulingInfo()
+        scheduling_info.append(task.IntervalInfo(
+            name="hourly",
+            cron_pattern=cron.Cronjob("0 * * * * *"),
+            keep_count=24,
+            keep_age=interval.Interval("1d")))
+        failing_task = task.Task(
+            name="failing",
+            sources=[source],
+            destination=destination,
+            scheduling_info=scheduling_info,
+            one_filesystem=False,
+            # stands in for rsync and always fails
+            rsync_cmd="/bin/false",
+            rsync_args="",
+            rsync_logfile_options=None,
+            rsync_filter=rsync.Filter([], [], [], [], []))
+        failing_task.start()
+        for _ in range(2):
+            self.assertRaises(task.BackupError, failing_task.run,
+                              datetime.datetime.now())
+        self.assertEqual(len(failing_task.backups), 0)
+        self.assertEqual(
+            [entry for entry in os.listdir(destination) if
+             entry != const.NAME_CATALOG_FOLDER], [])